@@ -68,6 +68,12 @@ import requests
 from pathlib import Path
 from datetime import datetime
 
+try:
+    # Shared non-blocking notifier (scripts/notifier.py); NZBGet may run this file on its own.
+    import notifier
+except ImportError:
+    notifier = None
+
 POSTPROCESS_SUCCESS = 93  # NZBGet success code for post-processing
 POSTPROCESS_ERROR = 94    # NZBGet error code for post-processing failure   
 
@@ -81,13 +87,18 @@ def send_pushover_notification(message):
         logger.error("Pushover credentials are not configured. Please set PUSHOVER_USER_KEY and PUSHOVER_API_TOKEN in NZBGet settings.")
         return
 
+    if notifier is not None:
+        # Delivered in the background so the transfer does not wait on Pushover.
+        notifier.pushover(PUSHOVER_USER_KEY, PUSHOVER_API_TOKEN, log=logger.error).send(message)
+        return
+
     payload = {
         'token': PUSHOVER_API_TOKEN,
         'user': PUSHOVER_USER_KEY,
         'message': message
     }
     try:
-        response = requests.post('https://api.pushover.net/1/messages.json', data=payload)
+        response = requests.post('https://api.pushover.net/1/messages.json', data=payload, timeout=20)
         response.raise_for_status()
         logger.info("Pushover Notification sent successfully.")
     except requests.RequestException as e:
@@ -232,14 +243,19 @@ def validate_configuration():
     return True
 
 class NZBGetSFTPTransfer:
-    def __init__(self):
+    def __init__(self, host=None, port=None, username=None, password=None):
+        # Defaults come from the NZBGet settings; transmission_checker.py passes its own server.
+        self.host = host or WINDOWS_SERVER_HOST
+        self.port = int(port or WINDOWS_SERVER_PORT)
+        self.username = username or WINDOWS_SERVER_USERNAME
+        self.password = password if password is not None else WINDOWS_SERVER_PASSWORD
         self.sftp_client = None
         self.ssh_client = None
         
     def connect_sftp(self):
         """Establish SFTP connection to Windows server"""
         try:
-            logger.info(f"Connecting to {WINDOWS_SERVER_HOST}:{WINDOWS_SERVER_PORT} as {WINDOWS_SERVER_USERNAME}")
+            logger.info(f"Connecting to {self.host}:{self.port} as {self.username}")
             
             self.ssh_client = paramiko.SSHClient()
             self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -247,14 +263,14 @@ class NZBGetSFTPTransfer:
             # Use password authentication
             logger.info("Using password authentication")
             self.ssh_client.connect(
-                hostname=WINDOWS_SERVER_HOST,
-                port=int(WINDOWS_SERVER_PORT),
-                username=WINDOWS_SERVER_USERNAME,
-                password=WINDOWS_SERVER_PASSWORD
+                hostname=self.host,
+                port=self.port,
+                username=self.username,
+                password=self.password
             )
             
             self.sftp_client = self.ssh_client.open_sftp()
-            logger.info(f"Successfully connected to {WINDOWS_SERVER_HOST}")
+            logger.info(f"Successfully connected to {self.host}")
             return True
             
         except paramiko.AuthenticationException:
@@ -351,6 +367,15 @@ class NZBGetSFTPTransfer:
         logger.info(f"Transfer completed: {success_count}/{total_count} files transferred successfully")
         return success_count == total_count
     
+    def transfer_path(self, local_path, remote_base_path):
+        """Transfer a file or a directory into remote_base_path (keeping its name)"""
+        remote_path = normalize_windows_path(f"{remote_base_path}/{os.path.basename(local_path.rstrip('/'))}")
+        if os.path.isfile(local_path):
+            logger.info(f"Transferring single file to: {remote_path}")
+            return self.transfer_file(local_path, remote_path)
+        logger.info(f"Transferring directory to: {remote_path}")
+        return self.transfer_directory(local_path, remote_path)
+
     def cleanup_local_files(self, path):
         """Remove local files after successful transfer"""
         try:
@@ -3,7 +3,7 @@
 azure_ddns_updater.py: A dynamic DNS updater for Azure DNS.
 
 This script retrieves your current public IP address and updates
-the specified Azure DNS A record if it has changed.
+the specified Azure DNS A/AAAA records if it has changed.
 
 Changelog:
 - 2025-02-03:
@@ -16,20 +16,41 @@ Changelog:
 - 2026-04-21:
     - Replaced environment variables with YAML config file (azure_ddns_updater_config.yaml).
     - Added Service Principal authentication via config (azure_tenant_id, azure_client_id, azure_client_secret).
+- 2026-10-19:
+    - Added --daemon mode: the credential and DnsManagementClient are created once and reused.
+    - The last record value is cached in azure_ddns_updater_state.json; Azure is only called when
+      the public IP differs from it (or the cache is older than record_refresh_hours).
+    - The Azure SDK is imported lazily, so a cron run with an unchanged IP never loads it.
+    - Added a `records:` list (A and AAAA records across several zones) updated in one run:
+      one IP lookup per address family, zones read concurrently, only changed records written.
+    - Public IP detection moved to public_ip.py: several sources queried concurrently with short
+      timeouts, a quorum must agree (ip_detection block); IPv6 for AAAA records.
+    - The record cache moved from azure_ddns_updater_state.json to the shared state store
+      (state_store.py, SQLite); entries expire after record_refresh_hours and the JSON file is imported once.
+    - A failed IPv4 or IPv6 detection only fails the records of that family; the others are still updated.
 """
 
 import sys
 import os
+import json
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import requests
-from datetime import datetime
-from azure.identity import ClientSecretCredential
-from azure.mgmt.dns import DnsManagementClient
-from azure.mgmt.dns.models import RecordSet, ARecord
-from azure.core.exceptions import ResourceNotFoundError
+from datetime import datetime, timedelta
 
-# Load configuration from YAML file.
-CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "azure_ddns_updater_config.yaml")
+import public_ip
+import state_store
+
+# Load configuration from YAML file ($AZURE_DDNS_CONFIG overrides the location).
+CONFIG_PATH = os.environ.get(
+    "AZURE_DDNS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "azure_ddns_updater_config.yaml")
+)
+# Record cache used before the state store; imported once if present.
+LEGACY_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "azure_ddns_updater_state.json")
+STATE_NAMESPACE = 'azure_ddns_updater'
 
 try:
     with open(CONFIG_PATH, "r") as f:
@@ -49,96 +70,299 @@ TTL = config.get('ttl', 300)
 AZURE_TENANT_ID = config.get('azure_tenant_id')
 AZURE_CLIENT_ID = config.get('azure_client_id')
 AZURE_CLIENT_SECRET = config.get('azure_client_secret')
+# Daemon mode: seconds between IP checks, and how often the cached record is re-read from Azure
+# (catches edits made in the portal).
+CHECK_INTERVAL = config.get('check_interval', 300)
+RECORD_REFRESH_HOURS = config.get('record_refresh_hours', 24)
+MAX_WORKERS = config.get('max_workers', 4)
+# Optional path of the state database (default: state.sqlite3 next to the scripts).
+STATE_DB = config.get('state_db')
+
+# Address family looked up for each record type.
+RECORD_FAMILIES = {'A': 4, 'AAAA': 6}
+
+try:
+    IP_DETECTION = public_ip.detection_settings(config)
+except ValueError as e:
+    print(f"Error: {e}")
+    sys.exit(1)
 
 # Validate that all required config values are set.
 required_vars = {
     'subscription_id': SUBSCRIPTION_ID,
     'resource_group': RESOURCE_GROUP,
-    'dns_zone': DNS_ZONE,
-    'record_name': RECORD_NAME,
     'azure_tenant_id': AZURE_TENANT_ID,
     'azure_client_id': AZURE_CLIENT_ID,
     'azure_client_secret': AZURE_CLIENT_SECRET,
 }
+if not config.get('records'):
+    # Single-record config: dns_zone + record_name.
+    required_vars['dns_zone'] = DNS_ZONE
+    required_vars['record_name'] = RECORD_NAME
 
 for var_name, value in required_vars.items():
     if not value:
         print(f"Error: '{var_name}' is missing or empty in {CONFIG_PATH}")
         sys.exit(1)
 
+def load_records():
+    """Return the records to manage as dicts with zone, name, type, ttl and resource_group."""
+    entries = config.get('records') or [{'zone': DNS_ZONE, 'name': RECORD_NAME}]
+    records = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name') or not (entry.get('zone') or DNS_ZONE):
+            print(f"Error: each entry in 'records' needs a 'name' and a 'zone' (or a global dns_zone): {entry}")
+            sys.exit(1)
+        record_type = str(entry.get('type', 'A')).upper()
+        if record_type not in RECORD_FAMILIES:
+            print(f"Error: unsupported record type '{record_type}' for {entry['name']} (use A or AAAA)")
+            sys.exit(1)
+        records.append({
+            'zone': entry.get('zone') or DNS_ZONE,
+            'name': str(entry['name']),
+            'type': record_type,
+            'ttl': entry.get('ttl', TTL),
+            'resource_group': entry.get('resource_group', RESOURCE_GROUP),
+        })
+    return records
+
+RECORDS = load_records()
+
 def log_message(message):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"[{timestamp}] {message}")
+    print(f"[{timestamp}] {message}", flush=True)
 
-def get_public_ip():
-    """Retrieve the current public IP address."""
-    try:
-        response = requests.get("https://api.ipify.org")
-        response.raise_for_status()
-        ip = response.text.strip()
-        if not ip:
-            raise ValueError("Empty IP address received.")
-        return ip
-    except Exception as e:
-        log_message(f"Error retrieving public IP: {e}")
-        sys.exit(1)
+def get_public_ip(session, record_type='A'):
+    """Retrieve the current public IPv4 (A) or IPv6 (AAAA) address (raises IPDetectionError)."""
+    family = RECORD_FAMILIES[record_type]
+    return public_ip.detect_public_ip(
+        family,
+        IP_DETECTION['sources'][family],
+        quorum=IP_DETECTION['quorum'],
+        timeout=IP_DETECTION['timeout'],
+        session=session,
+    )
 
-def main():
-    # Step 1. Retrieve the current public IP.
-    current_ip = get_public_ip()
-    log_message(f"Current public IP: {current_ip}")
+def record_key(record):
+    return f"{record['type']} {record['name']}.{record['zone']}"
 
-    # Step 2. Create Azure credentials and a DNS management client.
-    try:
-        credential = ClientSecretCredential(
-            tenant_id=AZURE_TENANT_ID,
-            client_id=AZURE_CLIENT_ID,
-            client_secret=AZURE_CLIENT_SECRET,
-        )
-    except Exception as e:
-        log_message(f"Error creating credentials: {e}")
-        sys.exit(1)
+def open_state():
+    store = state_store.open_store(STATE_DB)
+    if os.path.exists(LEGACY_STATE_PATH):
+        try:
+            with open(LEGACY_STATE_PATH, "r") as f:
+                records = json.load(f).get('records')
+        except (ValueError, AttributeError):
+            records = None
+        if isinstance(records, dict):
+            save_state(store, records)
+        os.replace(LEGACY_STATE_PATH, LEGACY_STATE_PATH + ".imported")
+    return store
+
+def load_state(store, records):
+    """Return the cached values of *records* ({record_key: {'ip', 'verified'}}); expired entries are left out."""
+    cached = store.items(STATE_NAMESPACE)
+    return {record_key(record): cached[record_key(record)] for record in records if record_key(record) in cached}
+
+def save_state(store, entries):
+    # An entry expires when it is due for re-verification; compaction then drops records removed from the config.
+    store.set_many(STATE_NAMESPACE, entries, ttl=RECORD_REFRESH_HOURS * 3600)
 
-    dns_client = DnsManagementClient(credential, SUBSCRIPTION_ID)
+def cache_entry(ip):
+    return {'ip': ip, 'verified': datetime.now().isoformat(timespec='seconds')}
 
-    # Step 3. Attempt to retrieve the existing A record set.
+def cache_is_fresh(entry):
     try:
-        record_set = dns_client.record_sets.get(
-            RESOURCE_GROUP,
-            DNS_ZONE,
-            RECORD_NAME,
-            "A"
+        verified = datetime.fromisoformat(entry['verified'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return datetime.now() - verified < timedelta(hours=RECORD_REFRESH_HOURS)
+
+class AzureDns:
+    """Azure DNS access; the SDK, credential and client are set up on first use and then kept."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                # Importing the SDK takes seconds on a Pi, so only do it when Azure is actually called.
+                from azure.identity import ClientSecretCredential
+                from azure.mgmt.dns import DnsManagementClient
+
+                credential = ClientSecretCredential(
+                    tenant_id=AZURE_TENANT_ID,
+                    client_id=AZURE_CLIENT_ID,
+                    client_secret=AZURE_CLIENT_SECRET,
+                )
+                # The credential caches its AAD token and renews it only when it is about to expire.
+                self._client = DnsManagementClient(credential, SUBSCRIPTION_ID)
+            return self._client
+
+    def zone_records(self, resource_group, zone):
+        """Return {(name, type): [ips]} for every A/AAAA record set in *zone* (one listing call)."""
+        found = {}
+        for record_set in self.client.record_sets.list_by_dns_zone(resource_group, zone):
+            record_type = record_set.type.rsplit('/', 1)[-1]
+            if record_type == 'A':
+                found[(record_set.name, 'A')] = [r.ipv4_address for r in record_set.a_records or []]
+            elif record_type == 'AAAA':
+                found[(record_set.name, 'AAAA')] = [r.ipv6_address for r in record_set.aaaa_records or []]
+        return found
+
+    def update(self, record, ip):
+        """Update (or create) the record set with *ip*."""
+        from azure.mgmt.dns.models import RecordSet, ARecord, AaaaRecord
+
+        if record['type'] == 'A':
+            record_set_params = RecordSet(ttl=record['ttl'], a_records=[ARecord(ipv4_address=ip)])
+        else:
+            record_set_params = RecordSet(ttl=record['ttl'], aaaa_records=[AaaaRecord(ipv6_address=ip)])
+        self.client.record_sets.create_or_update(
+            record['resource_group'],
+            record['zone'],
+            record['name'],
+            record['type'],
+            record_set_params
         )
-        # Extract existing IP addresses from the record set.
-        existing_ips = [record.ipv4_address for record in record_set.a_records] if record_set.a_records else []
-        if current_ip in existing_ips:
-            log_message("IP addresses match. No update needed.")
-            sys.exit(0)
+
+def check_and_update(dns, session, store, records, state, quiet=False):
+    """Run one check over all *records*; return (new state, {record_key: result}).
+
+    The public IP is detected once per address family; if that fails, only the records
+    of that family are marked failed.
+
+    Records whose cached value matches the current IP are not sent to Azure.
+    Records without a usable cache are compared against a listing of their zone
+    (zones are listed concurrently); only records that differ are written.
+    """
+    state = dict(state)
+    verified = {}
+    results = {}
+    current_ips = {}
+    for record_type in dict.fromkeys(record['type'] for record in records):
+        # One family failing (e.g. no IPv6 on this network) must not hold up the other one's records.
+        try:
+            current_ips[record_type] = get_public_ip(session, record_type)
+        except (public_ip.IPDetectionError, ValueError) as e:
+            log_message(f"Error retrieving public IPv{RECORD_FAMILIES[record_type]} address: {e}")
+            for record in records:
+                if record['type'] == record_type:
+                    results[record_key(record)] = f"failed: no public IPv{RECORD_FAMILIES[record_type]} address"
+    to_read = []
+    to_write = []
+    for record in records:
+        if record['type'] not in current_ips:
+            continue
+        key = record_key(record)
+        cached = state.get(key) or {}
+        if cached.get('ip') == current_ips[record['type']] and cache_is_fresh(cached):
+            results[key] = "unchanged"
+        elif cached.get('ip') and cache_is_fresh(cached):
+            to_write.append(record)  # the IP moved away from a known record value
         else:
-            log_message(f"Existing DNS A record IPs: {existing_ips}")
-            log_message("IP addresses differ. Updating record.")
-    except ResourceNotFoundError:
-        log_message("No existing A record found. A new record set will be created.")
-
-    # Step 4. Update (or create) the DNS record with the current public IP.
-    new_a_record = ARecord(ipv4_address=current_ip)
-    record_set_params = RecordSet(
-        ttl=TTL,
-        a_records=[new_a_record]
-    )
+            to_read.append(record)
 
-    try:
-        dns_client.record_sets.create_or_update(
-            RESOURCE_GROUP,
-            DNS_ZONE,
-            RECORD_NAME,
-            "A",
-            record_set_params
+    if not to_read and not to_write:
+        if not quiet and current_ips:
+            ips = ', '.join(current_ips.values())
+            log_message(f"Public IP(s) {ips} match the cached DNS records. No update needed.")
+        return state, results
+
+    log_message(f"Current public IP(s): {', '.join(current_ips.values())}")
+    with ThreadPoolExecutor(max_workers=max(int(MAX_WORKERS), 1)) as executor:
+        zones = sorted({(r['resource_group'], r['zone']) for r in to_read})
+        listings = dict(zip(zones, executor.map(lambda zone: call_or_error(dns.zone_records, *zone), zones)))
+        for record in to_read:
+            key = record_key(record)
+            listing = listings[(record['resource_group'], record['zone'])]
+            if isinstance(listing, Exception):
+                results[key] = f"failed: could not read zone: {listing}"
+                continue
+            existing = listing.get((record['name'], record['type']))
+            if existing is not None and current_ips[record['type']] in existing:
+                results[key] = "unchanged"
+                state[key] = verified[key] = cache_entry(current_ips[record['type']])
+            else:
+                to_write.append(record)
+                results[key] = "created" if existing is None else "updated"
+
+        outcomes = executor.map(
+            lambda record: call_or_error(dns.update, record, current_ips[record['type']]), to_write
         )
-        log_message(f"DNS record updated successfully to IP: {current_ip}")
+        for record, outcome in zip(to_write, outcomes):
+            key = record_key(record)
+            if isinstance(outcome, Exception):
+                results[key] = f"failed: {outcome}"
+                continue
+            results.setdefault(key, "updated")
+            state[key] = verified[key] = cache_entry(current_ips[record['type']])
+
+    for record in records:
+        key = record_key(record)
+        if results.get(key, "unchanged") != "unchanged" or not quiet:
+            log_message(f"{key}: {results.get(key, 'unchanged')}")
+    save_state(store, verified)
+    return state, results
+
+def call_or_error(function, *args):
+    """Call *function*; return the exception instead of raising it (one bad zone must not stop the rest)."""
+    try:
+        return function(*args)
     except Exception as e:
-        log_message(f"Error updating DNS record: {e}")
+        return e
+
+def run_daemon(dns, session, store, interval):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    log_message(f"Daemon started: checking every {interval}s.")
+    state = load_state(store, RECORDS)
+    while True:
+        try:
+            state, _ = check_and_update(dns, session, store, RECORDS, state, quiet=True)
+        except Exception as e:
+            # Keep running; the next check retries (the cache is only written for successful records).
+            log_message(f"Error during check: {e}")
+        if stop.wait(interval):
+            break
+    log_message("Daemon stopped.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Update Azure DNS A/AAAA records with the current public IP.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and check every --interval seconds, reusing the Azure client.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=CHECK_INTERVAL,
+        help=f"Seconds between checks in daemon mode (default: {CHECK_INTERVAL}).",
+    )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    dns = AzureDns()
+    session = requests.Session()
+
+    with open_state() as store:
+        if args.daemon:
+            try:
+                run_daemon(dns, session, store, max(args.interval, 1))
+            except KeyboardInterrupt:
+                log_message("Daemon stopped.")
+            return
+
+        _, results = check_and_update(dns, session, store, RECORDS, load_state(store, RECORDS))
+    failed = [key for key, result in results.items() if result.startswith("failed")]
+    if failed:
+        log_message(f"Error updating DNS record(s): {', '.join(failed)}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
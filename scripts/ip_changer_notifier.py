@@ -8,14 +8,27 @@ Changelog:
     - Added timestamped logging for better tracking of events.
 - 2025-02-03: Moved Pushover credentials to environment variables for enhanced security.
 - 2026-04-21: Replaced environment variables with YAML config file (ip_changer_notifier_config.yaml).
+- 2026-10-19: IP detection moved to public_ip.py (several sources, short timeouts, quorum); optional IPv6 tracking.
+- 2026-10-19: Pushover messages go through notifier.py (background delivery, retries, digests).
+- 2026-10-19: Added --monitor: long-running, event-driven detection from netlink address events and the
+  router's UPnP external address; web lookups only when those are unavailable.
+- 2026-10-19: The last IP is kept in the shared state store (state_store.py, SQLite) instead of
+  last_ip.txt/last_ip6.txt; those files are imported once. A cron run and --monitor no longer
+  both notify the same change.
 """
 
 import sys
-import requests
 import os
+import signal
+import argparse
+import threading
 import yaml
 from datetime import datetime
 
+import notifier
+import public_ip
+import state_store
+
 # Load configuration from YAML file.
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ip_changer_notifier_config.yaml")
 
@@ -32,18 +45,37 @@ except yaml.YAMLError as e:
 # Configuration
 PUSHOVER_USER_KEY = config.get('pushover_user_key')
 PUSHOVER_API_TOKEN = config.get('pushover_api_token')
-IP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_ip.txt')
+# Files used before the state store; imported once if present.
+LEGACY_IP_FILES = {
+    4: os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_ip.txt'),
+    6: os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_ip6.txt'),
+}
+STATE_NAMESPACE = 'ip_changer_notifier'
+# Optional path of the state database (default: state.sqlite3 next to the scripts).
+STATE_DB = config.get('state_db')
+TRACK_IPV6 = config.get('track_ipv6', False)
+# --monitor settings.
+MONITOR = config.get('monitor') or {}
+
+try:
+    IP_DETECTION = public_ip.detection_settings(config)
+except ValueError as e:
+    print(f"Error: {e}")
+    sys.exit(1)
 
 def log_message(message):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print(f"[{timestamp}] {message}")
 
-def get_external_ip():
+def get_external_ip(family=4):
     try:
-        response = requests.get('https://api.ipify.org?format=text')
-        response.raise_for_status()
-        return response.text.strip()
-    except requests.RequestException as e:
+        return public_ip.detect_public_ip(
+            family,
+            IP_DETECTION['sources'][family],
+            quorum=IP_DETECTION['quorum'],
+            timeout=IP_DETECTION['timeout'],
+        )
+    except (public_ip.IPDetectionError, ValueError) as e:
         log_message(f"Error fetching IP: {e}")
         return None
 
@@ -52,40 +84,93 @@ def send_pushover_notification(message):
         log_message("Pushover credentials are not set in config file.")
         return
 
-    payload = {
-        'token': PUSHOVER_API_TOKEN,
-        'user': PUSHOVER_USER_KEY,
-        'message': message
-    }
-    try:
-        response = requests.post('https://api.pushover.net/1/messages.json', data=payload)
-        response.raise_for_status()
-        log_message("Notification sent successfully.")
-    except requests.RequestException as e:
-        log_message(f"Error sending notification: {e}")
-
-def load_last_ip():
-    if os.path.exists(IP_FILE):
-        with open(IP_FILE, 'r') as file:
-            return file.read().strip()
-    return None
-
-def save_current_ip(ip):
-    with open(IP_FILE, 'w') as file:
-        file.write(ip)
+    # Returns at once; the notifier delivers (with retries) in the background and drains at exit.
+    notifier.pushover(PUSHOVER_USER_KEY, PUSHOVER_API_TOKEN, log=log_message).send(message)
 
-def main():
-    current_ip = get_external_ip()
+def state_key(family):
+    return f"ipv{family}"
+
+def open_state():
+    store = state_store.open_store(STATE_DB)
+    for family, path in LEGACY_IP_FILES.items():
+        if os.path.exists(path) and not store.contains(STATE_NAMESPACE, state_key(family)):
+            with open(path, 'r') as file:
+                ip = file.read().strip()
+            if ip:
+                store.set(STATE_NAMESPACE, state_key(family), ip)
+    return store
+
+def check_ip(store, family):
+    current_ip = get_external_ip(family)
     if current_ip is None:
         return
 
-    last_ip = load_last_ip()
-    if current_ip != last_ip:
-        message = f"External IP has changed to: {current_ip}"
+    key = state_key(family)
+    label = "External IP" if family == 4 else "External IPv6"
+    # swap() reads and writes atomically, so of two runs seeing the same change only one notifies.
+    if store.get(STATE_NAMESPACE, key) != current_ip and store.swap(STATE_NAMESPACE, key, current_ip) != current_ip:
+        message = f"{label} has changed to: {current_ip}"
         send_pushover_notification(message)
-        save_current_ip(current_ip)
     else:
-        log_message("IP has not changed.")
+        log_message(f"{label} has not changed.")
+
+def run_monitor(store):
+    """Watch IPv4 (and IPv6 if track_ipv6) with public_ip.IPMonitor until SIGTERM/Ctrl+C."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    families = [4, 6] if TRACK_IPV6 else [4]
+    threads = []
+    for family in families:
+        label = "External IP" if family == 4 else "External IPv6"
+
+        def on_change(ip, previous, how, label=label, family=family):
+            log_message(f"{label} changed from {previous} to {ip} (detected via {how}).")
+            if store.swap(STATE_NAMESPACE, state_key(family), ip) != ip:
+                send_pushover_notification(f"{label} has changed to: {ip}")
+
+        monitor = public_ip.IPMonitor(
+            family,
+            interface=MONITOR.get('wan_interface'),
+            upnp_source=MONITOR.get('upnp_source', 'upnp'),
+            poll_interval=float(MONITOR.get('poll_interval', 30)),
+            fallback_interval=float(MONITOR.get('fallback_interval', 900)),
+            sources=IP_DETECTION['sources'][family],
+            quorum=IP_DETECTION['quorum'],
+            timeout=IP_DETECTION['timeout'],
+            log=lambda message, family=family: log_message(f"[IPv{family}] {message}"),
+        )
+        last_ip = store.get(STATE_NAMESPACE, state_key(family))
+        thread = threading.Thread(target=monitor.run, args=(on_change, stop, last_ip), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    log_message("Monitoring for IP changes.")
+    try:
+        while any(thread.is_alive() for thread in threads):
+            if stop.wait(1):
+                break
+    except KeyboardInterrupt:
+        stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    log_message("Monitor stopped.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a Pushover notification when the external IP changes.")
+    parser.add_argument(
+        "--monitor",
+        action="store_true",
+        help="Keep running and detect changes from netlink/UPnP instead of one web lookup per run.",
+    )
+    args = parser.parse_args()
+    with open_state() as store:
+        if args.monitor:
+            run_monitor(store)
+            return
+
+        check_ip(store, 4)
+        if TRACK_IPV6:
+            check_ip(store, 6)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
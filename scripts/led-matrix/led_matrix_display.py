@@ -6,9 +6,10 @@ Display modes:
   image      Show a single image file until Ctrl+C
   slideshow  Cycle through images in a directory
   spotify    Display album art of the currently playing Spotify track
+  benchmark  Time transition rendering and image decoding (no display needed)
 
 Quick start (Raspberry Pi):
-  sudo pip3 install Pillow pyyaml
+  sudo pip3 install Pillow pyyaml numpy       # numpy optional: faster transitions
   sudo pip3 install rpi-rgb-led-matrix        # hardware driver
   pip3 install spotipy requests               # Spotify (optional)
 
@@ -22,19 +23,25 @@ Development on a non-Pi machine (Tkinter preview window):
 """
 
 import argparse
+import hashlib
 import io
 import logging
 import os
+import queue
 import random
 import re as _re
 import signal
+import struct
 import sys
+import tempfile
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Tuple
 
 import yaml
-from PIL import Image, ImageOps, ImageEnhance, ImageFilter
+from PIL import ExifTags, Image, ImageOps, ImageEnhance, ImageFilter
 
 # ── Optional: RGB Matrix hardware ─────────────────────────────────────────────
 try:
@@ -43,6 +50,13 @@ try:
 except ImportError:
     _MATRIX_OK = False
 
+# ── Optional: NumPy (vectorised transition rendering) ─────────────────────────
+try:
+    import numpy as np
+    _NUMPY_OK = True
+except ImportError:
+    _NUMPY_OK = False
+
 # ── Optional: Tkinter preview (simulation mode) ────────────────────────────────
 # VNC / RaspiConnect web sessions often don't inherit DISPLAY — set a default.
 if 'DISPLAY' not in os.environ:
@@ -137,6 +151,11 @@ DEFAULT_CONFIG: dict = {
         'transition': 'fade',         # none | fade | slide_left | slide_right | slide_up | slide_down | random
         'transition_duration': 0.6,   # Seconds for the transition animation
         'transition_fps': 20,         # Frames per second during transition
+        'transition_cache_mb': 16,    # Rendered transitions kept for looping slideshows (0 = off)
+        'prefetch': 2,                # Slideshow images decoded and fitted ahead of time
+        # Decode large photos only as big as the panel needs: JPEGs at 1/2–1/8 scale,
+        # or the embedded EXIF thumbnail (JPEG, WebP, PNG) when it is big enough.
+        'fast_decode': True,
         # Post-processing applied after downscaling to the panel resolution.
         # These compensate for the softening and colour loss of heavy downscaling.
         'sharpen': 1.2,       # Unsharp-mask strength: 0.0 = off, 1.0 = subtle, 2.0+ = aggressive
@@ -311,18 +330,72 @@ def prepare_image(
     return _enhance_image(canvas, sharpen, saturation, contrast, posterize)
 
 
-def load_image_file(path: str) -> Image.Image:
+EXIF_THUMBNAIL_OFFSET = 0x0201   # JPEGInterchangeFormat (IFD1)
+EXIF_THUMBNAIL_LENGTH = 0x0202   # JPEGInterchangeFormatLength (IFD1)
+
+
+def _exif_thumbnail(img: Image.Image, min_w: int, min_h: int) -> Optional[Image.Image]:
+    """Return the embedded EXIF thumbnail of *img* if it can stand in for the image.
+
+    It must cover (min_w × min_h) and have the image's aspect ratio, which
+    rules out letterboxed thumbnails (e.g. 160×120 for a 3:2 photo).
+    """
+    raw = img.info.get('exif')
+    if not raw:
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset, length = ifd1.get(EXIF_THUMBNAIL_OFFSET), ifd1.get(EXIF_THUMBNAIL_LENGTH)
+        if not offset or not length:
+            return None
+        # Offsets are relative to the TIFF header, after the optional APP1 prefix.
+        tiff = raw[6:] if raw.startswith(b'Exif\x00\x00') else raw
+        thumb = Image.open(io.BytesIO(tiff[offset:offset + length]))
+        thumb.load()
+    except Exception as exc:
+        log.debug("Unreadable EXIF thumbnail: %s", exc)
+        return None
+    if thumb.width < min_w or thumb.height < min_h:
+        return None
+    if abs(thumb.width * img.height - thumb.height * img.width) > 0.02 * thumb.height * img.width:
+        return None
+    return thumb
+
+
+def _open_image(path: str, target_size: Optional[Tuple[int, int]]) -> Image.Image:
+    with Image.open(path) as img:
+        if hasattr(img, 'n_frames') and img.n_frames > 1:
+            img.seek(0)
+        if target_size:
+            thumb = _exif_thumbnail(img, *target_size)
+            if thumb is not None:
+                log.debug("Decode: %s — EXIF thumbnail %dx%d instead of %dx%d",
+                          Path(path).name, thumb.width, thumb.height, img.width, img.height)
+                return thumb
+            if img.format == 'JPEG':
+                # Picks the largest 1/2, 1/4 or 1/8 DCT scale that still covers target_size.
+                full = img.size
+                img.draft(None, target_size)
+                if img.size != full:
+                    log.debug("Decode: %s — JPEG draft %dx%d instead of %dx%d",
+                              Path(path).name, img.width, img.height, *full)
+        return img.copy()
+
+
+def load_image_file(path: str, target_size: Optional[Tuple[int, int]] = None) -> Image.Image:
     """Open an image from disk and return a copy (closes the file handle).
 
+    With *target_size* (width, height) a large image is decoded only as big
+    as needed to cover it: from its EXIF thumbnail when that is large enough,
+    otherwise (JPEG only) at a reduced DCT scale.  Other formats are decoded
+    in full.
+
     When the process runs under sudo and hits a PermissionError (e.g. the
     calling user's home directory is mode 700), this temporarily drops back
     to the original user's UID/GID to open the file, then restores root.
     """
     try:
-        with Image.open(path) as img:
-            if hasattr(img, 'n_frames') and img.n_frames > 1:
-                img.seek(0)
-            return img.copy()
+        return _open_image(path, target_size)
     except PermissionError:
         sudo_uid = os.environ.get('SUDO_UID')
         sudo_gid = os.environ.get('SUDO_GID')
@@ -334,10 +407,7 @@ def load_image_file(path: str) -> Image.Image:
         os.setegid(gid)
         os.seteuid(uid)
         try:
-            with Image.open(path) as img:
-                if hasattr(img, 'n_frames') and img.n_frames > 1:
-                    img.seek(0)
-                return img.copy()
+            return _open_image(path, target_size)
         finally:
             os.seteuid(0)
             os.setegid(0)
@@ -454,7 +524,7 @@ class MatrixDisplay:
         """Display a prepared (rows × cols) RGB image."""
         if self._matrix is not None:
             # Draw to the back buffer then swap on the next VSync — eliminates flicker.
-            self._canvas.SetImage(img.convert('RGB'))
+            self._canvas.SetImage(img if img.mode == 'RGB' else img.convert('RGB'))
             self._canvas = self._matrix.SwapOnVSync(self._canvas)
         elif self._sim is not None:
             self._sim.show(img)
@@ -506,58 +576,43 @@ def _fit(img: Image.Image, display: MatrixDisplay, cfg: dict) -> Image.Image:
     return result
 
 
+def _decode_size(display: MatrixDisplay, cfg: dict) -> Optional[Tuple[int, int]]:
+    """Size load_image_file() has to decode for _fit(), or None for full resolution."""
+    return (display.cols, display.rows) if cfg['display'].get('fast_decode', True) else None
+
+
 # ── Transition engine ──────────────────────────────────────────────────────────
 
-def apply_transition(
-    display: MatrixDisplay,
-    old_img: Optional[Image.Image],
-    new_img: Image.Image,
-    transition: str = 'fade',
-    duration: float = 0.6,
-    fps: int = 20,
-    stop_event=None,
-) -> None:
-    """Animate a transition from old_img to new_img on the display.
+TRANSITIONS = ('fade', 'slide_left', 'slide_right', 'slide_up', 'slide_down')
 
-    If old_img is None or transition is 'none', shows new_img immediately.
-    Supported transitions: none, fade, slide_left, slide_right, slide_up,
-    slide_down, random.
 
-    All frames are pre-rendered before playback so Pillow CPU spikes don't
-    cause uneven frame timing (which shows as flicker on the matrix).
-    """
-    if old_img is None or transition == 'none' or duration <= 0:
-        display.show(new_img)
-        return
+def _fade_alphas(n_frames: int) -> list:
+    # Use perceptual (gamma) alpha: linear blending makes the midpoint
+    # appear darker on LED displays because LEDs are linear but eyes
+    # are not.  A sqrt curve keeps perceived brightness even.
+    return [(i / n_frames) ** 0.5 for i in range(n_frames + 1)]
 
-    if transition == 'random':
-        transition = random.choice(
-            ['fade', 'slide_left', 'slide_right', 'slide_up', 'slide_down']
-        )
 
-    W, H = new_img.width, new_img.height
-    old_rgb = old_img.convert('RGB')
-    new_rgb = new_img.convert('RGB')
-    n_frames = max(2, int(duration * fps))
-    delay = duration / n_frames
+def _slide_offsets(n_frames: int, size: int) -> list:
+    # Use round() instead of int() so each frame advances at least 1px
+    return [round(i / n_frames * size) for i in range(n_frames + 1)]
 
-    log.info("Transition: %s  frames=%d  %.0fms/frame", transition, n_frames + 1, delay * 1000)
 
-    # ── Pre-render all frames before touching the display ─────────────────────
+def _render_frames_pil(
+    old_rgb: Image.Image, new_rgb: Image.Image, transition: str, n_frames: int
+) -> list:
+    """Render every frame as its own PIL image (fallback when NumPy is missing)."""
+    W, H = new_rgb.width, new_rgb.height
+    alphas = _fade_alphas(n_frames)
+    x_offsets = _slide_offsets(n_frames, W)
+    y_offsets = _slide_offsets(n_frames, H)
     frames = []
     for i in range(n_frames + 1):
-        alpha = i / n_frames
-
         if transition == 'fade':
-            # Use perceptual (gamma) alpha: linear blending makes the midpoint
-            # appear darker on LED displays because LEDs are linear but eyes
-            # are not.  A sqrt curve keeps perceived brightness even.
-            alpha_p = alpha ** 0.5
-            frame = Image.blend(old_rgb, new_rgb, alpha_p)
+            frame = Image.blend(old_rgb, new_rgb, alphas[i])
 
         elif transition == 'slide_left':
-            # Use round() instead of int() so each frame advances at least 1px
-            offset = round(alpha * W)
+            offset = x_offsets[i]
             frame = Image.new('RGB', (W, H))
             old_w = W - offset
             if old_w > 0:
@@ -566,7 +621,7 @@ def apply_transition(
                 frame.paste(new_rgb.crop((0, 0, min(offset, W), H)), (old_w, 0))
 
         elif transition == 'slide_right':
-            offset = round(alpha * W)
+            offset = x_offsets[i]
             frame = Image.new('RGB', (W, H))
             old_w = W - offset
             if old_w > 0:
@@ -575,7 +630,7 @@ def apply_transition(
                 frame.paste(new_rgb.crop((W - offset, 0, W, H)), (0, 0))
 
         elif transition == 'slide_up':
-            offset = round(alpha * H)
+            offset = y_offsets[i]
             frame = Image.new('RGB', (W, H))
             old_h = H - offset
             if old_h > 0:
@@ -584,7 +639,7 @@ def apply_transition(
                 frame.paste(new_rgb.crop((0, H - offset, W, H)), (0, old_h))
 
         elif transition == 'slide_down':
-            offset = round(alpha * H)
+            offset = y_offsets[i]
             frame = Image.new('RGB', (W, H))
             old_h = H - offset
             if old_h > 0:
@@ -596,19 +651,282 @@ def apply_transition(
             frame = new_rgb
 
         frames.append(frame)
+    return frames
+
+
+def _render_frames_numpy(old: 'np.ndarray', new: 'np.ndarray', transition: str, n_frames: int) -> 'np.ndarray':
+    """Render all frames into one (n_frames + 1, H, W, 3) uint8 array.
+
+    Produces exactly the same pixels as _render_frames_pil(): the fade is the
+    same truncating float blend as Image.blend(), computed for every frame in
+    one broadcast multiply-add; the slides are plain slice copies into the
+    preallocated output, with no per-frame image objects.
+    """
+    H, W = new.shape[:2]
+    count = n_frames + 1
+
+    if transition == 'fade':
+        alpha = np.asarray(_fade_alphas(n_frames), dtype=np.float32)[:, None, None, None]
+        old_f = old.astype(np.float32)
+        blend = np.empty((count, H, W, 3), dtype=np.float32)
+        np.multiply(new.astype(np.float32) - old_f, alpha, out=blend)
+        blend += old_f
+        # 0 <= alpha <= 1 keeps every value between the two inputs: no clipping needed.
+        return blend.astype(np.uint8)
+
+    frames = np.empty((count, H, W, 3), dtype=np.uint8)
+    if transition == 'slide_left':
+        for frame, offset in zip(frames, _slide_offsets(n_frames, W)):
+            frame[:, :W - offset] = old[:, offset:]
+            frame[:, W - offset:] = new[:, :offset]
+    elif transition == 'slide_right':
+        for frame, offset in zip(frames, _slide_offsets(n_frames, W)):
+            frame[:, offset:] = old[:, :W - offset]
+            frame[:, :offset] = new[:, W - offset:]
+    elif transition == 'slide_up':
+        # The old image moves out; the new one is revealed in place.
+        for frame, offset in zip(frames, _slide_offsets(n_frames, H)):
+            frame[:H - offset] = old[offset:]
+            frame[H - offset:] = new[H - offset:]
+    elif transition == 'slide_down':
+        for frame, offset in zip(frames, _slide_offsets(n_frames, H)):
+            frame[offset:] = old[:H - offset]
+            frame[:offset] = new[:offset]
+    else:
+        frames[:] = new
+    return frames
+
+
+def _array_frame(frame: 'np.ndarray') -> Image.Image:
+    """Hand one rendered frame to the display (a single C-level copy, no drawing)."""
+    return Image.frombuffer('RGB', (frame.shape[1], frame.shape[0]), np.ascontiguousarray(frame), 'raw', 'RGB', 0, 1)
+
+
+def render_transition(
+    old_img: Image.Image, new_img: Image.Image, transition: str, n_frames: int, use_numpy: bool = True
+):
+    """Pre-render a transition; returns a sequence of n_frames + 1 frames.
+
+    With NumPy the result is one (n_frames + 1, H, W, 3) uint8 array,
+    otherwise a list of PIL images.
+    """
+    old_rgb = old_img.convert('RGB')
+    new_rgb = new_img.convert('RGB')
+    if use_numpy and _NUMPY_OK and old_rgb.size == new_rgb.size:
+        return _render_frames_numpy(np.asarray(old_rgb), np.asarray(new_rgb), transition, n_frames)
+    return _render_frames_pil(old_rgb, new_rgb, transition, n_frames)
+
+
+class TransitionCache:
+    """Bounded LRU cache of pre-rendered transition frame sequences.
+
+    Keyed by the content of both images plus transition, duration and fps, so
+    a looping slideshow renders each (previous, next) pair once and replays
+    the stored frames on every later pass.  Once the stored frames exceed
+    max_bytes the least recently used sequences are evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()  # key -> (frames, nbytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def image_key(img: Image.Image) -> tuple:
+        digest = hashlib.blake2b(img.tobytes(), digest_size=16).digest()
+        return img.mode, img.size, digest
+
+    def key(self, old_img: Image.Image, new_img: Image.Image,
+            transition: str, duration: float, fps: int) -> tuple:
+        return self.image_key(old_img), self.image_key(new_img), transition, float(duration), int(fps)
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: tuple, frames) -> None:
+        if _NUMPY_OK and isinstance(frames, np.ndarray):
+            frames.flags.writeable = False   # shared between replays
+            size = frames.nbytes
+        else:
+            size = sum(f.width * f.height * len(f.getbands()) for f in frames)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        self._entries[key] = (frames, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def stats(self) -> str:
+        return (f"{len(self)} sequences, {self.nbytes / 1024:.0f}/{self.max_bytes / 1024:.0f} KiB, "
+                f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions")
+
+
+def apply_transition(
+    display: MatrixDisplay,
+    old_img: Optional[Image.Image],
+    new_img: Image.Image,
+    transition: str = 'fade',
+    duration: float = 0.6,
+    fps: int = 20,
+    stop_event=None,
+    cache: Optional[TransitionCache] = None,
+) -> None:
+    """Animate a transition from old_img to new_img on the display.
+
+    If old_img is None or transition is 'none', shows new_img immediately.
+    Supported transitions: none, fade, slide_left, slide_right, slide_up,
+    slide_down, random.
+
+    All frames are pre-rendered before playback so rendering CPU spikes don't
+    cause uneven frame timing (which shows as flicker on the matrix).  With a
+    cache, a sequence rendered before for the same two images is replayed
+    without rendering it again.
+    """
+    if old_img is None or transition == 'none' or duration <= 0:
+        display.show(new_img)
+        return
+
+    if transition == 'random':
+        transition = random.choice(TRANSITIONS)
+
+    n_frames = max(2, int(duration * fps))
+    delay = duration / n_frames
+
+    log.info("Transition: %s  frames=%d  %.0fms/frame", transition, n_frames + 1, delay * 1000)
+
+    # ── Pre-render all frames before touching the display ─────────────────────
+    frames = None
+    if cache is not None:
+        key = cache.key(old_img, new_img, transition, duration, fps)
+        frames = cache.get(key)
+    if frames is None:
+        frames = render_transition(old_img, new_img, transition, n_frames)
+        if cache is not None:
+            cache.put(key, frames)
 
     # ── Play back at a consistent rate using monotonic clock ──────────────────
     start = time.monotonic()
     for idx, frame in enumerate(frames):
         if stop_event and stop_event.is_set():
             break
-        display.show(frame)
+        display.show(frame if isinstance(frame, Image.Image) else _array_frame(frame))
         target = start + (idx + 1) * delay
         remaining = target - time.monotonic()
         if remaining > 0:
             time.sleep(remaining)
 
 
+def benchmark_transitions(
+    width: int = 64, height: int = 64, duration: float = 0.6, fps: int = 20, repeat: int = 20
+) -> None:
+    """Print how long pre-rendering each transition takes with Pillow and with NumPy."""
+    n_frames = max(2, int(duration * fps))
+    old_img = Image.effect_noise((width, height), 64).convert('RGB')
+    new_img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    print(f"Pre-rendering {n_frames + 1} frames of {width}x{height}, best of {repeat}:")
+    print(f"  {'transition':<12} {'Pillow':>10} {'NumPy':>10}")
+    for transition in TRANSITIONS:
+        timings = []
+        for use_numpy in (False, True):
+            if use_numpy and not _NUMPY_OK:
+                timings.append('n/a')
+                continue
+            best = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                render_transition(old_img, new_img, transition, n_frames, use_numpy=use_numpy)
+                best = min(best, time.perf_counter() - t0)
+            timings.append(f"{best * 1000:.2f} ms")
+        print(f"  {transition:<12} {timings[0]:>10} {timings[1]:>10}")
+
+
+def _exif_with_thumbnail(thumb: Image.Image) -> bytes:
+    """Build a minimal EXIF block (TIFF header, IFD0, IFD1) embedding *thumb* as a JPEG."""
+    buf = io.BytesIO()
+    thumb.save(buf, 'JPEG', quality=85)
+    data = buf.getvalue()
+    ifd0 = struct.pack('>H', 1) + struct.pack('>HHLHH', 0x0112, 3, 1, 1, 0) + struct.pack('>L', 26)
+    ifd1 = (struct.pack('>H', 2)
+            + struct.pack('>HHLL', EXIF_THUMBNAIL_OFFSET, 4, 1, 56)
+            + struct.pack('>HHLL', EXIF_THUMBNAIL_LENGTH, 4, 1, len(data))
+            + struct.pack('>L', 0))
+    return b'MM\x00\x2a' + struct.pack('>L', 8) + ifd0 + ifd1 + data
+
+
+def write_benchmark_corpus(directory: str) -> list:
+    """Write sample images of typical camera and phone sizes; return their paths."""
+    samples = [
+        ('camera_24mp.jpg', (6000, 4000), 'JPEG', True),
+        ('phone_12mp.jpg', (4032, 3024), 'JPEG', False),
+        ('phone_12mp.webp', (4032, 3024), 'WEBP', True),
+        ('artwork_3000.png', (3000, 3000), 'PNG', False),
+    ]
+    base = Image.merge('RGB', (Image.linear_gradient('L'), Image.radial_gradient('L'),
+                               Image.effect_noise((256, 256), 64)))
+    paths = []
+    for name, size, fmt, with_thumbnail in samples:
+        img = base.resize(size, Image.BICUBIC)
+        options = {'compress_level': 1} if fmt == 'PNG' else {'quality': 85}
+        if with_thumbnail:
+            thumb = img.copy()
+            thumb.thumbnail((160, 160))
+            exif = _exif_with_thumbnail(thumb)
+            options['exif'] = b'Exif\x00\x00' + exif if fmt == 'JPEG' else exif
+        path = os.path.join(directory, name)
+        img.save(path, fmt, **options)
+        paths.append(path)
+    return paths
+
+
+def benchmark_decoding(paths: list, width: int, height: int, cfg: dict, repeat: int = 3) -> None:
+    """Print load + prepare time and decoded size per image, full vs. reduced decoding."""
+    d = cfg['display']
+
+    def _prepare(img):
+        return prepare_image(
+            img, width, height, fit_mode=d['fit_mode'], bg=tuple(d['background']),
+            sharpen=d.get('sharpen', 0.0), saturation=d.get('saturation', 1.0),
+            contrast=d.get('contrast', 1.0), pre_blur=d.get('pre_blur', 0.0),
+            posterize=int(d.get('posterize', 0)),
+        )
+
+    print(f"Loading and fitting images for a {width}x{height} panel, best of {repeat}"
+          f" (memory = decoded pixel buffer):")
+    print(f"  {'file':<22} {'source':^11}{'full decode':>22}{'fast decode':>22}   decoded as")
+    for path in paths:
+        results = []
+        for target in (None, (width, height)):
+            best = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                img = load_image_file(str(path), target)
+                _prepare(img)
+                best = min(best, time.perf_counter() - t0)
+            results.append((best, img))
+        (full_s, full), (fast_s, fast) = results
+        buffer_mb = [i.width * i.height * len(i.getbands()) / 1e6 for i in (full, fast)]
+        print(f"  {Path(path).name:<22} {full.width:>5}x{full.height:<5}"
+              f"  {full_s * 1000:>7.0f} ms {buffer_mb[0]:>6.1f} MB"
+              f"  {fast_s * 1000:>7.0f} ms {buffer_mb[1]:>6.1f} MB   {fast.width}x{fast.height}")
+
+
 def _transition_cfg(cfg: dict) -> dict:
     """Extract transition settings from cfg['display']."""
     d = cfg.get('display', {})
@@ -616,6 +934,7 @@ def _transition_cfg(cfg: dict) -> dict:
         'transition': d.get('transition', 'fade'),
         'transition_duration': d.get('transition_duration', 0.6),
         'transition_fps': d.get('transition_fps', 20),
+        'transition_cache_mb': d.get('transition_cache_mb', 16),
     }
 
 
@@ -623,7 +942,7 @@ def _transition_cfg(cfg: dict) -> dict:
 
 def mode_image(display: MatrixDisplay, path: str, cfg: dict, stop_event=None):
     """Show a single image; block until interrupted."""
-    img = load_image_file(path)
+    img = load_image_file(path, _decode_size(display, cfg))
     t = _transition_cfg(cfg)
     apply_transition(display, None, _fit(img, display, cfg),
                      transition=t['transition'],
@@ -635,8 +954,59 @@ def mode_image(display: MatrixDisplay, path: str, cfg: dict, stop_event=None):
         time.sleep(0.5)
 
 
+class _ImagePrefetcher:
+    """Load and fit upcoming slideshow images on a worker thread.
+
+    Up to *depth* fitted images wait in a bounded queue, so decoding a large
+    photo overlaps the display interval of the previous one.  get() returns
+    (path, image, error) tuples in playlist order and None once the playlist
+    is exhausted.
+    """
+
+    def __init__(self, paths, load, depth: int):
+        self._paths = paths
+        self._load = load
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='slideshow-prefetch', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for path in self._paths:
+            if self._stop.is_set():
+                return
+            try:
+                item = (path, self._load(path), None)
+            except Exception as exc:
+                item = (path, None, exc)
+            if not self._put(item):
+                return
+        self._put(None)
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, timeout: float):
+        """Next item; raises queue.Empty if none is ready within *timeout*."""
+        return self._queue.get(timeout=timeout)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
 def mode_slideshow(display: MatrixDisplay, directory: str, cfg: dict, stop_event=None):
-    """Cycle through every image in *directory*."""
+    """Cycle through every image in *directory*.
+
+    The next images are decoded and fitted in the background while the
+    current one is shown, so each transition starts when the interval ends.
+    """
     d = cfg['display']
     interval = float(d['slideshow_interval'])
     loop = bool(d['loop'])
@@ -645,6 +1015,14 @@ def mode_slideshow(display: MatrixDisplay, directory: str, cfg: dict, stop_event
     def _running():
         return display.running and not (stop_event and stop_event.is_set())
 
+    def _wait_until(deadline: float) -> bool:
+        while _running():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.1))
+        return False
+
     all_paths = sorted(
         p for p in Path(directory).iterdir()
         if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
@@ -658,37 +1036,67 @@ def mode_slideshow(display: MatrixDisplay, directory: str, cfg: dict, stop_event
         len(all_paths), interval, loop, do_shuffle,
     )
 
+    def _playlist():
+        while True:
+            paths = list(all_paths)
+            if do_shuffle:
+                random.shuffle(paths)
+            yield from paths
+            if not loop:
+                return
+
     t = _transition_cfg(cfg)
+    cache_bytes = int(float(t['transition_cache_mb']) * 1024 * 1024)
+    cache = TransitionCache(cache_bytes) if cache_bytes > 0 else None
+    prefetch = _ImagePrefetcher(
+        _playlist(),
+        lambda path: _fit(load_image_file(str(path), _decode_size(display, cfg)), display, cfg),
+        int(d.get('prefetch', 2)),
+    )
     prev_img: Optional[Image.Image] = None
+    deadline: Optional[float] = None
+    shown = 0
 
-    while _running():
-        paths = list(all_paths)
-        if do_shuffle:
-            random.shuffle(paths)
-
-        for path in paths:
-            if not _running():
-                return
+    try:
+        while _running():
+            try:
+                item = prefetch.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            path, fitted, error = item
+            if error is not None:
+                log.warning("Skipping %s — %s", path.name, error)
+                continue
+            if deadline is not None:
+                late = time.monotonic() - deadline
+                if late > 0.05:
+                    log.debug("[slideshow] %s was ready %.0fms late", path.name, late * 1000)
+                if not _wait_until(deadline):
+                    return
             try:
-                img = load_image_file(str(path))
-                fitted = _fit(img, display, cfg)
                 apply_transition(display, prev_img, fitted,
                                  transition=t['transition'],
                                  duration=t['transition_duration'],
                                  fps=t['transition_fps'],
-                                 stop_event=stop_event)
-                prev_img = fitted
-                log.info("[slideshow] %s", path.name)
+                                 stop_event=stop_event,
+                                 cache=cache)
             except Exception as exc:
                 log.warning("Skipping %s — %s", path.name, exc)
                 continue
-
+            prev_img = fitted
+            log.info("[slideshow] %s", path.name)
             deadline = time.monotonic() + interval
-            while _running() and time.monotonic() < deadline:
-                time.sleep(0.1)
 
-        if not loop:
-            break
+            shown += 1
+            if cache is not None and shown % len(all_paths) == 0:
+                log.debug("Transition cache: %s", cache.stats())
+
+        if deadline is not None:
+            _wait_until(deadline)
+    finally:
+        prefetch.close()
 
 
 # ── Spotify ────────────────────────────────────────────────────────────────────
@@ -968,6 +1376,7 @@ def main():
             "  %(prog)s slideshow ~/Pictures/ --interval 8 --shuffle\n"
             "  %(prog)s spotify\n"
             "  %(prog)s --simulate image cover.png\n"
+            "  %(prog)s benchmark\n"
         ),
     )
     parser.add_argument(
@@ -1007,6 +1416,11 @@ def main():
         help='Spotify account name as defined in config (default: spotify.default_account)',
     )
 
+    # benchmark
+    p_bm = subs.add_parser('benchmark', help='Time transition rendering and image decoding; no display needed')
+    p_bm.add_argument('directory', nargs='?',
+                      help='Images to time decoding on (default: generated camera/phone-sized samples)')
+
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -1035,6 +1449,20 @@ def main():
         if args.no_loop:
             cfg['display']['loop'] = False
 
+    if args.mode == 'benchmark':
+        t = _transition_cfg(cfg)
+        cols, rows = cfg['matrix']['cols'], cfg['matrix']['rows']
+        benchmark_transitions(cols, rows, t['transition_duration'], t['transition_fps'])
+        print()
+        if args.directory:
+            paths = sorted(p for p in Path(args.directory).iterdir()
+                           if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+            benchmark_decoding(paths, cols, rows, cfg)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                benchmark_decoding(write_benchmark_corpus(tmp), cols, rows, cfg)
+        return
+
     display = MatrixDisplay(cfg, simulate=args.simulate)
 
     if args.mode == 'image':
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+notifier.py: Non-blocking Pushover notifications shared by the scripts in this folder.
+
+How it works:
+- send() only puts the message on a queue and returns; a background thread delivers it
+- One pooled HTTPS session per notifier, so repeated notifications reuse the TLS connection
+- Messages arriving within `coalesce_s` of each other are sent as one digest message
+- Failed deliveries (network errors, HTTP 429/5xx) are retried with exponential backoff
+- At interpreter exit the queue is drained for up to `drain_timeout_s`, so short cron jobs
+  still deliver what they queued
+
+Usage:
+    import notifier
+    pushover = notifier.pushover(user_key, api_token, log=log)
+    pushover.send("Backup finished", title="Raspberry Pi Backup")
+"""
+
+from __future__ import annotations
+
+import atexit
+import configparser
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+import requests
+
+PUSHOVER_API_URL = "https://api.pushover.net/1/messages.json"
+PUSHOVER_MESSAGE_LIMIT = 1024
+PUSHOVER_TITLE_LIMIT = 250
+DEFAULT_COALESCE_S = 2.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_S = 2.0
+DEFAULT_TIMEOUT_S = 10.0
+DEFAULT_DRAIN_TIMEOUT_S = 15.0
+
+_notifiers: dict[tuple[str, str], "PushoverNotifier"] = {}
+_notifiers_lock = threading.Lock()
+
+
+class PushoverNotifier:
+    """Deliver Pushover messages from a background thread."""
+
+    def __init__(
+        self,
+        user_key: str,
+        api_token: str,
+        coalesce_s: float = DEFAULT_COALESCE_S,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_s: float = DEFAULT_BACKOFF_S,
+        timeout_s: float = DEFAULT_TIMEOUT_S,
+        drain_timeout_s: float = DEFAULT_DRAIN_TIMEOUT_S,
+        log: Callable[[str], None] | None = None,
+        api_url: str = PUSHOVER_API_URL,
+    ) -> None:
+        self.user_key = str(user_key)
+        self.api_token = str(api_token)
+        self.coalesce_s = coalesce_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.drain_timeout_s = drain_timeout_s
+        self.log = log or print
+        self.api_url = api_url
+        self.session = requests.Session()
+        self.sent = 0
+        self.failed = 0
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pushover", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def send(self, message: str, title: str | None = None, priority: int = 0) -> None:
+        """Queue *message*; returns immediately."""
+        self._queue.put({"message": str(message), "title": title, "priority": int(priority)})
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued message was delivered or given up; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float | None = None) -> None:
+        """Deliver what is queued (up to *timeout*, default drain_timeout_s) and stop the thread."""
+        if not self._thread.is_alive():
+            return
+        # The sentinel also ends a coalescing wait early, so exiting does not wait out the window.
+        self._queue.put(None)
+        if not self.flush(self.drain_timeout_s if timeout is None else timeout):
+            self.log(f"Pushover: gave up on {self._queue.unfinished_tasks - 1} undelivered notification(s).")
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                return
+            batch = [first]
+            # Collect the rest of a burst so it goes out as one message.
+            deadline = time.monotonic() + self.coalesce_s
+            while not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # handled after this batch
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._deliver(digest(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, payload: dict[str, Any]) -> None:
+        data = {"token": self.api_token, "user": self.user_key, **payload}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.api_url, data=data, timeout=self.timeout_s)
+                if response.status_code < 400:
+                    self.sent += 1
+                    return
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code != 429 and response.status_code < 500:
+                    # Bad token/user or message: retrying will not help.
+                    break
+            except requests.RequestException as exc:
+                error = str(exc)
+            if attempt < self.max_retries:
+                # Keep retrying while draining at exit, but do not sleep past a stop request.
+                if self._stop.wait(self.backoff_s * 2 ** attempt):
+                    break
+        self.failed += 1
+        self.log(f"Failed to send Pushover notification: {error}")
+
+
+def digest(batch: list[dict[str, Any]]) -> dict[str, Any]:
+    """Merge queued notifications into one Pushover payload."""
+    if len(batch) == 1:
+        payload = {key: value for key, value in batch[0].items() if value}
+    else:
+        titles = {item["title"] for item in batch}
+        if len(titles) == 1 and batch[0]["title"]:
+            lines = [f"- {item['message']}" for item in batch]
+            title = f"{batch[0]['title']} ({len(batch)})"
+        else:
+            lines = [
+                f"- {item['title']}: {item['message']}" if item["title"] else f"- {item['message']}" for item in batch
+            ]
+            title = f"{len(batch)} notifications"
+        payload = {"title": title, "message": "\n".join(lines)}
+        priority = max(item["priority"] for item in batch)
+        if priority:
+            payload["priority"] = priority
+    payload["message"] = truncate(payload["message"], PUSHOVER_MESSAGE_LIMIT)
+    if payload.get("title"):
+        payload["title"] = truncate(payload["title"], PUSHOVER_TITLE_LIMIT)
+    return payload
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def pushover(user_key: str, api_token: str, **options: Any) -> PushoverNotifier:
+    """Return the process-wide notifier for these credentials (created on first use)."""
+    key = (str(user_key), str(api_token))
+    with _notifiers_lock:
+        notifier = _notifiers.get(key)
+        if notifier is None:
+            notifier = _notifiers[key] = PushoverNotifier(user_key, api_token, **options)
+        return notifier
+
+
+def read_pushoverrc(path: str = "~/.pushoverrc", profile: str = "Default") -> tuple[str | None, str | None]:
+    """Return (user_key, api_token) from a pushoverrc file (see the pushoverrc example)."""
+    parser = configparser.ConfigParser()
+    parser.read(os.path.expanduser(path))
+    if not parser.has_section(profile):
+        return None, None
+    return parser.get(profile, "user_key", fallback=None), parser.get(profile, "api_token", fallback=None)
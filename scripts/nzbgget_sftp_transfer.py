@@ -65,6 +65,12 @@ import requests
 from pathlib import Path
 from datetime import datetime
 
+try:
+    # Shared non-blocking notifier (scripts/notifier.py); NZBGet may run this file on its own.
+    import notifier
+except ImportError:
+    notifier = None
+
 POSTPROCESS_SUCCESS = 93  # NZBGet success code for post-processing
 POSTPROCESS_ERROR = 94    # NZBGet error code for post-processing failure   
 
@@ -78,13 +84,18 @@ def send_pushover_notification(message):
         logger.error("Pushover credentials are not configured. Please set PUSHOVER_USER_KEY and PUSHOVER_API_TOKEN in NZBGet settings.")
         return
 
+    if notifier is not None:
+        # Delivered in the background so the transfer does not wait on Pushover.
+        notifier.pushover(PUSHOVER_USER_KEY, PUSHOVER_API_TOKEN, log=logger.error).send(message)
+        return
+
     payload = {
         'token': PUSHOVER_API_TOKEN,
         'user': PUSHOVER_USER_KEY,
         'message': message
     }
     try:
-        response = requests.post('https://api.pushover.net/1/messages.json', data=payload)
+        response = requests.post('https://api.pushover.net/1/messages.json', data=payload, timeout=20)
         response.raise_for_status()
         logger.info("Pushover Notification sent successfully.")
     except requests.RequestException as e:
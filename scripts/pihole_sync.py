@@ -10,6 +10,8 @@ This script is intentionally conservative:
 - it reloads Pi-hole on the secondary after changes
 
 It is designed to be run from a management machine with SSH access to both Pi-hole hosts.
+With --batch (or `batch: true` in the config) it runs without a TTY so it can be scheduled
+from cron or systemd timers; failures are reported with a machine-readable error class.
 """
 
 from __future__ import annotations
@@ -21,6 +23,7 @@ import shlex
 import subprocess
 import sys
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 try:
@@ -32,6 +35,26 @@ except ImportError:  # pragma: no cover
 SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
 DEFAULT_CONFIG_PATH = SCRIPT_DIR / "pihole_sync_config.yaml"
 DEFAULT_CONFIG_TEMPLATE = SCRIPT_DIR / "pihole_sync_config.yaml.example"
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_WRITE_TIMEOUT = 120
+
+# Machine-readable error classes reported by classify_ssh_error().
+SSH_ERROR_SUDO_PASSWORD = "sudo_password_required"
+SSH_ERROR_AUTH = "auth_failed"
+SSH_ERROR_HOST_KEY = "host_key_verification_failed"
+SSH_ERROR_CONNECTION = "connection_failed"
+SSH_ERROR_TIMEOUT = "timeout"
+SSH_ERROR_COMMAND = "command_failed"
+
+
+class RemoteCommandError(RuntimeError):
+    """A remote SSH command failed; ``kind`` is one of the SSH_ERROR_* classes."""
+
+    def __init__(self, host: str, kind: str, detail: str) -> None:
+        super().__init__(f"[{host}] {kind}: {detail}")
+        self.host = host
+        self.kind = kind
+        self.detail = detail
 
 
 def log(message: str) -> None:
@@ -155,20 +178,45 @@ def build_record_signature(record: dict[str, Any]) -> str:
     return f"{record['ip']} {' '.join(record['names'])}"
 
 
-def describe_ssh_error(output: str) -> str:
+def classify_ssh_error(output: str) -> str:
     lowered = output.lower()
-    if "sudo: a password is required" in lowered or "a password is required" in lowered:
+    if "a password is required" in lowered:
+        return SSH_ERROR_SUDO_PASSWORD
+    if "permission denied" in lowered and "publickey" in lowered:
+        return SSH_ERROR_AUTH
+    if "host key verification failed" in lowered:
+        return SSH_ERROR_HOST_KEY
+    if any(
+        marker in lowered
+        for marker in (
+            "connection refused",
+            "connection timed out",
+            "could not resolve hostname",
+            "no route to host",
+            "network is unreachable",
+            "connection closed by",
+        )
+    ):
+        return SSH_ERROR_CONNECTION
+    return SSH_ERROR_COMMAND
+
+
+def describe_ssh_error(output: str) -> str:
+    kind = classify_ssh_error(output)
+    if kind == SSH_ERROR_SUDO_PASSWORD:
         return (
             "SSH succeeded, but sudo on the remote Pi-hole requires a password. "
             "Enable passwordless sudo for the Pi user, for example by adding an entry to sudoers."
         )
-    if "permission denied" in lowered and "publickey" in lowered:
+    if kind == SSH_ERROR_AUTH:
         return (
             "SSH authentication failed. Make sure your SSH key is installed on the Pi-hole host "
             "and that the remote user can log in without a password prompt."
         )
-    if "host key verification failed" in lowered:
+    if kind == SSH_ERROR_HOST_KEY:
         return "SSH host key verification failed. Remove the stale host key from ~/.ssh/known_hosts and try again."
+    if kind == SSH_ERROR_CONNECTION:
+        return f"Could not connect to the Pi-hole host: {output.strip()}"
     return output.strip() or "SSH command failed."
 
 
@@ -176,8 +224,18 @@ def run_command(command: list[str], timeout: int = 30) -> subprocess.CompletedPr
     return subprocess.run(command, check=False, text=True, capture_output=True, timeout=timeout)
 
 
-def ssh_command(host: str, user: str, port: int, command: str, strict_host_key: bool = True) -> list[str]:
-    parts = ["ssh", "-tt", "-p", str(port), "-o", "ConnectTimeout=10", "-o", "LogLevel=ERROR"]
+def ssh_command(
+    host: str,
+    user: str,
+    port: int,
+    command: str,
+    strict_host_key: bool = True,
+    tty: bool = True,
+) -> list[str]:
+    parts = ["ssh", "-tt" if tty else "-T", "-p", str(port), "-o", "ConnectTimeout=10", "-o", "LogLevel=ERROR"]
+    if not tty:
+        # Batch transport: never fall back to password or passphrase prompts.
+        parts.extend(["-o", "BatchMode=yes"])
     if not strict_host_key:
         parts.extend(["-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null"])
     if user:
@@ -211,13 +269,63 @@ def run_interactive_ssh(command: list[str], stdout_path: pathlib.Path | None = N
             stdout_handle.close()
 
 
-def read_remote_records(host_cfg: dict[str, Any], global_cfg: dict[str, Any]) -> list[dict[str, Any]]:
+def run_batch_ssh(host: str, command: list[str], timeout: float = 30) -> str:
+    """Run a non-interactive SSH command with piped stdio and return its stdout.
+
+    Raises RemoteCommandError with a classified ``kind`` on timeout or a non-zero exit.
+    """
+    try:
+        result = subprocess.run(
+            command,
+            check=False,
+            text=True,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as exc:
+        raise RemoteCommandError(host, SSH_ERROR_TIMEOUT, f"no response within {timeout}s") from exc
+
+    if result.returncode != 0:
+        output = (result.stderr or "").strip() or f"SSH command failed with exit code {result.returncode}"
+        raise RemoteCommandError(host, classify_ssh_error(output), describe_ssh_error(output))
+    return result.stdout
+
+
+def host_timeout(host_cfg: dict[str, Any], global_cfg: dict[str, Any], key: str, default: int) -> int:
+    return int(host_cfg.get(key) or global_cfg.get(key) or default)
+
+
+def host_sudo_prefix(host_cfg: dict[str, Any], global_cfg: dict[str, Any], batch: bool) -> str:
+    if not batch:
+        return "sudo"
+    prefix = str(host_cfg.get("sudo_prefix") or global_cfg.get("sudo_prefix") or "sudo -n")
+    if prefix.split()[:1] == ["sudo"] and "-n" not in prefix.split():
+        # A password prompt would hang a TTY-less session until the timeout.
+        prefix = prefix.replace("sudo", "sudo -n", 1)
+    return prefix
+
+
+def read_remote_records(
+    host_cfg: dict[str, Any],
+    global_cfg: dict[str, Any],
+    batch: bool = False,
+) -> list[dict[str, Any]]:
     host = str(host_cfg.get("host"))
     ssh_users = [host_cfg.get("ssh_user") or global_cfg.get("ssh_user") or ""]
     port = int(host_cfg.get("ssh_port") or global_cfg.get("ssh_port") or 22)
     strict_host_key = bool(host_cfg.get("strict_host_key_checking", global_cfg.get("strict_host_key_checking", True)))
     remote_path = str(host_cfg.get("remote_dns_file") or global_cfg.get("remote_dns_file") or "/etc/pihole/pihole.toml")
 
+    if batch:
+        sudo = host_sudo_prefix(host_cfg, global_cfg, batch=True)
+        output = run_batch_ssh(
+            host,
+            ssh_command(host, ssh_users[0], port, f"{sudo} cat {shlex.quote(remote_path)}", strict_host_key=strict_host_key, tty=False),
+            timeout=host_timeout(host_cfg, global_cfg, "read_timeout", DEFAULT_READ_TIMEOUT),
+        )
+        return normalize_records(parse_toml_records(output.strip()))
+
     last_error: str | None = None
     for user in ssh_users:
         output_path = pathlib.Path("/tmp") / f"pihole-sync-{host}.toml"
@@ -225,7 +333,7 @@ def read_remote_records(host_cfg: dict[str, Any], global_cfg: dict[str, Any]) ->
         returncode = run_interactive_ssh(
             ssh_command(host, user, port, f"sudo cat {shlex.quote(remote_path)}", strict_host_key=strict_host_key),
             stdout_path=output_path,
-            timeout=60,
+            timeout=host_timeout(host_cfg, global_cfg, "read_timeout", DEFAULT_READ_TIMEOUT),
         )
         if returncode == 0:
             output = output_path.read_text(encoding="utf-8").strip()
@@ -235,13 +343,20 @@ def read_remote_records(host_cfg: dict[str, Any], global_cfg: dict[str, Any]) ->
     raise RuntimeError(f"Could not query remote records from {host}: {describe_ssh_error(last_error or 'SSH command failed')}")
 
 
-def write_remote_records(host_cfg: dict[str, Any], global_cfg: dict[str, Any], records: list[dict[str, Any]]) -> None:
+def write_remote_records(
+    host_cfg: dict[str, Any],
+    global_cfg: dict[str, Any],
+    records: list[dict[str, Any]],
+    batch: bool = False,
+) -> None:
     ssh_users = [host_cfg.get("ssh_user") or global_cfg.get("ssh_user") or ""]
     port = int(host_cfg.get("ssh_port") or global_cfg.get("ssh_port") or 22)
     strict_host_key = bool(host_cfg.get("strict_host_key_checking", global_cfg.get("strict_host_key_checking", True)))
     host = str(host_cfg.get("host"))
     remote_path = str(host_cfg.get("remote_dns_file") or global_cfg.get("remote_dns_file") or "/etc/pihole/pihole.toml")
     rendered = render_toml_hosts_value(records)
+    sudo = host_sudo_prefix(host_cfg, global_cfg, batch)
+    timeout = host_timeout(host_cfg, global_cfg, "write_timeout", DEFAULT_WRITE_TIMEOUT)
 
     remote_python = "\n".join(
         [
@@ -285,20 +400,28 @@ def write_remote_records(host_cfg: dict[str, Any], global_cfg: dict[str, Any], r
     )
     remote_script = "\n".join(
         [
-            "sudo python3 - <<'PY'",
+            f"{sudo} python3 - <<'PY'",
             remote_python,
             "PY",
             "# Pi-hole command variants differ across versions; try common reload paths.",
-            "sudo pihole reloaddns || sudo pihole reloadlists || sudo systemctl restart pihole-FTL",
+            f"{sudo} pihole reloaddns || {sudo} pihole reloadlists || {sudo} systemctl restart pihole-FTL",
         ]
     )
 
+    if batch:
+        run_batch_ssh(
+            host,
+            ssh_command(host, ssh_users[0], port, remote_script, strict_host_key=strict_host_key, tty=False),
+            timeout=timeout,
+        )
+        return
+
     last_error: str | None = None
     for user in ssh_users:
         log(f"[{host}] Waiting for sudo password prompt (if required)...")
         returncode = run_interactive_ssh(
             ssh_command(host, user, port, remote_script, strict_host_key=strict_host_key),
-            timeout=120,
+            timeout=timeout,
         )
         if returncode == 0:
             return
@@ -317,6 +440,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Do not apply changes; exit with non-zero status when drift is detected",
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Non-interactive transport: no TTY, piped output, 'sudo -n', hosts queried concurrently",
+    )
     return parser.parse_args()
 
 
@@ -336,9 +464,18 @@ def main() -> int:
         log("Error: config must define 'primary' and 'secondary' host maps.")
         return 1
 
+    batch = bool(args.batch or cfg.get("batch", False))
+
     try:
-        source_records = normalize_records(read_remote_records(primary, cfg))
-        target_records = normalize_records(read_remote_records(secondary, cfg))
+        if batch:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                source_future = pool.submit(read_remote_records, primary, cfg, True)
+                target_future = pool.submit(read_remote_records, secondary, cfg, True)
+                source_records = normalize_records(source_future.result())
+                target_records = normalize_records(target_future.result())
+        else:
+            source_records = normalize_records(read_remote_records(primary, cfg))
+            target_records = normalize_records(read_remote_records(secondary, cfg))
     except Exception as exc:  # noqa: BLE001
         log(f"Error while reading remote Pi-hole state: {exc}")
         return 1
@@ -378,7 +515,7 @@ def main() -> int:
         return 0
 
     try:
-        write_remote_records(secondary, cfg, source_records)
+        write_remote_records(secondary, cfg, source_records, batch=batch)
     except Exception as exc:  # noqa: BLE001
         log(f"Error applying records: {exc}")
         return 1
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+public_ip.py: Public IPv4/IPv6 address detection shared by azure_ddns_updater.py and ip_changer_notifier.py.
+
+How it works:
+- Queries several sources at once, each with a short timeout
+- Returns as soon as `quorum` sources report the same address; slow or hanging sources are not waited for
+- Source types:
+    - "https://..." / "http://...": echo services that return the address as plain text
+    - "stun:HOST[:PORT]": STUN binding request (RFC 5389), over IPv4 or IPv6
+    - "upnp" or "upnp:DESCRIPTION_URL": the router's UPnP IGD GetExternalIPAddress (IPv4 only)
+    - "natpmp:GATEWAY": NAT-PMP external address request to the router (IPv4 only)
+
+IPMonitor watches for changes with local signals instead of polling web services:
+netlink address events on the WAN interface (Linux) and cheap UPnP queries to the
+router, falling back to the sources above only while those are unavailable.
+
+Run it directly to print the detected addresses:
+    python3 public_ip.py [-6] [--source URL ...] [--quorum N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import ipaddress
+import os
+import re
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable
+from urllib.parse import urljoin
+
+import requests
+
+DEFAULT_SOURCES = {
+    4: [
+        "https://api.ipify.org",
+        "https://ipv4.icanhazip.com",
+        "https://checkip.amazonaws.com",
+        "stun:stun.l.google.com:19302",
+    ],
+    6: [
+        "https://api6.ipify.org",
+        "https://ipv6.icanhazip.com",
+        "stun:stun.l.google.com:19302",
+    ],
+}
+DEFAULT_QUORUM = 2
+DEFAULT_TIMEOUT = 3.0
+
+STUN_MAGIC_COOKIE = 0x2112A442
+STUN_BINDING_REQUEST = 0x0001
+STUN_BINDING_SUCCESS = 0x0101
+STUN_ATTR_MAPPED_ADDRESS = 0x0001
+STUN_ATTR_XOR_MAPPED_ADDRESS = 0x0020
+NATPMP_PORT = 5351
+SSDP_ADDRESS = ("239.255.255.250", 1900)
+# Netlink (rtnetlink) address notifications, see linux/rtnetlink.h and linux/if_addr.h.
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_FLAGS = 8
+IFA_F_TEMPORARY = 0x01
+IFA_F_DEPRECATED = 0x20
+UPNP_WAN_SERVICES = (
+    "urn:schemas-upnp-org:service:WANIPConnection:2",
+    "urn:schemas-upnp-org:service:WANIPConnection:1",
+    "urn:schemas-upnp-org:service:WANPPPConnection:1",
+)
+
+# Discovered UPnP control endpoints, keyed by the source string, so a long-running
+# caller only does the SSDP search and description download once.
+_upnp_endpoints: dict[str, tuple[str, str]] = {}
+_upnp_lock = threading.Lock()
+
+
+class IPDetectionError(Exception):
+    """No address was reported by enough sources."""
+
+
+def parse_address(text: str, family: int) -> str:
+    """Return *text* as a normalized address of the requested family (ValueError otherwise)."""
+    address = ipaddress.ip_address(text.strip())
+    if address.version != family:
+        raise ValueError(f"expected an IPv{family} address, got {address}")
+    return str(address)
+
+
+def query_http(url: str, family: int, timeout: float, session: requests.Session | None = None) -> str:
+    response = (session or requests).get(url, timeout=timeout)
+    response.raise_for_status()
+    return parse_address(response.text, family)
+
+
+def split_host_port(value: str, default_port: int) -> tuple[str, int]:
+    """Split HOST[:PORT]; IPv6 literals go in brackets ([::1]:3478)."""
+    match = re.fullmatch(r"\[(.+)\](?::(\d+))?|([^:]+)(?::(\d+))?", value)
+    if not match:
+        raise ValueError(f"invalid host:port '{value}'")
+    host = match.group(1) or match.group(3)
+    port = match.group(2) or match.group(4)
+    return host, int(port) if port else default_port
+
+
+def query_stun(target: str, family: int, timeout: float) -> str:
+    """Send a STUN binding request to HOST[:PORT] and return the mapped address."""
+    host, port = split_host_port(target, 3478)
+    af = socket.AF_INET if family == 4 else socket.AF_INET6
+    sockaddr = socket.getaddrinfo(host, port, af, socket.SOCK_DGRAM)[0][4]
+    transaction = os.urandom(12)
+    request = struct.pack(">HHI", STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE) + transaction
+    with socket.socket(af, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(request, sockaddr)
+        while True:
+            data, _ = sock.recvfrom(2048)
+            if len(data) >= 20 and data[8:20] == transaction:
+                break
+    message_type, length = struct.unpack_from(">HH", data)
+    if message_type != STUN_BINDING_SUCCESS:
+        raise ValueError(f"STUN error response (type 0x{message_type:04x})")
+    mapped = None
+    position = 20
+    while position + 4 <= min(len(data), 20 + length):
+        attr_type, attr_length = struct.unpack_from(">HH", data, position)
+        value = data[position + 4:position + 4 + attr_length]
+        position += 4 + (attr_length + 3) // 4 * 4
+        if attr_type not in (STUN_ATTR_XOR_MAPPED_ADDRESS, STUN_ATTR_MAPPED_ADDRESS) or len(value) < 8:
+            continue
+        raw = value[4:]
+        if attr_type == STUN_ATTR_XOR_MAPPED_ADDRESS:
+            mask = struct.pack(">I", STUN_MAGIC_COOKIE) + transaction
+            raw = bytes(b ^ mask[i] for i, b in enumerate(raw))
+        address = str(ipaddress.ip_address(raw[:4] if value[1] == 0x01 else raw[:16]))
+        if attr_type == STUN_ATTR_XOR_MAPPED_ADDRESS:
+            return parse_address(address, family)
+        mapped = address
+    if mapped is None:
+        raise ValueError("STUN response has no mapped address")
+    return parse_address(mapped, family)
+
+
+def query_natpmp(gateway: str, timeout: float) -> str:
+    """Ask a NAT-PMP gateway (RFC 6886) for its external IPv4 address."""
+    host, port = split_host_port(gateway, NATPMP_PORT)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(b"\x00\x00", (host, port))
+        data, _ = sock.recvfrom(64)
+    if len(data) < 12 or data[0] != 0 or data[1] != 128:
+        raise ValueError("invalid NAT-PMP response")
+    result_code, = struct.unpack_from(">H", data, 2)
+    if result_code != 0:
+        raise ValueError(f"NAT-PMP result code {result_code}")
+    return parse_address(socket.inet_ntoa(data[8:12]), 4)
+
+
+def discover_upnp_location(timeout: float) -> str:
+    """Find the router's IGD description URL with an SSDP M-SEARCH."""
+    search = (
+        "M-SEARCH * HTTP/1.1\r\n"
+        f"HOST: {SSDP_ADDRESS[0]}:{SSDP_ADDRESS[1]}\r\n"
+        'MAN: "ssdp:discover"\r\n'
+        "MX: 1\r\n"
+        "ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n\r\n"
+    ).encode()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(search, SSDP_ADDRESS)
+        while True:
+            data, _ = sock.recvfrom(4096)
+            match = re.search(rb"(?im)^location:\s*(\S+)", data)
+            if match:
+                return match.group(1).decode()
+
+
+def upnp_endpoint(location: str, timeout: float, session: requests.Session | None = None) -> tuple[str, str]:
+    """Return (control URL, service type) of the WAN connection service described at *location*."""
+    response = (session or requests).get(location, timeout=timeout)
+    response.raise_for_status()
+    root = ET.fromstring(response.content)
+    base = root.findtext("{*}URLBase") or location
+    for service in root.iter("{urn:schemas-upnp-org:device-1-0}service"):
+        service_type = service.findtext("{*}serviceType")
+        if service_type in UPNP_WAN_SERVICES:
+            return urljoin(base, service.findtext("{*}controlURL") or ""), service_type
+    raise ValueError(f"no WANIPConnection/WANPPPConnection service in {location}")
+
+
+def query_upnp(location: str, timeout: float, session: requests.Session | None = None) -> str:
+    """GetExternalIPAddress from the router's UPnP IGD. *location* "" means discover it with SSDP."""
+    key = location or "ssdp"
+    with _upnp_lock:
+        endpoint = _upnp_endpoints.get(key)
+    if endpoint is None:
+        endpoint = upnp_endpoint(location or discover_upnp_location(timeout), timeout, session)
+        with _upnp_lock:
+            _upnp_endpoints[key] = endpoint
+    control_url, service_type = endpoint
+    body = (
+        '<?xml version="1.0"?>'
+        '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+        's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+        f'<s:Body><u:GetExternalIPAddress xmlns:u="{service_type}"/></s:Body></s:Envelope>'
+    )
+    try:
+        response = (session or requests).post(
+            control_url,
+            data=body,
+            headers={
+                "Content-Type": 'text/xml; charset="utf-8"',
+                "SOAPAction": f'"{service_type}#GetExternalIPAddress"',
+            },
+            timeout=timeout,
+        )
+        response.raise_for_status()
+    except requests.RequestException:
+        # The router may have rebooted with a new control URL; discover again next time.
+        with _upnp_lock:
+            _upnp_endpoints.pop(key, None)
+        raise
+    address = ET.fromstring(response.content).findtext(".//{*}NewExternalIPAddress")
+    if not address:
+        raise ValueError("router did not report an external address")
+    return parse_address(address, 4)
+
+
+def source_query(
+    source: str, family: int, timeout: float, session: requests.Session | None = None
+) -> Callable[[], str]:
+    """Return a zero-argument callable that queries *source* for an address of *family*."""
+    if source.startswith(("http://", "https://")):
+        return lambda: query_http(source, family, timeout, session)
+    if source.startswith("stun:"):
+        return lambda: query_stun(source[len("stun:"):], family, timeout)
+    if source == "upnp" or source.startswith("upnp:"):
+        if family != 4:
+            raise ValueError("UPnP sources only report IPv4 addresses")
+        return lambda: query_upnp(source[len("upnp:"):], timeout, session)
+    if source.startswith("natpmp:"):
+        if family != 4:
+            raise ValueError("NAT-PMP sources only report IPv4 addresses")
+        return lambda: query_natpmp(source[len("natpmp:"):], timeout)
+    raise ValueError(f"Unknown IP source '{source}' (use http(s)://, stun:, upnp or natpmp:)")
+
+
+def detect_public_ip(
+    family: int = 4,
+    sources: list[str] | None = None,
+    quorum: int = DEFAULT_QUORUM,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: requests.Session | None = None,
+) -> str:
+    """Return the public address of *family* (4 or 6) once *quorum* sources agree.
+
+    All sources are queried concurrently. The call returns as soon as one
+    address has *quorum* votes (capped at the number of sources), so it takes
+    about as long as the quorum-th fastest source and never much more than
+    *timeout*. Raises IPDetectionError when the sources fail or disagree.
+    """
+    if family not in (4, 6):
+        raise ValueError("family must be 4 or 6")
+    sources = list(sources or DEFAULT_SOURCES[family])
+    quorum = min(max(int(quorum), 1), len(sources))
+    queries = {source: source_query(source, family, timeout, session) for source in sources}
+
+    votes: dict[str, list[str]] = {}
+    errors: dict[str, str] = {}
+    deadline = time.monotonic() + timeout + 1.0
+    executor = ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="public-ip")
+    try:
+        pending = {executor.submit(query): source for source, query in queries.items()}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    address = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    errors[source] = str(exc) or type(exc).__name__
+                    continue
+                votes.setdefault(address, []).append(source)
+                if len(votes[address]) >= quorum:
+                    return address
+        for source in pending.values():
+            errors[source] = "timed out"
+    finally:
+        # Do not wait for slow sources once the answer is known.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    reported = "; ".join(f"{address} from {', '.join(names)}" for address, names in votes.items()) or "no address"
+    failures = "; ".join(f"{source}: {error}" for source, error in errors.items())
+    message = f"No IPv{family} address reported by {quorum} source(s) ({reported})"
+    raise IPDetectionError(message + (f". Errors: {failures}" if failures else ""))
+
+
+def detection_settings(config: dict[str, Any]) -> dict[str, Any]:
+    """Read the shared ip_detection block of a script config ({sources: {ipv4, ipv6}, quorum, timeout})."""
+    block = config.get("ip_detection") or {}
+    if not isinstance(block, dict):
+        raise ValueError("ip_detection must be a YAML mapping/object.")
+    sources = block.get("sources") or {}
+    if not isinstance(sources, dict):
+        raise ValueError("ip_detection.sources must map ipv4/ipv6 to lists of sources.")
+    return {
+        "sources": {4: sources.get("ipv4") or DEFAULT_SOURCES[4], 6: sources.get("ipv6") or DEFAULT_SOURCES[6]},
+        "quorum": int(block.get("quorum", DEFAULT_QUORUM)),
+        "timeout": float(block.get("timeout", DEFAULT_TIMEOUT)),
+    }
+
+
+def parse_netlink_addresses(data: bytes, ifindex: int) -> list[tuple[str, int, str]]:
+    """Return ("new"/"del", family, address) for each RTM_NEWADDR/RTM_DELADDR message about *ifindex*.
+
+    Temporary (IPv6 privacy) and deprecated addresses are skipped: they come and
+    go on their own schedule and are never the address to publish.
+    """
+    events = []
+    position = 0
+    while position + 16 <= len(data):
+        length, message_type = struct.unpack_from("=IH", data, position)
+        if length < 16:
+            break
+        message = data[position + 16:position + length]
+        position += (length + 3) // 4 * 4
+        if message_type not in (RTM_NEWADDR, RTM_DELADDR) or len(message) < 8:
+            continue
+        af, _, flags, _, index = struct.unpack_from("=BBBBI", message)
+        if index != ifindex or af not in (socket.AF_INET, socket.AF_INET6):
+            continue
+        attributes = {}
+        offset = 8
+        while offset + 4 <= len(message):
+            attr_length, attr_type = struct.unpack_from("=HH", message, offset)
+            if attr_length < 4:
+                break
+            attributes[attr_type] = message[offset + 4:offset + attr_length]
+            offset += (attr_length + 3) // 4 * 4
+        if len(attributes.get(IFA_FLAGS, b"")) == 4:
+            # The 8-bit ifa_flags only holds the low flags; IFA_FLAGS carries all of them.
+            (flags,) = struct.unpack("=I", attributes[IFA_FLAGS])
+        if flags & (IFA_F_TEMPORARY | IFA_F_DEPRECATED):
+            continue
+        # IFA_LOCAL is the interface's own address on point-to-point links (PPPoE); IFA_ADDRESS the peer there.
+        raw = attributes.get(IFA_LOCAL) or attributes.get(IFA_ADDRESS)
+        if raw:
+            kind = "new" if message_type == RTM_NEWADDR else "del"
+            events.append((kind, 4 if af == socket.AF_INET else 6, str(ipaddress.ip_address(raw))))
+    return events
+
+
+class NetlinkAddressWatcher:
+    """Receive address add/remove events of one network interface (Linux only)."""
+
+    def __init__(self, interface: str) -> None:
+        if not hasattr(socket, "AF_NETLINK"):
+            raise OSError("netlink is only available on Linux")
+        self.interface = interface
+        self.ifindex = socket.if_nametoindex(interface)
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def read(self) -> list[tuple[str, int, str]]:
+        return parse_netlink_addresses(self.sock.recv(65536), self.ifindex)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class IPMonitor:
+    """Report public address changes using local signals first.
+
+    - netlink (*interface*): a stable global address appearing on the interface
+      is the public one (PPPoE, IPv6); temporary and deprecated addresses are
+      ignored, any other address event triggers a check at once
+    - UPnP (*upnp_source*): the router is asked every *poll_interval* seconds;
+      a LAN request, no traffic leaves the network
+    - the regular *sources* (detect_public_ip) only while UPnP is unavailable,
+      at most every *fallback_interval* seconds
+
+    UPnP answers that are not global addresses (carrier-grade NAT) count as unavailable.
+    """
+
+    def __init__(
+        self,
+        family: int = 4,
+        interface: str | None = None,
+        upnp_source: str | None = "upnp",
+        poll_interval: float = 30.0,
+        fallback_interval: float = 900.0,
+        sources: list[str] | None = None,
+        quorum: int = DEFAULT_QUORUM,
+        timeout: float = DEFAULT_TIMEOUT,
+        log: Callable[[str], None] | None = None,
+    ) -> None:
+        self.family = family
+        self.interface = interface
+        self.upnp_query = source_query(upnp_source, 4, timeout) if upnp_source and family == 4 else None
+        self.poll_interval = poll_interval
+        self.fallback_interval = fallback_interval
+        self.sources = sources
+        self.quorum = quorum
+        self.timeout = timeout
+        self.log = log or (lambda message: None)
+        self.upnp_available: bool | None = None
+        self.last_fallback: float | None = None
+
+    def check(self) -> tuple[str | None, str]:
+        """Return (address or None, how it was obtained) for one scheduled check."""
+        if self.upnp_query is not None:
+            try:
+                address = self.upnp_query()
+                if not ipaddress.ip_address(address).is_global:
+                    raise ValueError(f"router reports non-public address {address} (carrier-grade NAT?)")
+                if self.upnp_available is not True:
+                    self.log("Using the router's UPnP external address.")
+                self.upnp_available = True
+                return address, "upnp"
+            except (requests.RequestException, OSError, ValueError, ET.ParseError) as exc:
+                if self.upnp_available is not False:
+                    self.log(f"UPnP unavailable ({exc}); web lookups every {self.fallback_interval:g}s instead.")
+                self.upnp_available = False
+        now = time.monotonic()
+        if self.last_fallback is not None and now - self.last_fallback < self.fallback_interval:
+            return None, "skipped"
+        self.last_fallback = now
+        try:
+            return detect_public_ip(self.family, self.sources, self.quorum, self.timeout), "lookup"
+        except IPDetectionError as exc:
+            self.log(f"Lookup failed: {exc}")
+            return None, "lookup"
+
+    def run(
+        self,
+        on_change: Callable[[str, str | None, str], None],
+        stop: threading.Event,
+        last: str | None = None,
+    ) -> None:
+        """Call on_change(address, previous, how) whenever the address changes, until *stop* is set."""
+        watcher = None
+        if self.interface:
+            try:
+                watcher = NetlinkAddressWatcher(self.interface)
+                self.log(f"Watching address events on {self.interface}.")
+            except OSError as exc:
+                self.log(f"Cannot watch {self.interface} ({exc}); polling only.")
+
+        def report(address: str | None, how: str) -> None:
+            nonlocal last
+            if address is not None and address != last:
+                previous, last = last, address
+                on_change(address, previous, how)
+
+        next_check = 0.0
+        try:
+            while not stop.is_set():
+                wait_for = min(max(next_check - time.monotonic(), 0.0), 1.0)
+                if watcher is not None:
+                    readable, _, _ = select.select([watcher], [], [], wait_for)
+                    for kind, family, address in watcher.read() if readable else []:
+                        if family != self.family:
+                            continue
+                        if kind == "new" and ipaddress.ip_address(address).is_global:
+                            report(address, "netlink")
+                        else:
+                            # Link went down/up or got a private address: ask the router now.
+                            next_check = 0.0
+                            self.last_fallback = None
+                elif wait_for:
+                    stop.wait(wait_for)
+                if time.monotonic() >= next_check:
+                    report(*self.check())
+                    next_check = time.monotonic() + self.poll_interval
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Print the public IP address agreed on by several sources.")
+    parser.add_argument("-6", dest="family", action="store_const", const=6, default=4, help="Detect IPv6 instead.")
+    parser.add_argument("--source", action="append", help="Source to query (repeatable; default: built-in list).")
+    parser.add_argument("--quorum", type=int, default=DEFAULT_QUORUM, help="Sources that must agree.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-source timeout in seconds.")
+    args = parser.parse_args()
+    try:
+        print(detect_public_ip(args.family, args.source, args.quorum, args.timeout))
+    except (IPDetectionError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
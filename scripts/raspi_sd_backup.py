@@ -5,29 +5,53 @@ raspi_sd_backup.py: Create full Raspberry Pi SD card image backups over SSH and
 How it works:
 - Reads host and backup settings from raspi_sd_backup_config.yaml
 - Connects to each Raspberry Pi via SSH
-- Streams a compressed image of the SD device to this Mac
+- Streams a compressed image (gzip/pigz/zstd/xz, compressed on the Pi or on this Mac) of the SD device to this Mac (several hosts in parallel if max_parallel > 1)
 - Saves each backup under backup_root/<host_name>/
-- Writes a SHA256 checksum file
-- Prunes old backups based on retention_count
+- Writes a SHA256 checksum file (and optional extra digests), hashed while the stream is written
+- Prunes old backups with a daily/weekly/monthly retention policy (or simply the newest retention_count)
+- Optional chunk store backend: content-defined chunks stored once, one manifest per backup
+- Optional image_mode "used": only allocated ext4/FAT blocks are streamed (expand with --expand)
+- Optional image_mode "incremental": only blocks changed since the previous backup are streamed
+- Optional resumable full images: read in segments and continued after a dropped connection
+- Logs device/network progress, MB/s and ETA while streaming; writes a JSON metrics file per run
+- --verify checks backups against their checksum files; --restore writes one to a card or back to a Pi
 
 Notes:
-- This performs a live image backup. For the most consistent image, stop write-heavy services beforehand.
+- This performs a live image backup. For the most consistent image, stop write-heavy services with
+  pre_backup hooks (post_backup hooks always run afterwards to start them again).
 - Remote user must be able to run `sudo -n dd` without interactive password prompts.
 """
 
 from __future__ import annotations
 
 import argparse
+import collections
+import contextlib
+import dataclasses
 import datetime as dt
+import gzip
 import hashlib
+import io
+import json
+import lzma
+import os
 import pathlib
+import re
 import shlex
+import shutil
+import stat
+import struct
 import subprocess
 import sys
-from typing import Any
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, BinaryIO, Iterator
 
 try:
-    import requests
+    import requests  # noqa: F401  (used by notifier)
 except ImportError:  # pragma: no cover
     print("Error: Missing dependency 'requests'. Install with: pip install requests")
     sys.exit(1)
@@ -38,9 +62,481 @@ except ImportError:  # pragma: no cover
     print("Error: Missing dependency 'pyyaml'. Install with: pip install pyyaml")
     sys.exit(1)
 
+import notifier
+
 SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
 DEFAULT_CONFIG_PATH = SCRIPT_DIR / "raspi_sd_backup_config.yaml"
 DEFAULT_LOG_PATH = SCRIPT_DIR / "raspi_sd_backup.log"
+STREAM_CHUNK_SIZE = 1024 * 1024
+DEFAULT_CHECKSUMS = ["sha256"]
+DEFAULT_BENCHMARK_MB = 256
+DEFAULT_BENCHMARK_CANDIDATES = ["gzip:remote", "pigz:remote", "zstd:remote", "zstd:local", "xz:local", "none:local"]
+
+# codec -> image file suffix and (min level, max level, default level)
+CODECS: dict[str, dict[str, Any]] = {
+    "gzip": {"suffix": ".gz", "levels": (1, 9, 1)},
+    "pigz": {"suffix": ".gz", "levels": (1, 9, 1)},
+    "zstd": {"suffix": ".zst", "levels": (1, 19, 3)},
+    "xz": {"suffix": ".xz", "levels": (0, 9, 1)},
+    "none": {"suffix": "", "levels": (0, 0, 0)},
+}
+
+
+# Chunk store backend: content-defined chunks named by sha256, one manifest per backup.
+CHUNK_BLOCK = 4096
+DEFAULT_CHUNK_AVERAGE = 1024 * 1024
+CHUNK_CODECS = ("zlib", "lzma", "none")
+MANIFEST_SUFFIX = ".manifest.json"
+
+# Extent stream ("rsbx") written by REMOTE_EXTENT_AGENT:
+#   MAGIC, then records: b"M" + >I length + JSON metadata
+#                        b"D" + >Q device offset + >I length + data
+#                        b"E" end of stream
+# Ranges that are not covered by a D record are zero in the restored image.
+# An incremental stream ("rsbd") has a header naming its base backup; ranges
+# without a D record are taken from the expanded base instead.
+EXTENT_MAGIC = b"RSBX1\n"
+IMAGE_BASE_SUFFIXES = {"full": ".img", "used": ".rsbx", "incremental": ".rsbd"}
+
+# Incremental mode: the Pi hashes fixed-size blocks (16-byte BLAKE2b) and only
+# sends blocks whose digest differs from the previous backup's block map.
+DEFAULT_INCREMENTAL_BLOCK_MB = 4
+DEFAULT_FULL_EVERY = 6
+BLOCK_DIGEST_SIZE = 16
+BLOCKMAP_SUFFIX = ".blockmap.json"
+BLOCKMAP_STDERR_PREFIX = "RSB-BLOCKMAP "
+
+# Resumable full images: the device is read in dd segments, each compressed as
+# its own gzip member / zstd frame / xz stream and appended to the .partial file.
+# After every segment the state file records where to continue.
+RESUME_STATE_SUFFIX = ".state.json"
+DD_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_RESUME_SEGMENT_MB = 1024
+
+# Progress lines on the remote stderr: dd status=progress / its final summary,
+# and the extent agent's "RSB-PROGRESS <done> <total>".
+DD_PROGRESS_RE = re.compile(rb"^(\d+) bytes")
+AGENT_PROGRESS_RE = re.compile(rb"^RSB-PROGRESS (\d+) (\d+)")
+
+# pre_backup/post_backup hook commands run over a multiplexed SSH master
+# connection (ControlMaster) that every ssh call for the host shares.
+DEFAULT_HOOK_TIMEOUT_S = 300
+SSH_MASTER_PERSIST_S = 600
+
+# Runs on the Pi as root (python3 -c). Reads the partition table and the ext2/3/4
+# block bitmaps / FAT tables, then streams only allocated ranges as an extent stream.
+# In "incremental" mode it reads the previous block digests from stdin instead and
+# streams only changed blocks; the new digests are reported on stderr.
+REMOTE_EXTENT_AGENT = r'''
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+CHUNK = 4 * 1024 * 1024
+MAGIC = b"RSBX1\n"
+out = sys.stdout.buffer
+last_progress = 0.0
+
+
+def emit_meta(obj):
+    data = json.dumps(obj).encode()
+    out.write(b"M" + struct.pack(">I", len(data)) + data)
+
+
+def report_progress(done, total, force=False):
+    global last_progress
+    now = time.monotonic()
+    if force or now - last_progress >= 1:
+        last_progress = now
+        sys.stderr.write(f"RSB-PROGRESS {done} {total}\n")
+        sys.stderr.flush()
+
+
+def read_at(f, offset, length):
+    f.seek(offset)
+    return f.read(length)
+
+
+def partitions(f, size):
+    mbr = read_at(f, 0, 512)
+    if len(mbr) < 512 or mbr[510:512] != b"\x55\xaa":
+        return []
+    found = []
+    for i in range(4):
+        ptype = mbr[446 + 16 * i + 4]
+        start, count = struct.unpack_from("<II", mbr, 446 + 16 * i + 8)
+        if ptype == 0xEE:
+            return gpt_partitions(f, size)
+        if ptype and count:
+            # Logical partitions inside an extended one are copied as a single raw range.
+            raw = ptype in (0x05, 0x0F, 0x85)
+            found.append({"number": i + 1, "start": start * 512, "size": count * 512, "raw": raw})
+    return found
+
+
+def gpt_partitions(f, size):
+    header = read_at(f, 512, 512)
+    if header[:8] != b"EFI PART":
+        return []
+    entries_lba, count, entry_size = struct.unpack_from("<QII", header, 72)
+    table = read_at(f, entries_lba * 512, count * entry_size)
+    found = []
+    for i in range(count):
+        entry = table[i * entry_size:(i + 1) * entry_size]
+        if len(entry) < 48 or entry[:16] == bytes(16):
+            continue
+        first, last = struct.unpack_from("<QQ", entry, 32)
+        found.append({"number": i + 1, "start": first * 512, "size": (last - first + 1) * 512, "raw": False})
+    # Backup GPT header and entries live in the last 33 sectors.
+    found.append({"number": 0, "start": size - 33 * 512, "size": 33 * 512, "raw": True})
+    return found
+
+
+def bitmap_runs(bits, limit):
+    for match in re.finditer(rb"[^\x00]+", bits):
+        start = match.start() * 8
+        end = min(match.end() * 8, limit)
+        if start < end:
+            yield start, end - start
+
+
+def ext_used(f, base):
+    sb = read_at(f, base + 1024, 1024)
+    if len(sb) < 1024 or struct.unpack_from("<H", sb, 56)[0] != 0xEF53:
+        return None
+    blocks, = struct.unpack_from("<I", sb, 4)
+    first_data, log_bs = struct.unpack_from("<II", sb, 20)
+    per_group, = struct.unpack_from("<I", sb, 32)
+    incompat, = struct.unpack_from("<I", sb, 96)
+    reserved_gdt, = struct.unpack_from("<H", sb, 0xCE)
+    bs = 1024 << log_bs
+    desc_size = 32
+    if incompat & 0x80:
+        blocks |= struct.unpack_from("<I", sb, 0x150)[0] << 32
+        desc_size = max(struct.unpack_from("<H", sb, 0xFE)[0], 32)
+    groups = (blocks - first_data + per_group - 1) // per_group
+    gdt_blocks = (groups * desc_size + bs - 1) // bs
+    gdt = read_at(f, base + (first_data + 1) * bs, groups * desc_size)
+    used = [(0, first_data + 1)]
+    for g in range(groups):
+        desc = gdt[g * desc_size:(g + 1) * desc_size]
+        bitmap, = struct.unpack_from("<I", desc, 0)
+        flags, = struct.unpack_from("<H", desc, 0x12)
+        if desc_size >= 64:
+            bitmap |= struct.unpack_from("<I", desc, 0x20)[0] << 32
+        group_start = first_data + g * per_group
+        group_len = min(per_group, blocks - group_start)
+        if flags & 0x2:
+            # BLOCK_UNINIT: only the superblock/descriptor backup can be in use.
+            used.append((group_start, min(group_len, 1 + gdt_blocks + reserved_gdt)))
+            continue
+        bits = read_at(f, base + bitmap * bs, (group_len + 7) // 8)
+        used.extend((group_start + start, length) for start, length in bitmap_runs(bits, group_len))
+    return [(start * bs, length * bs) for start, length in used]
+
+
+def fat_used(f, base):
+    bpb = read_at(f, base, 512)
+    if len(bpb) < 512 or bpb[510:512] != b"\x55\xaa":
+        return None
+    bps, spc, reserved, nfats, root_entries, total16 = struct.unpack_from("<HBHBHH", bpb, 11)
+    fat16_size, = struct.unpack_from("<H", bpb, 22)
+    total32, fat32_size = struct.unpack_from("<II", bpb, 32)
+    if bps not in (512, 1024, 2048, 4096) or not spc or not nfats:
+        return None
+    fat_size = fat16_size or fat32_size
+    total = total16 or total32
+    data_start = reserved + nfats * fat_size + (root_entries * 32 + bps - 1) // bps
+    clusters = (total - data_start) // spc
+    if clusters < 4085:
+        return None
+    wide = clusters >= 65525
+    table = read_at(f, base + reserved * bps, fat_size * bps)
+    entries = struct.unpack_from(f"<{clusters + 2}{'I' if wide else 'H'}", table)
+    mask = 0x0FFFFFFF if wide else 0xFFFF
+    cluster_bytes = spc * bps
+    used = [(0, data_start * bps)]
+    for index in range(2, clusters + 2):
+        if entries[index] & mask:
+            used.append((data_start * bps + (index - 2) * cluster_bytes, cluster_bytes))
+    return used
+
+
+def merge(extents, size):
+    merged = []
+    for start, length in sorted(extents):
+        end = min(start + length, size)
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end - start) for start, end in merged]
+
+
+def used_extents(f, size):
+    parts = partitions(f, size)
+    layout = []
+    extents = [(0, min((p["start"] for p in parts), default=size))]
+    for part in parts:
+        used = None
+        fstype = "raw"
+        if not part["raw"]:
+            used = ext_used(f, part["start"])
+            fstype = "ext" if used is not None else fstype
+            if used is None:
+                used = fat_used(f, part["start"])
+                fstype = "fat" if used is not None else fstype
+        if used is None:
+            extents.append((part["start"], part["size"]))
+        else:
+            extents.extend((part["start"] + start, length) for start, length in used if start < part["size"])
+        layout.append({**part, "fstype": fstype})
+    return merge(extents, size), layout
+
+
+def read_block(f, length):
+    data = f.read(length)
+    while data and len(data) < length:
+        more = f.read(length - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def incremental(f, size, block_size, base):
+    previous = sys.stdin.buffer.read() if base else b""
+    emit_meta({
+        "format": "rsbx",
+        "version": 1,
+        "mode": "incremental",
+        "device_size": size,
+        "block_size": block_size,
+        "base": base or None,
+    })
+    f.seek(0)
+    digests = []
+    changed = 0
+    while True:
+        data = read_block(f, block_size)
+        if not data:
+            break
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        index = len(digests)
+        digests.append(digest)
+        report_progress(index * block_size + len(data), size)
+        if digest == previous[index * 16:(index + 1) * 16]:
+            continue
+        if not base and not data.strip(b"\x00"):
+            continue
+        changed += 1
+        for start in range(0, len(data), CHUNK):
+            piece = data[start:start + CHUNK]
+            out.write(b"D" + struct.pack(">QI", index * block_size + start, len(piece)) + piece)
+    out.write(b"E")
+    out.flush()
+    report_progress(size, size, force=True)
+    report = {"changed": changed, "digests": b"".join(digests).hex()}
+    sys.stderr.write("RSB-BLOCKMAP " + json.dumps(report) + "\n")
+
+
+def main():
+    mode, device = sys.argv[1], sys.argv[2]
+    os.sync()
+    out.write(MAGIC)
+    with open(device, "rb", buffering=0) as f:
+        size = f.seek(0, os.SEEK_END)
+        if mode == "incremental":
+            incremental(f, size, int(sys.argv[3]), sys.argv[4] if len(sys.argv) > 4 else "")
+            return
+        extents, layout = used_extents(f, size)
+        data_bytes = sum(length for _, length in extents)
+        emit_meta({
+            "format": "rsbx",
+            "version": 1,
+            "mode": mode,
+            "device_size": size,
+            "partitions": layout,
+            "data_bytes": data_bytes,
+        })
+        done = 0
+        for start, length in extents:
+            f.seek(start)
+            position = start
+            while position < start + length:
+                data = f.read(min(CHUNK, start + length - position))
+                if not data:
+                    break
+                out.write(b"D" + struct.pack(">QI", position, len(data)) + data)
+                position += len(data)
+                done += len(data)
+                report_progress(done, data_bytes)
+    out.write(b"E")
+    out.flush()
+    report_progress(data_bytes, data_bytes, force=True)
+
+
+main()
+'''
+
+
+class BackupCancelled(Exception):
+    """Raised inside a host worker when the run is cancelled (Ctrl+C)."""
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all host streams so their combined rate stays under a cap."""
+
+    def __init__(self, bytes_per_second: float) -> None:
+        self.rate = float(bytes_per_second)
+        self.capacity = max(self.rate, float(STREAM_CHUNK_SIZE))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TransferMonitor:
+    """Live counters for one host stream, logged every *interval* seconds.
+
+    Device bytes come from the progress lines on the remote stderr, wire and
+    output bytes from the copy loop. Rates are measured over the last *window*
+    seconds so a stalling card or link shows up quickly.
+    """
+
+    def __init__(self, host_name: str, interval: float = 60.0, window: float = 60.0) -> None:
+        self.host_name = host_name
+        self.interval = interval
+        self.window = window
+        self.device_total: int | None = None
+        self.device_bytes = 0
+        self.wire_bytes = 0
+        self.output_bytes = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.hooks: dict[str, float] = {}
+        self._device_start = 0
+        self._segment_offset = 0
+        self._device_seen = False
+        self._samples: collections.deque[tuple[float, int]] = collections.deque()
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+
+    def begin_segment(self, offset: int) -> None:
+        """Device positions reported from now on are relative to *offset* (resumed streams)."""
+        with self._lock:
+            if self.started is None:
+                self._device_start = offset
+            self._segment_offset = offset
+            self.device_bytes = max(self.device_bytes, offset)
+
+    def update_device(self, done: int, total: int | None = None) -> None:
+        with self._lock:
+            if not self._device_seen:
+                self._samples.clear()  # rates were based on wire bytes until now
+            self._device_seen = True
+            self.device_bytes = self._segment_offset + done
+            if total:
+                self.device_total = total
+        self._tick()
+
+    def add_wire(self, amount: int) -> None:
+        with self._lock:
+            self.wire_bytes += amount
+        self._tick()
+
+    def add_output(self, amount: int) -> None:
+        with self._lock:
+            self.output_bytes += amount
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.started is None:
+                self.started = now
+            self._samples.append((now, self.device_bytes if self._device_seen else self.wire_bytes))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+                self._samples.popleft()
+            due = now - self._last_log >= self.interval
+            if due:
+                self._last_log = now
+        if due:
+            log(f"[{self.host_name}] {self.status_line()}")
+
+    def rate(self) -> float:
+        """Bytes per second over the rolling window."""
+        with self._lock:
+            if len(self._samples) < 2:
+                return 0.0
+            (first_time, first_value), (last_time, last_value) = self._samples[0], self._samples[-1]
+        return (last_value - first_value) / (last_time - first_time) if last_time > first_time else 0.0
+
+    def eta(self) -> float | None:
+        rate = self.rate()
+        if not self.device_total or not self._device_seen or rate <= 0:
+            return None
+        return max(self.device_total - self.device_bytes, 0) / rate
+
+    def status_line(self) -> str:
+        mb = 1024 * 1024
+        if self._device_seen and self.device_total:
+            done = (
+                f"{self.device_bytes / mb:.0f}/{self.device_total / mb:.0f} MB read "
+                f"({100 * self.device_bytes / self.device_total:.1f}%)"
+            )
+        elif self._device_seen:
+            done = f"{self.device_bytes / mb:.0f} MB read"
+        else:
+            done = f"{self.wire_bytes / mb:.0f} MB received"
+        line = f"Progress: {done}, {self.rate() / mb:.1f} MB/s (last {self.window:g}s)"
+        device_run = self.device_bytes - self._device_start
+        if self._device_seen and self.output_bytes:
+            line += f", ratio {device_run / self.output_bytes:.2f}"
+        eta = self.eta()
+        if eta is not None:
+            line += f", ETA {format_duration(eta)}"
+        return line
+
+    def summary(self) -> dict[str, Any]:
+        end = self.finished or time.monotonic()
+        seconds = end - self.started if self.started is not None else 0.0
+        device_run = self.device_bytes - self._device_start if self._device_seen else None
+        basis = device_run if device_run is not None else self.wire_bytes
+        return {
+            "host": self.host_name,
+            "seconds": round(seconds, 3),
+            "device_bytes": device_run,
+            "device_total": self.device_total,
+            "wire_bytes": self.wire_bytes,
+            "output_bytes": self.output_bytes,
+            "mb_per_s": round(basis / seconds / (1024 * 1024), 2) if seconds else 0.0,
+            "ratio": round(device_run / self.output_bytes, 3) if device_run and self.output_bytes else None,
+            "hooks": dict(self.hooks) or None,
+        }
+
+
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {secs:02d}s"
 
 
 def log(message: str) -> None:
@@ -62,22 +558,8 @@ def send_pushover_notification(cfg: dict[str, Any], message: str, title: str = "
         log("Pushover is enabled but credentials are missing. Skipping notification.")
         return
 
-    payload = {
-        "token": str(api_token),
-        "user": str(user_key),
-        "title": title,
-        "message": message,
-    }
-
-    try:
-        response = requests.post(
-            "https://api.pushover.net/1/messages.json",
-            data=payload,
-            timeout=20,
-        )
-        response.raise_for_status()
-    except requests.RequestException as exc:
-        log(f"Failed to send Pushover notification: {exc}")
+    # Queued and delivered by a background thread; bursts (e.g. several hosts failing) become one digest.
+    notifier.pushover(user_key, api_token, log=log).send(message, title=title)
 
 
 def load_config(config_path: pathlib.Path) -> dict[str, Any]:
@@ -150,89 +632,1877 @@ def validate_remote_access(ssh_base: list[str], host_name: str) -> None:
         )
 
 
-def backup_single_host(host_cfg: dict[str, Any], global_cfg: dict[str, Any], backup_root: pathlib.Path) -> pathlib.Path:
+@contextlib.contextmanager
+def ssh_session(ssh_base: list[str], host_name: str, enabled: bool = True) -> Iterator[list[str]]:
+    """Yield an ssh command whose calls all share one master connection.
+
+    The master is started up front (ssh -M -N -f) and closed on exit, so hooks,
+    probes and the image stream(s) skip the handshake and run in one session.
+    If the master cannot be started, calls fall back to separate connections.
+    """
+    if not enabled:
+        yield ssh_base
+        return
+    # Short directory: the socket path must fit in ~104 bytes on macOS.
+    control_dir = tempfile.mkdtemp(prefix="rsb-", dir="/tmp")
+    control = ["-o", f"ControlPath={control_dir}/%C"]
+    master_cmd = [ssh_base[0], *control, "-o", "ControlMaster=yes", "-o", f"ControlPersist={SSH_MASTER_PERSIST_S}"]
+    master_cmd += ["-N", "-f", *ssh_base[1:]]
+    try:
+        master = subprocess.run(
+            master_cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=60,
+            check=False,
+        )
+        started = master.returncode == 0
+        details = master.stderr.strip()
+    except subprocess.TimeoutExpired:
+        started, details = False, "timed out"
+    if not started:
+        log(f"[{host_name}] Warning: could not open a shared SSH connection, using one per call ({details}).")
+    try:
+        yield [ssh_base[0], *control, "-o", "ControlMaster=no", *ssh_base[1:]]
+    finally:
+        if started:
+            subprocess.run(
+                [ssh_base[0], *control, "-O", "exit", *ssh_base[1:]],
+                stdin=subprocess.DEVNULL, capture_output=True, timeout=30, check=False,
+            )
+        shutil.rmtree(control_dir, ignore_errors=True)
+
+
+def resolve_hooks(global_cfg: dict[str, Any], host_cfg: dict[str, Any]) -> dict[str, Any]:
+    """Return the pre_backup/post_backup command lists (host settings replace global ones)."""
+    hooks: dict[str, Any] = {}
+    for key in ("pre_backup", "post_backup"):
+        commands = host_cfg.get(key, global_cfg.get(key)) or []
+        if isinstance(commands, str):
+            commands = [commands]
+        if not isinstance(commands, list):
+            raise ValueError(f"{key} must be a command or a YAML list of commands.")
+        hooks[key] = [str(command) for command in commands]
+    hooks["timeout_s"] = float(host_cfg.get("hook_timeout_s", global_cfg.get("hook_timeout_s", DEFAULT_HOOK_TIMEOUT_S)))
+    return hooks
+
+
+def run_hooks(
+    ssh_base: list[str], commands: list[str], stage: str, host_name: str, timeout: float, keep_going: bool = False
+) -> tuple[float, list[str]]:
+    """Run hook *commands* on the host in order; return (seconds, errors).
+
+    Stops at the first failure unless *keep_going* (post_backup hooks all run,
+    so a failed restart of one service does not leave the others stopped).
+    """
+    started = time.monotonic()
+    errors: list[str] = []
+    for command in commands:
+        log(f"[{host_name}] {stage}: {command}")
+        try:
+            result = subprocess.run(
+                ssh_base + [command], stdin=subprocess.DEVNULL, capture_output=True, text=True,
+                timeout=timeout, check=False,
+            )
+            output = (result.stderr or result.stdout).strip()
+            error = None if result.returncode == 0 else (
+                f"'{command}' exited with {result.returncode}{f': {output}' if output else ''}"
+            )
+        except subprocess.TimeoutExpired:
+            error = f"'{command}' timed out after {timeout:g}s"
+        if error is not None:
+            log(f"[{host_name}] {stage} hook failed: {error}")
+            errors.append(error)
+            if not keep_going:
+                break
+    seconds = time.monotonic() - started
+    if commands:
+        log(f"[{host_name}] {stage} hooks took {seconds:.1f}s.")
+    return seconds, errors
+
+
+def create_hashers(names: list[str]) -> dict[str, Any]:
+    """Return hash objects for *names*; sha256 is always included."""
+    hashers: dict[str, Any] = {}
+    for name in ["sha256"] + [str(n).lower() for n in names]:
+        if name in hashers:
+            continue
+        if name == "blake3":
+            try:
+                import blake3  # type: ignore
+            except ImportError as exc:
+                raise ValueError("Checksum 'blake3' requires the 'blake3' package (pip install blake3).") from exc
+            hashers[name] = blake3.blake3()
+            continue
+        try:
+            hashers[name] = hashlib.new(name)
+        except ValueError as exc:
+            raise ValueError(f"Unsupported checksum algorithm: {name}") from exc
+    return hashers
+
+
+def write_checksum_files(image_path: pathlib.Path, hashers: dict[str, Any]) -> list[pathlib.Path]:
+    written = []
+    for name, hasher in hashers.items():
+        checksum_path = image_path.with_name(f"{image_path.name}.{name}")
+        with checksum_path.open("w", encoding="utf-8") as f:
+            f.write(f"{hasher.hexdigest()}  {image_path.name}\n")
+        written.append(checksum_path)
+    return written
+
+
+@dataclasses.dataclass
+class StreamResult:
+    returncode: int
+    stderr: str
+    bytes_received: int
+    bytes_written: int
+    seconds: float
+
+
+def resolve_compression(global_cfg: dict[str, Any], host_cfg: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Return the effective compression settings (codec, level, threads, location).
+
+    Without a 'compression' block this keeps the historical behaviour: gzip
+    on the Pi at 'gzip_level'.
+    """
+    settings: dict[str, Any] = {
+        "codec": "gzip",
+        "level": None,
+        "threads": 0,
+        "location": "remote",
+    }
+    for source in (global_cfg.get("compression"), (host_cfg or {}).get("compression")):
+        if source is None:
+            continue
+        if not isinstance(source, dict):
+            raise ValueError("compression must be a YAML mapping/object.")
+        settings.update({key: value for key, value in source.items() if key in settings})
+
+    codec = str(settings["codec"]).lower()
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec}. Choose one of: {', '.join(CODECS)}")
+    location = str(settings["location"]).lower()
+    if location not in ("remote", "local"):
+        raise ValueError("compression.location must be 'remote' or 'local'.")
+
+    low, high, default_level = CODECS[codec]["levels"]
+    if settings["level"] is not None:
+        level = int(settings["level"])
+    elif codec in ("gzip", "pigz"):
+        level = int(global_cfg.get("gzip_level", default_level))
+    else:
+        level = default_level
+    return {
+        "codec": codec,
+        "level": min(max(level, low), high),
+        "threads": max(int(settings["threads"] or 0), 0),
+        "location": location,
+    }
+
+
+def compressor_command(compression: dict[str, Any]) -> str | None:
+    """Shell command that compresses stdin to stdout, or None for codec 'none'."""
+    codec = compression["codec"]
+    level = compression["level"]
+    threads = compression["threads"]
+    if codec == "gzip":
+        return f"gzip -{level} -c"
+    if codec == "pigz":
+        return f"pigz -{level} -c" + (f" -p {threads}" if threads else "")
+    if codec == "zstd":
+        return f"zstd -{level} -T{threads} -q -c"
+    if codec == "xz":
+        return f"xz -{level} -T{threads} -c"
+    return None
+
+
+def decompressor_command(compression: dict[str, Any]) -> str | None:
+    """Shell command that undoes compressor_command(), or None for codec 'none'."""
+    return {
+        "gzip": "gzip -dc",
+        "pigz": "pigz -dc",
+        "zstd": "zstd -dcq",
+        "xz": "xz -dc -T0",
+    }.get(compression["codec"])
+
+
+def image_suffix(compression: dict[str, Any], image_mode: str = "full") -> str:
+    return IMAGE_BASE_SUFFIXES[image_mode] + CODECS[compression["codec"]]["suffix"]
+
+
+def list_host_images(host_dir: pathlib.Path) -> list[pathlib.Path]:
+    image_suffixes = {
+        base + codec["suffix"] for base in IMAGE_BASE_SUFFIXES.values() for codec in CODECS.values()
+    }
+    image_suffixes.update(base + MANIFEST_SUFFIX for base in IMAGE_BASE_SUFFIXES.values())
+    return [
+        path
+        for path in host_dir.iterdir()
+        if any(path.name.endswith(suffix) for suffix in image_suffixes)
+    ]
+
+
+def stream_command_to_file(
+    command: list[str],
+    outfile: BinaryIO,
+    limiter: BandwidthLimiter | None = None,
+    stop_event: threading.Event | None = None,
+    hashers: dict[str, Any] | None = None,
+    local_filter: list[str] | None = None,
+    stdin_data: bytes | None = None,
+    monitor: TransferMonitor | None = None,
+) -> StreamResult:
+    """Run *command* and copy its stdout into *outfile* through a pipe.
+
+    Every chunk is fed to *hashers* in the same pass, so checksums are ready
+    when the stream ends. When *local_filter* is given (e.g. a local zstd), the
+    received bytes are pumped through it on a helper thread and its output is
+    what gets written and hashed. *stdin_data* is written to the command's
+    stdin (e.g. the previous block map). The network side is throttled by
+    *limiter* and the copy aborts with BackupCancelled as soon as *stop_event*
+    is set. Progress lines on stderr and the byte counts go to *monitor*.
+    """
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL if stdin_data is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    procs = [proc]
+    stderr_chunks: dict[int, bytes] = {}
+    threads: list[threading.Thread] = []
+
+    if stdin_data is not None:
+
+        def feed_stdin() -> None:
+            try:
+                proc.stdin.write(stdin_data)
+                proc.stdin.close()
+            except OSError:
+                pass  # the command exited early; its return code reports why
+
+        threads.append(threading.Thread(target=feed_stdin, daemon=True))
+
+    def drain_stderr(index: int, pipe: BinaryIO) -> None:
+        # dd rewrites its progress line with \r, so pieces are parsed as soon as
+        # either separator arrives. \r-terminated progress and agent progress
+        # lines are left out of the stderr text.
+        kept = bytearray()
+        pending = b""
+        for chunk in iter(lambda: pipe.read1(65536), b""):
+            pieces = re.split(rb"([\r\n])", pending + chunk)
+            pending = pieces.pop()
+            for text, separator in zip(pieces[::2], pieces[1::2]):
+                if keep_stderr_piece(text, separator):
+                    kept += text + b"\n"
+        if keep_stderr_piece(pending, b"\n"):
+            kept += pending
+        stderr_chunks[index] = bytes(kept)
+
+    def keep_stderr_piece(text: bytes, separator: bytes) -> bool:
+        agent = AGENT_PROGRESS_RE.match(text)
+        if agent:
+            if monitor is not None:
+                monitor.update_device(int(agent.group(1)), int(agent.group(2)))
+            return False
+        dd = DD_PROGRESS_RE.match(text)
+        if dd and monitor is not None:
+            monitor.update_device(int(dd.group(1)))
+        return bool(text) and not (dd and separator == b"\r")
+
+    def check_cancelled() -> None:
+        if stop_event is not None and stop_event.is_set():
+            raise BackupCancelled()
+
+    received = 0
+    written = 0
+    pump_errors: list[BaseException] = []
+
+    def receive() -> Any:
+        nonlocal received
+        while True:
+            check_cancelled()
+            chunk = proc.stdout.read1(STREAM_CHUNK_SIZE)
+            if not chunk:
+                return
+            if limiter is not None:
+                limiter.consume(len(chunk))
+            received += len(chunk)
+            if monitor is not None:
+                monitor.add_wire(len(chunk))
+            yield chunk
+
+    if local_filter is not None:
+        try:
+            filter_proc = subprocess.Popen(
+                local_filter, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        except OSError:
+            proc.kill()
+            proc.wait()
+            raise
+        procs.append(filter_proc)
+
+        def pump() -> None:
+            try:
+                for chunk in receive():
+                    filter_proc.stdin.write(chunk)
+            except BaseException as exc:  # noqa: BLE001
+                pump_errors.append(exc)
+            finally:
+                try:
+                    filter_proc.stdin.close()
+                except OSError:
+                    pass
+
+        threads.append(threading.Thread(target=pump, daemon=True))
+
+        def output() -> Any:
+            while True:
+                check_cancelled()
+                chunk = filter_proc.stdout.read1(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    else:
+        output = receive
+
+    for index, running in enumerate(procs):
+        threads.append(threading.Thread(target=drain_stderr, args=(index, running.stderr), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        for chunk in output():
+            outfile.write(chunk)
+            written += len(chunk)
+            if monitor is not None:
+                monitor.add_output(len(chunk))
+            for hasher in (hashers or {}).values():
+                hasher.update(chunk)
+        for thread in threads:
+            thread.join()
+        if pump_errors:
+            raise pump_errors[0]
+        for running in procs:
+            running.wait()
+    except BaseException:
+        for running in procs:
+            try:
+                running.terminate()
+                running.wait(timeout=10)
+            except Exception:  # noqa: BLE001
+                running.kill()
+        raise
+    finally:
+        for running in procs:
+            running.stdout.close()
+        for thread in threads:
+            thread.join(timeout=10)
+
+    stderr_text = "\n".join(
+        stderr_chunks.get(index, b"").decode("utf-8", errors="replace").strip() for index in range(len(procs))
+    ).strip()
+    returncode = next((running.returncode for running in procs if running.returncode), 0)
+    return StreamResult(returncode, stderr_text, received, written, time.monotonic() - started)
+
+
+def resolve_image_mode(global_cfg: dict[str, Any], host_cfg: dict[str, Any]) -> str:
+    image_mode = str(host_cfg.get("image_mode") or global_cfg.get("image_mode") or "full").lower()
+    if image_mode not in IMAGE_BASE_SUFFIXES:
+        raise ValueError(f"Unsupported image_mode: {image_mode}. Choose one of: {', '.join(IMAGE_BASE_SUFFIXES)}")
+    return image_mode
+
+
+def resolve_incremental(global_cfg: dict[str, Any], host_cfg: dict[str, Any]) -> dict[str, int]:
+    """Return the incremental block size (bytes) and how many deltas may follow a full backup."""
+    block_mb = host_cfg.get("incremental_block_mb") or global_cfg.get("incremental_block_mb")
+    full_every = host_cfg.get("full_every")
+    if full_every is None:
+        full_every = global_cfg.get("full_every", DEFAULT_FULL_EVERY)
+    block_mb = int(block_mb or DEFAULT_INCREMENTAL_BLOCK_MB)
+    if block_mb < 1:
+        raise ValueError("incremental_block_mb must be at least 1.")
+    return {"block_size": block_mb * 1024 * 1024, "full_every": max(int(full_every), 0)}
+
+
+def load_blockmap(image_path: pathlib.Path) -> dict[str, Any] | None:
+    blockmap_path = image_path.with_name(image_path.name + BLOCKMAP_SUFFIX)
+    if not blockmap_path.exists():
+        return None
+    with blockmap_path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def backup_chain(image_path: pathlib.Path) -> list[pathlib.Path]:
+    """Return the backups *image_path* depends on, oldest (the full one) first."""
+    chain: list[pathlib.Path] = []
+    blockmap = load_blockmap(image_path)
+    while blockmap and blockmap.get("base"):
+        base_path = image_path.with_name(blockmap["base"])
+        if not base_path.exists() or base_path in chain:
+            raise ValueError(f"Base backup {blockmap['base']} of {image_path.name} is missing.")
+        chain.insert(0, base_path)
+        blockmap = load_blockmap(base_path)
+    return chain
+
+
+def select_incremental_base(
+    host_dir: pathlib.Path, block_size: int, full_every: int
+) -> tuple[pathlib.Path | None, dict[str, Any] | None]:
+    """Pick the newest incremental backup to diff against, or (None, None) for a new full one."""
+    candidates = [
+        path for path in list_host_images(host_dir) if load_blockmap(path) is not None
+    ]
+    if not candidates:
+        return None, None
+    latest = max(candidates, key=lambda p: (backup_timestamp(p, host_dir.name) or dt.datetime.min, p.name))
+    blockmap = load_blockmap(latest)
+    if blockmap.get("block_size") != block_size or int(blockmap.get("depth", 0)) >= full_every:
+        return None, None
+    try:
+        backup_chain(latest)
+    except ValueError:
+        return None, None
+    return latest, blockmap
+
+
+def split_blockmap_report(stderr: str) -> tuple[dict[str, Any] | None, str]:
+    """Separate the agent's block map line from the rest of the remote stderr."""
+    report = None
+    lines = []
+    for line in stderr.splitlines():
+        if line.startswith(BLOCKMAP_STDERR_PREFIX):
+            report = json.loads(line[len(BLOCKMAP_STDERR_PREFIX):])
+        else:
+            lines.append(line)
+    return report, "\n".join(lines).strip()
+
+
+def build_image_pipeline(
+    source_device: str,
+    compression: dict[str, Any],
+    count_blocks: int | None = None,
+    image_mode: str = "full",
+    raw_output: bool = False,
+    block_size: int = DEFAULT_INCREMENTAL_BLOCK_MB * 1024 * 1024,
+    base_name: str | None = None,
+    skip_blocks: int = 0,
+    progress: bool = False,
+) -> tuple[str, list[str] | None]:
+    """Return (remote shell pipeline, local filter argv) for streaming *source_device*.
+
+    *count_blocks* limits the read to that many 4 MiB blocks (used by --benchmark
+    and resumable segments), *skip_blocks* starts that many blocks into the
+    device. With *progress* dd reports progress and its final byte count on
+    stderr (see TransferMonitor).
+    With image_mode 'used' or 'incremental' the Pi runs REMOTE_EXTENT_AGENT
+    instead of dd; incremental streams diff against *base_name* in blocks of
+    *block_size*. With *raw_output* the local side receives uncompressed bytes:
+    remote compression is undone by a local decompressor, local compression is
+    skipped. Remote compression runs under pipefail so a failing dd or agent
+    fails the whole pipeline instead of ending the stream early.
+    """
+    if image_mode == "used":
+        remote_pipeline = (
+            f"sudo -n python3 -c {shlex.quote(REMOTE_EXTENT_AGENT)} used {shlex.quote(source_device)}"
+        )
+    elif image_mode == "incremental":
+        remote_pipeline = (
+            f"sudo -n python3 -c {shlex.quote(REMOTE_EXTENT_AGENT)} incremental {shlex.quote(source_device)} "
+            f"{int(block_size)}" + (f" {shlex.quote(base_name)}" if base_name else "")
+        )
+    else:
+        skip = f" skip={skip_blocks}" if skip_blocks else ""
+        count = f" count={count_blocks}" if count_blocks else ""
+        status = " status=progress" if progress else " status=none"
+        remote_pipeline = f"sudo -n dd if={shlex.quote(source_device)} bs=4M{skip}{count}{status}"
+    compressor = compressor_command(compression)
+    if compressor is None:
+        return remote_pipeline, None
+    compressed_pipeline = f"bash -o pipefail -c {shlex.quote(f'{remote_pipeline} | {compressor}')}"
+    if raw_output:
+        if compression["location"] == "local":
+            return remote_pipeline, None
+        return compressed_pipeline, shlex.split(decompressor_command(compression))
+    if compression["location"] == "remote":
+        return compressed_pipeline, None
+    return remote_pipeline, shlex.split(compressor)
+
+
+def resolve_resume(global_cfg: dict[str, Any], host_cfg: dict[str, Any]) -> dict[str, Any]:
+    settings: dict[str, Any] = {
+        "enabled": False,
+        "segment_mb": DEFAULT_RESUME_SEGMENT_MB,
+        "retries": 2,
+        "retry_delay_s": 15,
+    }
+    for source in (global_cfg.get("resume"), host_cfg.get("resume")):
+        if source is None:
+            continue
+        if not isinstance(source, dict):
+            raise ValueError("resume must be a YAML mapping/object.")
+        settings.update({key: value for key, value in source.items() if key in settings})
+    # Segments are whole dd blocks so skip= lands exactly on the next segment.
+    segment_blocks = max(int(settings["segment_mb"]) * 1024 * 1024 // DD_BLOCK_SIZE, 1)
+    return {
+        "enabled": bool(settings["enabled"]),
+        "segment_bytes": segment_blocks * DD_BLOCK_SIZE,
+        "retries": max(int(settings["retries"]), 0),
+        "retry_delay_s": max(float(settings["retry_delay_s"]), 0.0),
+    }
+
+
+def write_resume_state(state_path: pathlib.Path, state: dict[str, Any]) -> None:
+    temp_path = state_path.with_name(state_path.name + ".tmp")
+    with temp_path.open("w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path)
+
+
+def verify_partial(partial_path: pathlib.Path, state: dict[str, Any], hashers: dict[str, Any]) -> bool:
+    """Trim *partial_path* to the last checkpoint and re-hash it into *hashers*.
+
+    Returns False (hashers then hold garbage) when the file is shorter than the
+    checkpoint or its sha256 does not match the recorded one.
+    """
+    expected = int(state["partial_bytes"])
+    if partial_path.stat().st_size < expected:
+        return False
+    os.truncate(partial_path, expected)
+    with partial_path.open("rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return hashers["sha256"].hexdigest() == state["partial_sha256"]
+
+
+def prepare_resume(
+    host_dir: pathlib.Path,
+    final_image_path: pathlib.Path,
+    source_device: str,
+    hashers: dict[str, Any],
+    host_name: str,
+) -> tuple[pathlib.Path, dict[str, Any]]:
+    """Find an interrupted backup of the same device and format to continue.
+
+    Returns (final image path, resume state). Partials that do not match or
+    fail verification are removed and a fresh state is returned.
+    """
+    partial_suffix = final_image_path.name.removeprefix(f"{host_name}_").partition(".")[2] + ".partial"
+    for state_path in sorted(host_dir.glob(f"{host_name}_*.partial{RESUME_STATE_SUFFIX}"), reverse=True):
+        partial_path = state_path.with_name(state_path.name.removesuffix(RESUME_STATE_SUFFIX))
+        try:
+            with state_path.open("r", encoding="utf-8") as f:
+                state = json.load(f)
+            usable = (
+                partial_path.exists()
+                and partial_path.name.endswith("." + partial_suffix)
+                and state.get("source_device") == source_device
+                and verify_partial(partial_path, state, hashers)
+            )
+        except (OSError, ValueError, KeyError):
+            usable = False
+        if usable:
+            log(
+                f"[{host_name}] Resuming {partial_path.name} at "
+                f"{state['offset'] / (1024 * 1024):.0f} MB of the device (partial verified)."
+            )
+            return partial_path.with_name(partial_path.name.removesuffix(".partial")), state
+        log(f"[{host_name}] Discarding stale partial backup {partial_path.name}.")
+        partial_path.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+        for name, hasher in create_hashers(list(hashers)).items():
+            hashers[name] = hasher
+
+    return final_image_path, {
+        "source_device": source_device,
+        "offset": 0,
+        "partial_bytes": 0,
+        "partial_sha256": hashlib.sha256().hexdigest(),
+    }
+
+
+def stream_resumable_image(
+    ssh_base: list[str],
+    source_device: str,
+    compression: dict[str, Any],
+    partial_path: pathlib.Path,
+    state: dict[str, Any],
+    resume: dict[str, Any],
+    hashers: dict[str, Any],
+    limiter: BandwidthLimiter | None = None,
+    stop_event: threading.Event | None = None,
+    host_name: str = "",
+    monitor: TransferMonitor | None = None,
+    device_size: int | None = None,
+) -> StreamResult:
+    """Stream a full image segment by segment, checkpointing after each one.
+
+    A failed segment is cut off the partial file again and retried up to
+    resume['retries'] times; if it still fails the partial and its state file
+    are kept so the next run can continue from the last checkpoint. A short
+    segment ends the image only if it reaches *device_size* (when known).
+    """
+    state_path = partial_path.with_name(partial_path.name + RESUME_STATE_SUFFIX)
+    segment_blocks = resume["segment_bytes"] // DD_BLOCK_SIZE
+    totals = StreamResult(0, "", 0, 0, 0.0)
+    failures = 0
+    partial_path.touch()
+    write_resume_state(state_path, state)
+    while True:
+        checkpoint = {name: hasher.copy() for name, hasher in hashers.items()}
+        remote_pipeline, local_filter = build_image_pipeline(
+            source_device,
+            compression,
+            count_blocks=segment_blocks,
+            skip_blocks=int(state["offset"]) // DD_BLOCK_SIZE,
+            progress=True,
+        )
+        if monitor is not None:
+            monitor.begin_segment(int(state["offset"]))
+        try:
+            with partial_path.open("ab") as outfile:
+                result = stream_command_to_file(
+                    ssh_base + [remote_pipeline],
+                    outfile,
+                    limiter=limiter,
+                    stop_event=stop_event,
+                    hashers=hashers,
+                    local_filter=local_filter,
+                    monitor=monitor,
+                )
+        except BaseException:
+            os.truncate(partial_path, int(state["partial_bytes"]))
+            raise
+        totals.bytes_received += result.bytes_received
+        totals.seconds += result.seconds
+
+        # The last byte count on stderr is dd's final summary.
+        copied = re.findall(r"^(\d+) bytes", result.stderr, re.MULTILINE)
+        short_read = None
+        if copied and int(copied[-1]) < resume["segment_bytes"]:
+            short_read = early_end_message(int(state["offset"]) + int(copied[-1]), device_size)
+        if result.returncode != 0 or not copied or short_read:
+            os.truncate(partial_path, int(state["partial_bytes"]))
+            hashers.update(checkpoint)
+            failures += 1
+            if failures > resume["retries"]:
+                totals.returncode = result.returncode or 1
+                totals.stderr = (result.stderr + "\n" + short_read).strip() if short_read else result.stderr
+                return totals
+            log(
+                f"[{host_name}] Segment at {int(state['offset']) / (1024 * 1024):.0f} MB failed; "
+                f"retrying in {resume['retry_delay_s']:g}s ({failures}/{resume['retries']})..."
+            )
+            if stop_event is not None:
+                if stop_event.wait(resume["retry_delay_s"]):
+                    raise BackupCancelled()
+            else:
+                time.sleep(resume["retry_delay_s"])
+            continue
+
+        failures = 0
+        device_bytes = int(copied[-1])
+        if device_bytes == 0:
+            # Device size was a multiple of the segment size: drop the empty member.
+            os.truncate(partial_path, int(state["partial_bytes"]))
+            hashers.update(checkpoint)
+        else:
+            state["offset"] = int(state["offset"]) + device_bytes
+            state["partial_bytes"] = partial_path.stat().st_size
+            state["partial_sha256"] = hashers["sha256"].hexdigest()
+            write_resume_state(state_path, state)
+        if device_bytes < resume["segment_bytes"]:
+            totals.bytes_written = partial_path.stat().st_size
+            return totals
+        log(f"[{host_name}] Checkpoint: {state['offset'] / (1024 * 1024):.0f} MB of the device read.")
+
+
+def probe_device_size(ssh_base: list[str], source_device: str) -> int | None:
+    """Size of *source_device* on the Pi in bytes (from sysfs, no sudo needed), or None."""
+    device = shlex.quote(source_device)
+    probe = run_capture(ssh_base + [
+        f'f=/sys/class/block/$(basename "$(readlink -f {device})")/size; '
+        f'if [ -r "$f" ]; then echo $(( $(cat "$f") * 512 )); else stat -Lc %s {device}; fi'
+    ])
+    try:
+        return int(probe.stdout.strip()) if probe.returncode == 0 else None
+    except ValueError:
+        return None
+
+
+def early_end_message(read_bytes: int, device_size: int | None) -> str | None:
+    """Describe a dd read that ended before the end of the device, or None if it did not."""
+    if device_size is None or read_bytes == device_size:
+        return None
+    return f"dd read {read_bytes} of {device_size} bytes of the device before it stopped."
+
+
+def backup_single_host(
+    host_cfg: dict[str, Any],
+    global_cfg: dict[str, Any],
+    backup_root: pathlib.Path,
+    limiter: BandwidthLimiter | None = None,
+    stop_event: threading.Event | None = None,
+    monitor: TransferMonitor | None = None,
+) -> pathlib.Path:
     host_name = host_cfg.get("name")
     if not host_name:
         raise ValueError("Each host requires 'name'.")
 
     source_device = str(host_cfg.get("source_device", "/dev/mmcblk0"))
-    gzip_level = int(global_cfg.get("gzip_level", 1))
-    gzip_level = min(max(gzip_level, 1), 9)
+    compression = resolve_compression(global_cfg, host_cfg)
+    image_mode = resolve_image_mode(global_cfg, host_cfg)
+
+    hooks = resolve_hooks(global_cfg, host_cfg)
+    multiplex = bool(host_cfg.get("ssh_multiplex", global_cfg.get("ssh_multiplex", True)))
+    with ssh_session(build_ssh_base(host_cfg, global_cfg), host_name, multiplex) as ssh_base:
+        validate_remote_access(ssh_base, host_name)
+
+        timestamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        host_dir = backup_root / host_name
+        ensure_dir(host_dir)
+
+        storage = resolve_storage(global_cfg, host_cfg, backup_root)
+        hashers = create_hashers(list(global_cfg.get("checksums") or DEFAULT_CHECKSUMS))
+        use_chunks = storage["backend"] == "chunks"
+
+        base_path = None
+        base_blockmap = None
+        incremental = resolve_incremental(global_cfg, host_cfg)
+        if image_mode == "incremental":
+            if use_chunks:
+                raise ValueError(f"[{host_name}] image_mode 'incremental' requires storage backend 'files'.")
+            base_path, base_blockmap = select_incremental_base(
+                host_dir, incremental["block_size"], incremental["full_every"]
+            )
 
-    ssh_base = build_ssh_base(host_cfg, global_cfg)
-    validate_remote_access(ssh_base, host_name)
+        if use_chunks:
+            final_image_path = host_dir / f"{host_name}_{timestamp}{IMAGE_BASE_SUFFIXES[image_mode]}{MANIFEST_SUFFIX}"
+        else:
+            final_image_path = host_dir / f"{host_name}_{timestamp}{image_suffix(compression, image_mode)}"
 
-    timestamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
-    host_dir = backup_root / host_name
-    ensure_dir(host_dir)
+        resume = resolve_resume(global_cfg, host_cfg)
+        resume_state = None
+        if resume["enabled"] and image_mode == "full" and not use_chunks:
+            final_image_path, resume_state = prepare_resume(
+                host_dir, final_image_path, source_device, hashers, host_name
+            )
+        partial_image_path = final_image_path.with_name(final_image_path.name + ".partial")
+
+        remote_pipeline, local_filter = build_image_pipeline(
+            source_device,
+            compression,
+            image_mode=image_mode,
+            raw_output=use_chunks,
+            block_size=incremental["block_size"],
+            base_name=base_path.name if base_path else None,
+            progress=True,
+        )
+        stdin_data = bytes.fromhex(base_blockmap["digests"]) if base_blockmap else None
 
-    final_image_path = host_dir / f"{host_name}_{timestamp}.img.gz"
-    partial_image_path = host_dir / f"{host_name}_{timestamp}.img.gz.partial"
-    sha_path = host_dir / f"{host_name}_{timestamp}.img.gz.sha256"
+        device_size = probe_device_size(ssh_base, source_device) if image_mode == "full" else None
+        if monitor is not None and image_mode == "full":
+            # The extent agent reports its own total; dd does not.
+            monitor.device_total = device_size
 
-    remote_pipeline = (
-        f"sudo -n dd if={shlex.quote(source_device)} bs=4M status=none | "
-        f"gzip -{gzip_level} -c"
-    )
+        quiesce_started = time.monotonic()
+        pre_seconds, pre_errors = run_hooks(ssh_base, hooks["pre_backup"], "pre_backup", host_name, hooks["timeout_s"])
+        chunk_writer = None
+        try:
+            if pre_errors:
+                raise RuntimeError(f"[{host_name}] pre_backup hook failed, not backing up: {pre_errors[0]}")
+            stream_kind = {"full": "image", "used": "used-blocks", "incremental": "incremental"}[image_mode]
+            log(
+                f"[{host_name}] Starting {stream_kind} stream from {source_device} "
+                f"({compression['codec']} compression, {compression['location']}"
+                f"{', chunk store' if use_chunks else ''}"
+                f"{f', against {base_path.name}' if base_path else ''})..."
+            )
+            if use_chunks:
+                chunk_writer = ChunkedImageWriter(
+                    open_chunk_store(storage), average_size=int(storage["average_chunk_kb"]) * 1024
+                )
+                result = stream_command_to_file(
+                    ssh_base + [remote_pipeline],
+                    chunk_writer,
+                    limiter=limiter,
+                    stop_event=stop_event,
+                    hashers=hashers,
+                    local_filter=local_filter,
+                    monitor=monitor,
+                )
+                chunks = chunk_writer.close()
+            elif resume_state is not None:
+                result = stream_resumable_image(
+                    ssh_base,
+                    source_device,
+                    compression,
+                    partial_image_path,
+                    resume_state,
+                    resume,
+                    hashers,
+                    limiter=limiter,
+                    stop_event=stop_event,
+                    host_name=host_name,
+                    monitor=monitor,
+                    device_size=device_size,
+                )
+            else:
+                with partial_image_path.open("wb") as outfile:
+                    result = stream_command_to_file(
+                        ssh_base + [remote_pipeline],
+                        outfile,
+                        limiter=limiter,
+                        stop_event=stop_event,
+                        hashers=hashers,
+                        local_filter=local_filter,
+                        stdin_data=stdin_data,
+                        monitor=monitor,
+                    )
+        except (KeyboardInterrupt, BackupCancelled):
+            log(f"[{host_name}] Backup interrupted by user. Stopping remote process...")
+            if chunk_writer is not None:
+                chunk_writer.close()
+            if resume_state is None:
+                partial_image_path.unlink(missing_ok=True)
+            raise
+        finally:
+            if monitor is not None:
+                monitor.finish()
+            # Always undo the pre_backup hooks, whatever happened to the stream.
+            post_seconds, post_errors = run_hooks(
+                ssh_base, hooks["post_backup"], "post_backup", host_name, hooks["timeout_s"], keep_going=True
+            )
+            if hooks["pre_backup"] or hooks["post_backup"]:
+                quiesced = time.monotonic() - quiesce_started
+                log(f"[{host_name}] Quiesced for {format_duration(quiesced)} (pre_backup start to post_backup end).")
+                if monitor is not None:
+                    monitor.hooks = {
+                        "pre_backup_s": round(pre_seconds, 3),
+                        "post_backup_s": round(post_seconds, 3),
+                        "quiesced_s": round(quiesced, 3),
+                    }
+            if post_errors:
+                send_pushover_notification(
+                    global_cfg,
+                    message=f"post_backup hook failed on {host_name}: {'; '.join(post_errors)}",
+                    title="Raspberry Pi Backup Hook Failed",
+                )
 
-    log(f"[{host_name}] Starting image stream from {source_device}...")
-    try:
-        with partial_image_path.open("wb") as outfile:
-            proc = subprocess.Popen(
-                ssh_base + [remote_pipeline],
-                stdout=outfile,
-                stderr=subprocess.PIPE,
+        report = None
+        if image_mode == "incremental":
+            report, result.stderr = split_blockmap_report(result.stderr)
+            if result.returncode == 0 and report is None:
+                result.returncode = 1
+                result.stderr = (result.stderr + "\nRemote agent did not report a block map.").strip()
+        elif image_mode == "full" and resume_state is None and result.returncode == 0:
+            copied = re.findall(r"^(\d+) bytes", result.stderr, re.MULTILINE)
+            short_read = early_end_message(int(copied[-1]), device_size) if copied else None
+            if short_read:
+                result.returncode = 1
+                result.stderr = (result.stderr + "\n" + short_read).strip()
+
+        if result.returncode != 0:
+            if resume_state is not None:
+                raise RuntimeError(
+                    f"[{host_name}] Backup failed; the next run resumes at "
+                    f"{resume_state['offset'] / (1024 * 1024):.0f} MB. SSH/dd output: {result.stderr}"
+                )
+            partial_image_path.unlink(missing_ok=True)
+            raise RuntimeError(f"[{host_name}] Backup failed. SSH/dd output: {result.stderr}")
+
+        if use_chunks:
+            manifest = {
+                "format": "rsb-chunks",
+                "version": 1,
+                "host": host_name,
+                "timestamp": timestamp,
+                "image_mode": image_mode,
+                "size": result.bytes_written,
+                "checksums": {name: hasher.hexdigest() for name, hasher in hashers.items()},
+                "chunk_dir": str(storage["chunk_dir"]),
+                "chunks": chunks,
+            }
+            with partial_image_path.open("w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            partial_image_path.rename(final_image_path)
+            log(
+                f"[{host_name}] Backup completed: {final_image_path} "
+                f"({len(chunks)} chunks, {chunk_writer.new_chunks} new, "
+                f"{chunk_writer.stored_bytes / (1024 * 1024):.1f} MB added to the chunk store)"
             )
-            _, stderr = proc.communicate()
-    except KeyboardInterrupt:
-        log(f"[{host_name}] Backup interrupted by user. Stopping remote process...")
+            return final_image_path
+
+        partial_image_path.rename(final_image_path)
+        if resume_state is not None:
+            partial_image_path.with_name(partial_image_path.name + RESUME_STATE_SUFFIX).unlink(missing_ok=True)
+        log(f"[{host_name}] Backup completed: {final_image_path}")
+
+        if report is not None:
+            blockmap = {
+                "block_size": incremental["block_size"],
+                "base": base_path.name if base_path else None,
+                "depth": int(base_blockmap.get("depth", 0)) + 1 if base_blockmap else 0,
+                "digests": report["digests"],
+            }
+            blockmap_path = final_image_path.with_name(final_image_path.name + BLOCKMAP_SUFFIX)
+            with blockmap_path.open("w", encoding="utf-8") as f:
+                json.dump(blockmap, f)
+            total_blocks = len(report["digests"]) // (BLOCK_DIGEST_SIZE * 2)
+            log(
+                f"[{host_name}] {report['changed']} of {total_blocks} block(s) sent"
+                f"{f' (delta on {base_path.name})' if base_path else ' (new full backup)'}."
+            )
+
+        for checksum_path in write_checksum_files(final_image_path, hashers):
+            log(f"[{host_name}] Checksum written: {checksum_path}")
+        return final_image_path
+
+
+class ChunkStore:
+    """Content-addressed chunk objects stored once under <root>/<xx>/<sha256>.
+
+    Each object starts with a one-byte codec tag (Z = zlib, X = lzma, N = none)
+    so the chunk compression can change without rewriting existing objects.
+    """
+
+    def __init__(self, root: pathlib.Path, compression: str = "zlib", level: int = 1) -> None:
+        if compression not in CHUNK_CODECS:
+            raise ValueError(f"Unsupported chunk_compression: {compression}. Choose one of: {', '.join(CHUNK_CODECS)}")
+        self.root = root
+        self.compression = compression
+        self.level = level
+
+    def object_path(self, digest: str) -> pathlib.Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, digest: str, data: bytes) -> int:
+        """Store *data* unless it already exists; return the number of bytes written."""
+        path = self.object_path(digest)
+        if path.exists():
+            return 0
+        if self.compression == "zlib":
+            payload = b"Z" + zlib.compress(data, self.level)
+        elif self.compression == "lzma":
+            payload = b"X" + lzma.compress(data, preset=self.level)
+        else:
+            payload = b"N" + data
+        ensure_dir(path.parent)
+        temp_path = path.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        temp_path.write_bytes(payload)
+        os.replace(temp_path, path)
+        return len(payload)
+
+    def get(self, digest: str) -> bytes:
+        payload = self.object_path(digest).read_bytes()
+        tag, body = payload[:1], payload[1:]
+        if tag == b"Z":
+            data = zlib.decompress(body)
+        elif tag == b"X":
+            data = lzma.decompress(body)
+        elif tag == b"N":
+            data = body
+        else:
+            raise ValueError(f"Unknown codec tag in chunk {digest}.")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupt (hash mismatch).")
+        return data
+
+    def iter_objects(self) -> Iterator[pathlib.Path]:
+        if not self.root.exists():
+            return
+        for bucket in self.root.iterdir():
+            if bucket.is_dir():
+                yield from (path for path in bucket.iterdir() if not path.name.endswith(".tmp"))
+
+    def collect_garbage(self, referenced: set[str], dry_run: bool = False) -> tuple[int, int]:
+        """Delete objects whose reference count is zero; return (objects, bytes) reclaimed."""
+        removed = 0
+        reclaimed = 0
+        for path in list(self.iter_objects()):
+            if path.name in referenced:
+                continue
+            removed += 1
+            reclaimed += path.stat().st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+        return removed, reclaimed
+
+
+class ChunkedImageWriter:
+    """File-like sink that splits a stream into content-defined chunks.
+
+    Cut points are only considered at 4 KiB block boundaries: filesystem data
+    in a card image moves in whole blocks, and hashing per block (instead of a
+    byte-wise rolling hash) keeps chunking at hashlib/zlib speed. A block ends
+    a chunk when its CRC matches the mask, bounded by min/max chunk sizes.
+    """
+
+    def __init__(
+        self,
+        store: ChunkStore,
+        average_size: int = DEFAULT_CHUNK_AVERAGE,
+        workers: int = 4,
+    ) -> None:
+        self.store = store
+        self.min_size = max(average_size // 4, CHUNK_BLOCK)
+        self.max_size = average_size * 4
+        self.mask = max(average_size // CHUNK_BLOCK, 2) - 1
+        self.chunks: list[list[Any]] = []
+        self.new_chunks = 0
+        self.stored_bytes = 0
+        self._buffer = bytearray()
+        self._scan = 0
+        self._seen: set[str] = set()
+        self._workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunks")
+        self._pending: list[Any] = []
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        start = 0
+        position = self._scan
+        with memoryview(self._buffer) as view:
+            while position + CHUNK_BLOCK <= len(self._buffer):
+                block_end = position + CHUNK_BLOCK
+                length = block_end - start
+                if length >= self.max_size or (
+                    length >= self.min_size and zlib.crc32(view[position:block_end]) & self.mask == 0
+                ):
+                    self._emit(bytes(view[start:block_end]))
+                    start = block_end
+                position = block_end
+        del self._buffer[:start]
+        self._scan = position - start
+        return len(data)
+
+    def _emit(self, chunk: bytes) -> None:
+        digest = hashlib.sha256(chunk).hexdigest()
+        self.chunks.append([digest, len(chunk)])
+        if digest in self._seen:
+            return
+        self._seen.add(digest)
+        self._pending.append(self._pool.submit(self.store.put, digest, chunk))
+        if len(self._pending) >= self._workers * 4:
+            self._collect(self._pending.pop(0))
+
+    def _collect(self, future: Any) -> None:
+        written = future.result()
+        if written:
+            self.new_chunks += 1
+            self.stored_bytes += written
+
+    def close(self) -> list[list[Any]]:
+        """Flush the tail chunk, wait for pending writes and return [[sha256, length], ...]."""
         try:
-            proc.terminate()
-            proc.wait(timeout=10)
-        except Exception:  # noqa: BLE001
+            if self._buffer:
+                self._emit(bytes(self._buffer))
+                self._buffer.clear()
+            for future in self._pending:
+                self._collect(future)
+            self._pending.clear()
+        finally:
+            self._pool.shutdown(wait=True)
+        return self.chunks
+
+
+class ChunkReader(io.RawIOBase):
+    """Read the image described by a chunk manifest as one sequential stream."""
+
+    def __init__(self, store: ChunkStore, chunks: list[list[Any]]) -> None:
+        self._store = store
+        self._chunks = iter(chunks)
+        self._current = b""
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while self._offset >= len(self._current):
+            entry = next(self._chunks, None)
+            if entry is None:
+                return 0
+            self._current = self._store.get(entry[0])
+            self._offset = 0
+        count = min(len(buffer), len(self._current) - self._offset)
+        buffer[:count] = self._current[self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+
+class HashingReader(io.RawIOBase):
+    """Pass reads through from *raw* while feeding every byte to *hashers*."""
+
+    def __init__(self, raw: BinaryIO, hashers: dict[str, Any]) -> None:
+        self._raw = raw
+        self._hashers = hashers
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        count = self._raw.readinto(buffer)
+        if count:
+            with memoryview(buffer)[:count] as view:
+                for hasher in self._hashers.values():
+                    hasher.update(view)
+            self.bytes_read += count
+        return count
+
+
+def resolve_storage(global_cfg: dict[str, Any], host_cfg: dict[str, Any], backup_root: pathlib.Path) -> dict[str, Any]:
+    settings: dict[str, Any] = {
+        "backend": "files",
+        "chunk_dir": str(backup_root / "chunks"),
+        "chunk_compression": "zlib",
+        "average_chunk_kb": DEFAULT_CHUNK_AVERAGE // 1024,
+    }
+    for source in (global_cfg.get("storage"), host_cfg.get("storage")):
+        if source is None:
+            continue
+        if not isinstance(source, dict):
+            raise ValueError("storage must be a YAML mapping/object.")
+        settings.update({key: value for key, value in source.items() if key in settings})
+    if settings["backend"] not in ("files", "chunks"):
+        raise ValueError("storage.backend must be 'files' or 'chunks'.")
+    settings["chunk_dir"] = pathlib.Path(str(settings["chunk_dir"])).expanduser()
+    return settings
+
+
+def open_chunk_store(storage: dict[str, Any]) -> ChunkStore:
+    return ChunkStore(storage["chunk_dir"], compression=str(storage["chunk_compression"]))
+
+
+def load_manifest(path: pathlib.Path) -> dict[str, Any]:
+    with path.open("r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != "rsb-chunks":
+        raise ValueError(f"{path} is not a chunk manifest.")
+    return manifest
+
+
+def referenced_chunks(backup_root: pathlib.Path, exclude: set[pathlib.Path] | None = None) -> set[str]:
+    """Every chunk digest referenced by a manifest under *backup_root* (minus *exclude*)."""
+    referenced: set[str] = set()
+    for manifest_path in backup_root.glob(f"*/*{MANIFEST_SUFFIX}"):
+        if exclude and manifest_path in exclude:
+            continue
+        referenced.update(entry[0] for entry in load_manifest(manifest_path)["chunks"])
+    return referenced
+
+
+def parallel_decompressor(name: str) -> list[str] | None:
+    """Fastest installed decompressor for a backup file name, or None to decompress in Python."""
+    if name.endswith(".gz"):
+        tool = shutil.which("pigz") or shutil.which("gzip")
+        return [pathlib.Path(tool).name, "-dc"] if tool else None
+    if name.endswith(".xz"):
+        return ["xz", "-dc", "-T0"] if shutil.which("xz") else None
+    if name.endswith(".zst"):
+        return ["zstd", "-dcq", "-T0"] if shutil.which("zstd") else None
+    return None
+
+
+@contextlib.contextmanager
+def open_decompressed(path: pathlib.Path, hashers: dict[str, Any] | None = None) -> Iterator[BinaryIO]:
+    """Open a backup file and yield a stream of its uncompressed bytes.
+
+    The stored (compressed) bytes are fed to *hashers* as they are read, so the
+    sidecar checksums can be checked in the same pass. Decompression runs in
+    pigz (or gzip) / xz -T0 / zstd when installed, on its own core next to
+    this process.
+    """
+    name = path.name.removesuffix(".partial")
+    if name.endswith(MANIFEST_SUFFIX):
+        manifest = load_manifest(path)
+        store = ChunkStore(pathlib.Path(manifest["chunk_dir"]))
+        with io.BufferedReader(ChunkReader(store, manifest["chunks"]), STREAM_CHUNK_SIZE) as stream:
+            yield stream
+        return
+
+    with path.open("rb", buffering=0) as raw_file:
+        source = io.BufferedReader(HashingReader(raw_file, hashers or {}), STREAM_CHUNK_SIZE)
+        command = parallel_decompressor(name)
+        if command is None:
+            if name.endswith(".gz"):
+                with gzip.GzipFile(fileobj=source, mode="rb") as stream:
+                    yield stream
+            elif name.endswith(".xz"):
+                with lzma.LZMAFile(source, "rb") as stream:
+                    yield stream
+            elif name.endswith(".zst"):
+                # No zstd module in the standard library: the zstd tool is the only decoder.
+                raise RuntimeError(f"zstd is not installed; it is needed to read {path.name} (apt/brew install zstd)")
+            else:
+                yield source
+            if hashers:
+                while source.read(STREAM_CHUNK_SIZE):
+                    pass
+            return
+
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+        def feed() -> None:
+            try:
+                for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b""):
+                    proc.stdin.write(chunk)
+            except OSError:
+                pass  # decompressor exited early; its return code reports why
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            yield proc.stdout
+            # Read to the end so the decompressor (and the hashers) see every byte.
+            while proc.stdout.read(STREAM_CHUNK_SIZE):
+                pass
+        except BaseException:
             proc.kill()
-        partial_image_path.unlink(missing_ok=True)
-        raise
+            raise
+        finally:
+            feeder.join()
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"{command[0]} failed to decompress {path} (exit code {returncode})")
+
+
+def read_exact(stream: BinaryIO, length: int) -> bytes:
+    data = stream.read(length)
+    while len(data) < length:
+        more = stream.read(length - len(data))
+        if not more:
+            raise ValueError("Extent stream ended unexpectedly.")
+        data += more
+    return data
+
+
+def iter_extent_records(stream: BinaryIO) -> Iterator[tuple[str, Any]]:
+    """Yield ('meta', dict) and ('data', (offset, bytes)) records from an extent stream."""
+    if read_exact(stream, len(EXTENT_MAGIC)) != EXTENT_MAGIC:
+        raise ValueError("Not an extent stream (bad magic).")
+    while True:
+        kind = read_exact(stream, 1)
+        if kind == b"M":
+            (length,) = struct.unpack(">I", read_exact(stream, 4))
+            yield "meta", json.loads(read_exact(stream, length))
+        elif kind == b"D":
+            offset, length = struct.unpack(">QI", read_exact(stream, 12))
+            yield "data", (offset, read_exact(stream, length))
+        elif kind == b"E":
+            return
+        else:
+            raise ValueError(f"Corrupt extent stream (record type {kind!r}).")
+
+
+def write_zeros(out: BinaryIO, length: int) -> None:
+    zeros = bytes(min(length, STREAM_CHUNK_SIZE))
+    while length > 0:
+        out.write(zeros[:length])
+        length -= len(zeros)
+
+
+def is_block_device(out: BinaryIO) -> bool:
+    try:
+        return stat.S_ISBLK(os.fstat(out.fileno()).st_mode)
+    except (OSError, ValueError):
+        return False  # in-memory buffers have no file descriptor
+
+
+def expand_extent_stream(stream: BinaryIO, out: BinaryIO) -> dict[str, Any]:
+    """Turn an extent stream back into a full device image on *out*.
+
+    Regular files become sparse files; pipes and block devices get the gaps
+    written as zeros. Returns the stream header.
+    """
+    records = iter_extent_records(stream)
+    kind, header = next(records, (None, None))
+    if kind != "meta":
+        raise ValueError("Extent stream has no header.")
+    if header.get("base"):
+        raise ValueError(f"Incremental stream on {header['base']} needs its base; use expand_backup().")
+    return apply_extent_records(records, header, out)
+
+
+def write_image_stream(stream: BinaryIO, out: BinaryIO) -> dict[str, Any]:
+    """Write the raw image held by *stream* (plain image or extent stream) to *out*."""
+    if stream.peek(len(EXTENT_MAGIC))[: len(EXTENT_MAGIC)] == EXTENT_MAGIC:
+        return expand_extent_stream(stream, out)
+    size = 0
+    for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+        out.write(chunk)
+        size += len(chunk)
+    return {"device_size": size}
+
+
+def apply_extent_records(
+    records: Iterator[tuple[str, Any]], header: dict[str, Any], out: BinaryIO, overlay: bool = False
+) -> dict[str, Any]:
+    """Write the data records of an extent stream to *out*.
+
+    With *overlay* the base image is already in *out* and only the records are
+    written on top of it, which needs a seekable output. Otherwise every gap
+    must read back as zeros: regular files are truncated to a sparse image,
+    while pipes and block devices (which keep whatever the card held before)
+    get the gaps written out.
+    """
+    seekable = out.seekable()
+    if overlay and not seekable:
+        raise ValueError("An incremental backup can only be expanded into a file or device.")
+    device_size = int(header["device_size"])
+    zero_fill = not overlay
+    if seekable and not overlay and not is_block_device(out):
+        try:
+            out.truncate(device_size)
+            zero_fill = False
+        except OSError:
+            pass
+    position = 0
+    filled = 0  # with zero_fill, everything before this offset has been written
+    for kind, value in records:
+        if kind == "meta":
+            continue
+        offset, data = value
+        if zero_fill and offset > filled:
+            if position != filled:
+                out.seek(filled)
+            write_zeros(out, offset - filled)
+            position = offset
+        if offset != position:
+            if not seekable:
+                raise ValueError("Extent stream is not ordered; cannot write it to a pipe.")
+            out.seek(offset)
+        out.write(data)
+        position = offset + len(data)
+        filled = max(filled, position)
+    if zero_fill and device_size > filled:
+        if position != filled:
+            out.seek(filled)
+        write_zeros(out, device_size - filled)
+    return header
+
+
+def expand_backup(
+    source: pathlib.Path, destination: pathlib.Path, hashers: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    """Write the full raw image held by *source* (image, extent stream or manifest) to *destination*.
+
+    Incremental backups first expand their base chain into *destination* and
+    then overlay their changed blocks. *hashers* see the stored bytes of
+    *source* itself (not of its bases).
+    """
+    with open_decompressed(source, hashers) as stream:
+        if stream.peek(len(EXTENT_MAGIC))[: len(EXTENT_MAGIC)] != EXTENT_MAGIC:
+            size = 0
+            with destination.open("wb") as out:
+                for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+                    out.write(chunk)
+                    size += len(chunk)
+            return {"device_size": size}
+        records = iter_extent_records(stream)
+        kind, header = next(records, (None, None))
+        if kind != "meta":
+            raise ValueError("Extent stream has no header.")
+        base = header.get("base")
+        if base:
+            base_path = source.with_name(base)
+            if not base_path.exists():
+                raise ValueError(f"Base backup {base} of {source.name} is missing.")
+            expand_backup(base_path, destination)
+        with destination.open("r+b" if base else "wb") as out:
+            return apply_extent_records(records, header, out, overlay=bool(base))
+
+
+def read_checksum_files(image_path: pathlib.Path) -> dict[str, str]:
+    """Expected digests from the <image>.<algorithm> sidecars written by write_checksum_files()."""
+    expected: dict[str, str] = {}
+    for sidecar in image_path.parent.glob(f"{image_path.name}.*"):
+        algorithm = sidecar.name[len(image_path.name) + 1:]
+        if "." in algorithm:
+            continue  # block maps, resume state, ...
+        try:
+            expected[algorithm] = sidecar.read_text(encoding="utf-8").split()[0].lower()
+        except (OSError, IndexError):
+            continue
+    return expected
 
-    if proc.returncode != 0:
-        partial_image_path.unlink(missing_ok=True)
-        stderr_text = (stderr or b"").decode("utf-8", errors="replace").strip()
-        raise RuntimeError(f"[{host_name}] Backup failed. SSH/dd output: {stderr_text}")
 
-    partial_image_path.rename(final_image_path)
-    log(f"[{host_name}] Backup completed: {final_image_path}")
+def compare_digests(hashers: dict[str, Any], expected: dict[str, str]) -> dict[str, bool]:
+    return {name: hashers[name].hexdigest() == digest for name, digest in expected.items()}
 
-    sha256 = hashlib.sha256()
-    with final_image_path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            sha256.update(chunk)
 
-    checksum = sha256.hexdigest()
-    with sha_path.open("w", encoding="utf-8") as f:
-        f.write(f"{checksum}  {final_image_path.name}\n")
+def verify_backup(path: pathlib.Path) -> dict[str, Any]:
+    """Decompress *path* once, checking its checksum files (or manifest digests) on the way.
 
-    log(f"[{host_name}] Checksum written: {sha_path}")
-    return final_image_path
+    Extent streams are also parsed record by record, and incremental backups
+    must still have their base chain.
+    """
+    started = time.monotonic()
+    is_manifest = path.name.endswith(MANIFEST_SUFFIX)
+    result: dict[str, Any] = {"path": str(path), "ok": False, "image_bytes": 0, "checks": {}, "error": None}
+    try:
+        if is_manifest:
+            manifest = load_manifest(path)
+            expected = dict(manifest.get("checksums") or {})
+            result["stored_bytes"] = int(manifest["size"])
+        else:
+            expected = read_checksum_files(path)
+            result["stored_bytes"] = path.stat().st_size
+            backup_chain(path)
+        hashers = create_hashers(list(expected))
+        # Sidecars cover the stored file; manifest digests cover the raw stream.
+        with open_decompressed(path, None if is_manifest else hashers) as stream:
+            if not is_manifest and stream.peek(len(EXTENT_MAGIC))[: len(EXTENT_MAGIC)] == EXTENT_MAGIC:
+                for kind, value in iter_extent_records(stream):
+                    if kind == "data":
+                        result["image_bytes"] += len(value[1])
+            else:
+                for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+                    result["image_bytes"] += len(chunk)
+                    if is_manifest:
+                        for hasher in hashers.values():
+                            hasher.update(chunk)
+        result["checks"] = compare_digests(hashers, expected)
+        result["ok"] = all(result["checks"].values())
+    except (OSError, ValueError, RuntimeError, EOFError, lzma.LZMAError, zlib.error) as exc:
+        result["error"] = str(exc) or type(exc).__name__
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def format_transfer(result: dict[str, Any], volume_key: str = "image_bytes") -> str:
+    mb = result[volume_key] / (1024 * 1024)
+    seconds = result["seconds"]
+    return f"{mb:.0f} MB in {seconds:.1f}s ({mb / seconds if seconds else 0.0:.1f} MB/s)"
+
+
+def format_verify_result(result: dict[str, Any]) -> str:
+    name = pathlib.Path(result["path"]).name
+    if result["error"]:
+        return f"{name}: FAILED ({result['error']})"
+    failed = [algorithm for algorithm, ok in result["checks"].items() if not ok]
+    if failed:
+        status = f"FAILED ({', '.join(failed)} mismatch)"
+    elif result["checks"]:
+        status = f"OK ({', '.join(result['checks'])} match)"
+    else:
+        status = "OK (decompressed cleanly; no checksum files found)"
+    return f"{name}: {status}, {format_transfer(result)}"
+
+
+def restore_to_file(source: pathlib.Path, destination: pathlib.Path) -> dict[str, Any]:
+    """Restore *source* to a local image file or block device, hashing it on the way."""
+    started = time.monotonic()
+    expected = {} if source.name.endswith(MANIFEST_SUFFIX) else read_checksum_files(source)
+    hashers = create_hashers(list(expected))
+    header = expand_backup(source, destination, hashers)
+    fd = os.open(destination, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    checks = compare_digests(hashers, expected)
+    return {
+        "path": str(source),
+        "ok": all(checks.values()),
+        "checks": checks,
+        "bytes": int(header["device_size"]),
+        "seconds": time.monotonic() - started,
+        "error": None,
+    }
+
+
+def restore_to_host(
+    source: pathlib.Path, ssh_base: list[str], device: str, host_name: str
+) -> dict[str, Any]:
+    """Write *source* to *device* on a Pi through `dd` over SSH.
+
+    Plain images are sent as stored and decompressed on the Pi ("bytes" in the
+    result is then the stored size). Used-blocks,
+    incremental and chunk store backups are expanded here and sent through a
+    fast local gzip, so unallocated (zero) ranges cost next to nothing on the wire.
+    """
+    started = time.monotonic()
+    name = source.name
+    is_manifest = name.endswith(MANIFEST_SUFFIX)
+    expected = {} if is_manifest else read_checksum_files(source)
+    hashers = create_hashers(list(expected))
+    codec_suffix = next((suffix for suffix in (".gz", ".zst", ".xz") if name.endswith(suffix)), "")
+    plain = not is_manifest and name.removesuffix(codec_suffix).endswith(IMAGE_BASE_SUFFIXES["full"])
+
+    dd = f"sudo -n dd of={shlex.quote(device)} bs=4M conv=fsync status=none"
+    if plain:
+        decompressor = {".gz": "gzip -dc", ".zst": "zstd -dcq", ".xz": "xz -dc -T0"}.get(codec_suffix)
+    else:
+        decompressor = "gzip -dc"
+    remote_command = f"{decompressor} | {dd}" if decompressor else dd
+
+    validate_remote_access(ssh_base, host_name)
+    log(f"[{host_name}] Restoring {name} to {device}...")
+    ssh = subprocess.Popen(
+        ssh_base + [remote_command], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    stderr_chunks: list[bytes] = []
+    drain = threading.Thread(target=lambda: stderr_chunks.append(ssh.stderr.read()), daemon=True)
+    drain.start()
+    procs = [ssh]
+    sent = 0
+    error = None
+    try:
+        if plain:
+            with source.open("rb") as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    ssh.stdin.write(chunk)
+                    sent += len(chunk)
+            ssh.stdin.close()
+        else:
+            compressor = subprocess.Popen(["gzip", "-1", "-c"], stdin=subprocess.PIPE, stdout=ssh.stdin)
+            procs.append(compressor)
+            ssh.stdin.close()
+            if backup_chain(source):
+                # Deltas need a seekable target to overlay, so build the image locally first.
+                with tempfile.TemporaryDirectory(dir=source.parent) as tmp:
+                    raw_path = pathlib.Path(tmp) / "restore.img"
+                    expand_backup(source, raw_path, hashers)
+                    with raw_path.open("rb") as raw:
+                        sent = int(write_image_stream(raw, compressor.stdin)["device_size"])
+            else:
+                with open_decompressed(source, hashers) as stream:
+                    sent = int(write_image_stream(stream, compressor.stdin)["device_size"])
+            compressor.stdin.close()
+    except OSError as exc:
+        error = str(exc)  # usually a broken pipe: the remote side gives the reason
+    except BaseException:
+        for proc in procs:
+            proc.kill()
+        raise
+    finally:
+        for proc in reversed(procs):
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            proc.wait()
+        drain.join()
+
+    returncodes = [proc.returncode for proc in procs]
+    if any(returncodes):
+        remote_error = b"".join(stderr_chunks).decode("utf-8", errors="replace").strip()
+        error = remote_error or error or f"exit codes {returncodes}"
+    checks = compare_digests(hashers, expected)
+    return {
+        "path": str(source),
+        "ok": error is None and all(checks.values()),
+        "checks": checks,
+        "bytes": sent,
+        "seconds": time.monotonic() - started,
+        "error": error,
+    }
 
 
-def prune_old_backups(backup_root: pathlib.Path, host_cfg: dict[str, Any], retention_count: int) -> None:
+def backup_timestamp(path: pathlib.Path, host_name: str) -> dt.datetime | None:
+    """Parse the <host>_YYYYMMDD_HHMMSS prefix of a backup file name (None if it does not match)."""
+    stamp = path.name.removeprefix(f"{host_name}_")[:15]
+    if stamp == path.name[:15]:
+        return None
+    try:
+        return dt.datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def resolve_retention(global_cfg: dict[str, Any], host_cfg: dict[str, Any]) -> dict[str, int]:
+    """Return the keep counts {last, daily, weekly, monthly} for a host.
+
+    Without a 'retention' block the historical 'retention_count' (keep the
+    newest N backups) applies. A host-level block overrides single keys.
+    """
+    policy = {"last": max(int(global_cfg.get("retention_count", 6)), 1), "daily": 0, "weekly": 0, "monthly": 0}
+    blocks = [block for block in (global_cfg.get("retention"), host_cfg.get("retention")) if block is not None]
+    if blocks:
+        policy["last"] = 0
+    if host_cfg.get("retention_count") is not None:
+        policy["last"] = max(int(host_cfg["retention_count"]), 1)
+    for block in blocks:
+        if not isinstance(block, dict):
+            raise ValueError("retention must be a YAML mapping/object.")
+        for key, value in block.items():
+            if key not in policy:
+                raise ValueError(f"Unknown retention key: {key}. Use last, daily, weekly or monthly.")
+            policy[key] = max(int(value), 0)
+    if not any(policy.values()):
+        raise ValueError("retention keeps nothing; set at least one of last, daily, weekly, monthly.")
+    return policy
+
+
+def select_retained(
+    backups: list[tuple[dt.datetime, pathlib.Path]], policy: dict[str, int]
+) -> dict[pathlib.Path, list[str]]:
+    """Grandfather-father-son selection: map each kept backup to the rules that keep it.
+
+    *backups* must be sorted newest first. The newest backup of each day,
+    ISO week and month counts for that period, up to the configured number of
+    periods; 'last' keeps the newest N regardless of period.
+    """
+    periods = {
+        "daily": lambda stamp: stamp.date(),
+        "weekly": lambda stamp: stamp.isocalendar()[:2],
+        "monthly": lambda stamp: (stamp.year, stamp.month),
+    }
+    kept: dict[pathlib.Path, list[str]] = {}
+    for _, path in backups[: policy["last"]]:
+        kept.setdefault(path, []).append("last")
+    for rule, period_of in periods.items():
+        seen: set[Any] = set()
+        for stamp, path in backups:
+            if len(seen) >= policy[rule]:
+                break
+            period = period_of(stamp)
+            if period in seen:
+                continue
+            seen.add(period)
+            kept.setdefault(path, []).append(rule)
+    return kept
+
+
+def prune_old_backups(
+    backup_root: pathlib.Path,
+    host_cfg: dict[str, Any],
+    global_cfg: dict[str, Any],
+    dry_run: bool = False,
+) -> list[pathlib.Path]:
+    """Apply the host's retention policy and return the backups deleted (or, with *dry_run*, to delete).
+
+    Backup times come from the file names, so nothing is stat'ed to decide.
+    Backups that a kept incremental depends on are always kept.
+    """
     host_name = host_cfg.get("name")
     if not host_name:
-        return
+        return []
 
     host_dir = backup_root / host_name
     if not host_dir.exists():
-        return
-
-    images = sorted(host_dir.glob("*.img.gz"), key=lambda p: p.stat().st_mtime, reverse=True)
-    if len(images) <= retention_count:
-        return
+        return []
+
+    policy = resolve_retention(global_cfg, host_cfg)
+    backups = []
+    for path in list_host_images(host_dir):
+        stamp = backup_timestamp(path, host_name)
+        if stamp is None:
+            log(f"[{host_name}] Skipping {path.name} for retention: no timestamp in its name.")
+            continue
+        backups.append((stamp, path))
+    backups.sort(key=lambda item: (item[0], item[1].name), reverse=True)
 
-    for old_image in images[retention_count:]:
-        sha_path = old_image.with_suffix(old_image.suffix + ".sha256")
+    kept = select_retained(backups, policy)
+    for image in list(kept):
+        try:
+            for base in backup_chain(image):
+                kept.setdefault(base, []).append(f"base of {image.name}")
+        except ValueError as exc:
+            log(f"[{host_name}] Warning: {exc}")
+
+    doomed = [path for _, path in backups if path not in kept]
+    if dry_run:
+        for _, path in backups:
+            if path in kept:
+                log(f"[{host_name}] keep    {path.name} ({', '.join(kept[path])})")
+            else:
+                log(f"[{host_name}] delete  {path.name}")
+
+    freed = 0
+    for old_image in doomed:
+        files = [old_image, *host_dir.glob(f"{old_image.name}.*")]
+        freed += sum(path.stat().st_size for path in files if path.exists())
+        if dry_run:
+            continue
         log(f"[{host_name}] Pruning old backup: {old_image}")
-        old_image.unlink(missing_ok=True)
-        sha_path.unlink(missing_ok=True)
+        for path in files:
+            path.unlink(missing_ok=True)
+    if doomed:
+        verb = "would free" if dry_run else "freed"
+        log(f"[{host_name}] Retention {policy}: {len(doomed)} backup(s) {verb} {freed / (1024 * 1024):.1f} MB.")
+    return doomed
+
+
+def resolve_telemetry(cfg: dict[str, Any], backup_root: pathlib.Path) -> dict[str, Any]:
+    telemetry = cfg.get("telemetry") or {}
+    if not isinstance(telemetry, dict):
+        raise ValueError("telemetry must be a YAML mapping/object.")
+    return {
+        "log_interval_s": max(float(telemetry.get("log_interval_s", 60)), 1.0),
+        "rate_window_s": max(float(telemetry.get("rate_window_s", 60)), 1.0),
+        "metrics_dir": pathlib.Path(str(telemetry.get("metrics_dir") or backup_root / "metrics")).expanduser(),
+    }
+
+
+def format_host_metrics(entry: dict[str, Any]) -> str:
+    mb = 1024 * 1024
+    volume = entry["device_bytes"] if entry["device_bytes"] is not None else entry["wire_bytes"]
+    line = (
+        f"{entry['host']}: {'ok' if entry['ok'] else 'FAILED'}, {volume / mb:.0f} MB in "
+        f"{format_duration(entry['seconds'])} ({entry['mb_per_s']:.1f} MB/s"
+    )
+    if entry["ratio"]:
+        line += f", ratio {entry['ratio']:.2f}"
+    line += f", {entry['wire_bytes'] / mb:.0f} MB over the network)"
+    if entry.get("hooks"):
+        line += f", quiesced {format_duration(entry['hooks']['quiesced_s'])}"
+    return line
+
+
+def write_run_metrics(metrics_dir: pathlib.Path, started: dt.datetime, entries: list[dict[str, Any]]) -> pathlib.Path:
+    """Write one JSON file per run so throughput per host can be compared across runs."""
+    ensure_dir(metrics_dir)
+    metrics_path = metrics_dir / f"run_{started.strftime('%Y%m%d_%H%M%S')}.json"
+    with metrics_path.open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "started": started.isoformat(timespec="seconds"),
+                "finished": dt.datetime.now().isoformat(timespec="seconds"),
+                "hosts": entries,
+            },
+            f,
+            indent=2,
+        )
+    return metrics_path
+
+
+def collect_chunk_garbage(
+    cfg: dict[str, Any],
+    backup_root: pathlib.Path,
+    dry_run: bool = False,
+    exclude: set[pathlib.Path] | None = None,
+) -> tuple[int, int]:
+    """Remove chunks no manifest references any more (run after every host has finished).
+
+    With *dry_run* nothing is deleted; manifests in *exclude* (the ones a dry
+    run would prune) are treated as gone, so the result is what pruning frees.
+    """
+    referenced = referenced_chunks(backup_root, exclude)
+    chunk_dirs = {
+        resolve_storage(cfg, host_cfg, backup_root)["chunk_dir"]
+        for host_cfg in cfg.get("hosts", [])
+        if isinstance(host_cfg, dict)
+    }
+    removed = 0
+    reclaimed = 0
+    for chunk_dir in sorted(chunk_dirs):
+        count, size = ChunkStore(chunk_dir).collect_garbage(referenced, dry_run=dry_run)
+        removed += count
+        reclaimed += size
+    if removed:
+        verb = "would remove" if dry_run else "removed"
+        log(f"Chunk store: {verb} {removed} unreferenced chunk(s), {reclaimed / (1024 * 1024):.1f} MB.")
+    return removed, reclaimed
+
+
+def parse_benchmark_candidate(candidate: str, base: dict[str, Any]) -> dict[str, Any]:
+    codec, _, location = str(candidate).partition(":")
+    settings = {"compression": {**base, "codec": codec, "location": location or base["location"], "level": None}}
+    return resolve_compression(settings)
+
+
+def benchmark_host(
+    host_cfg: dict[str, Any],
+    global_cfg: dict[str, Any],
+    size_mb: int,
+    candidates: list[str],
+) -> list[dict[str, Any]]:
+    """Stream the first *size_mb* MiB of the device once per codec/placement and measure it."""
+    host_name = host_cfg.get("name", "unknown")
+    source_device = str(host_cfg.get("source_device", "/dev/mmcblk0"))
+    ssh_base = build_ssh_base(host_cfg, global_cfg)
+    validate_remote_access(ssh_base, host_name)
+
+    base = resolve_compression(global_cfg, host_cfg)
+    blocks = max(size_mb // 4, 1)
+    raw_bytes = blocks * 4 * 1024 * 1024
+    results = []
+    for candidate in candidates:
+        compression = parse_benchmark_candidate(candidate, base)
+        remote_pipeline, local_filter = build_image_pipeline(source_device, compression, count_blocks=blocks)
+        log(f"[{host_name}] Benchmarking {compression['codec']} ({compression['location']})...")
+        try:
+            with open(os.devnull, "wb") as sink:
+                result = stream_command_to_file(ssh_base + [remote_pipeline], sink, local_filter=local_filter)
+        except OSError as exc:
+            result = StreamResult(127, str(exc), 0, 0, 0.0)
+        entry = {
+            "codec": compression["codec"],
+            "location": compression["location"],
+            "ok": result.returncode == 0 and result.bytes_written > 0,
+            "seconds": result.seconds,
+            "wire_bytes": result.bytes_received,
+            "output_bytes": result.bytes_written,
+            "throughput_mb_s": raw_bytes / result.seconds / (1024 * 1024) if result.seconds else 0.0,
+            "ratio": raw_bytes / result.bytes_written if result.bytes_written else 0.0,
+        }
+        if not entry["ok"]:
+            entry["error"] = result.stderr or f"exit code {result.returncode}"
+        results.append(entry)
+    return results
+
+
+def format_benchmark(host_name: str, results: list[dict[str, Any]]) -> str:
+    lines = [f"[{host_name}] {'codec':<6} {'where':<7} {'MB/s':>8} {'ratio':>7} {'wire MB':>9}"]
+    for entry in results:
+        if not entry["ok"]:
+            lines.append(f"[{host_name}] {entry['codec']:<6} {entry['location']:<7} unavailable: {entry['error']}")
+            continue
+        lines.append(
+            f"[{host_name}] {entry['codec']:<6} {entry['location']:<7} "
+            f"{entry['throughput_mb_s']:>8.1f} {entry['ratio']:>7.2f} {entry['wire_bytes'] / (1024 * 1024):>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def run_restore(args: argparse.Namespace) -> int:
+    source = pathlib.Path(args.restore[0]).expanduser()
+    target = args.restore[1]
+    host_name, separator, device = target.partition(":")
+    try:
+        if separator and device.startswith("/") and "/" not in host_name:
+            cfg = load_config(pathlib.Path(args.config).expanduser().resolve())
+            host_cfg = next(
+                (h for h in cfg["hosts"] if isinstance(h, dict) and h.get("name") == host_name), None
+            )
+            if host_cfg is None:
+                log(f"Error: host '{host_name}' is not in the config.")
+                return 1
+            result = restore_to_host(source, build_ssh_base(host_cfg, cfg), device, host_name)
+        else:
+            log(f"Restoring {source} to {target}...")
+            result = restore_to_file(source, pathlib.Path(target).expanduser())
+    except (OSError, ValueError, RuntimeError, EOFError, lzma.LZMAError, zlib.error) as exc:
+        log(f"Error: could not restore {source}: {exc}")
+        return 1
+
+    if result["error"]:
+        log(f"Restore of {source.name} to {target} FAILED: {result['error']}")
+        return 2
+    mismatched = [algorithm for algorithm, ok in result["checks"].items() if not ok]
+    if mismatched:
+        log(f"Restore of {source.name} to {target} finished but {', '.join(mismatched)} did not match the backup!")
+        return 2
+    checked = f", {', '.join(result['checks'])} verified" if result["checks"] else ", no checksum files"
+    log(f"Restored {source.name} to {target}: {format_transfer(result, 'bytes')}{checked}.")
+    return 0
 
 
 def parse_args() -> argparse.Namespace:
@@ -247,11 +2517,83 @@ def parse_args() -> argparse.Namespace:
         action="append",
         help="Optional host name filter. Can be used multiple times.",
     )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        help="Maximum number of hosts to back up at the same time (overrides max_parallel).",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Measure throughput and ratio of each compression codec/placement instead of backing up.",
+    )
+    parser.add_argument(
+        "--benchmark-mb",
+        type=int,
+        help=f"MiB of the device to read per benchmark candidate (default: {DEFAULT_BENCHMARK_MB}).",
+    )
+    parser.add_argument(
+        "--expand",
+        nargs=2,
+        metavar=("BACKUP", "IMAGE"),
+        help="Turn a used-blocks (.rsbx) or incremental (.rsbd) backup into a full raw image file and exit.",
+    )
+    parser.add_argument(
+        "--verify",
+        nargs="+",
+        metavar="BACKUP",
+        help="Decompress backups (files or host folders) and check them against their checksum files, then exit.",
+    )
+    parser.add_argument(
+        "--restore",
+        nargs=2,
+        metavar=("BACKUP", "TARGET"),
+        help="Write a backup to TARGET and exit. TARGET is an image file or block device on this machine, "
+        "or HOST:DEVICE (HOST as named in the config) to restore over SSH.",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Apply the retention policy to the selected hosts without backing up, then exit.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Like --prune, but only list what each host keeps (and why) and what would be deleted.",
+    )
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
+    if args.expand:
+        source, destination = (pathlib.Path(value).expanduser() for value in args.expand)
+        try:
+            header = expand_backup(source, destination)
+        except (OSError, ValueError, RuntimeError) as exc:
+            log(f"Error: could not expand {source}: {exc}")
+            return 1
+        log(f"Expanded {source} -> {destination} ({header['device_size']} bytes)")
+        return 0
+
+    if args.verify:
+        backups: list[pathlib.Path] = []
+        for value in args.verify:
+            path = pathlib.Path(value).expanduser()
+            backups.extend(sorted(list_host_images(path)) if path.is_dir() else [path])
+        if not backups:
+            log("No backups found to verify.")
+            return 1
+        results = [verify_backup(path) for path in backups]
+        for result in results:
+            log(f"Verify {format_verify_result(result)}")
+        failed = sum(1 for result in results if not result["ok"])
+        log(f"Verified {len(results)} backup(s): {len(results) - failed} OK, {failed} failed.")
+        return 0 if failed == 0 else 2
+
+    if args.restore:
+        return run_restore(args)
+
     config_path = pathlib.Path(args.config).expanduser().resolve()
 
     try:
@@ -267,9 +2609,6 @@ def main() -> int:
 
     ensure_dir(backup_root)
 
-    retention_count = int(cfg.get("retention_count", 6))
-    retention_count = max(retention_count, 1)
-
     selected_hosts = set(args.host or [])
     hosts: list[dict[str, Any]] = cfg.get("hosts", [])
 
@@ -288,6 +2627,42 @@ def main() -> int:
         log("No enabled hosts matched the selection.")
         return 1
 
+    try:
+        for host_cfg in enabled_hosts:
+            resolve_retention(cfg, host_cfg)
+    except ValueError as exc:
+        log(f"Error: {exc}")
+        return 1
+
+    if args.prune or args.dry_run:
+        doomed: list[pathlib.Path] = []
+        for host_cfg in enabled_hosts:
+            doomed.extend(prune_old_backups(backup_root, host_cfg, cfg, dry_run=args.dry_run))
+        if any(resolve_storage(cfg, host_cfg, backup_root)["backend"] == "chunks" for host_cfg in enabled_hosts):
+            collect_chunk_garbage(cfg, backup_root, dry_run=args.dry_run, exclude=set(doomed))
+        return 0
+
+    if args.benchmark:
+        compression_cfg = cfg.get("compression") if isinstance(cfg.get("compression"), dict) else {}
+        size_mb = int(args.benchmark_mb or compression_cfg.get("benchmark_mb", DEFAULT_BENCHMARK_MB))
+        candidates = list(compression_cfg.get("benchmark") or DEFAULT_BENCHMARK_CANDIDATES)
+        for host_cfg in enabled_hosts:
+            host_name = host_cfg.get("name", "unknown")
+            try:
+                for line in format_benchmark(host_name, benchmark_host(host_cfg, cfg, size_mb, candidates)).splitlines():
+                    log(line)
+            except Exception as exc:  # noqa: BLE001
+                log(f"[{host_name}] Benchmark failed: {exc}")
+        return 0
+
+    try:
+        telemetry = resolve_telemetry(cfg, backup_root)
+    except ValueError as exc:
+        log(f"Error: {exc}")
+        return 1
+    run_started = dt.datetime.now()
+    metrics: dict[str, dict[str, Any]] = {}
+
     run_target = ", ".join(h.get("name", "unknown") for h in enabled_hosts)
     send_pushover_notification(
         cfg,
@@ -295,36 +2670,92 @@ def main() -> int:
         title="Raspberry Pi Backup Started",
     )
 
-    success_count = 0
-    failure_count = 0
+    max_parallel = int(args.parallel or cfg.get("max_parallel", 1))
+    max_parallel = min(max(max_parallel, 1), len(enabled_hosts))
+    bandwidth_limit = float(cfg.get("bandwidth_limit_mb_per_s", 0) or 0)
+    limiter = BandwidthLimiter(bandwidth_limit * 1024 * 1024) if bandwidth_limit > 0 else None
+    stop_event = threading.Event()
+    progress_lock = threading.Lock()
+    finished_hosts: list[str] = []
+
+    if max_parallel > 1:
+        log(f"Running up to {max_parallel} host backups in parallel.")
+    if limiter is not None:
+        log(f"Aggregate bandwidth limited to {bandwidth_limit:g} MB/s.")
+
+    def run_host(host_cfg: dict[str, Any]) -> bool:
+        host_name = host_cfg.get("name", "unknown")
+        monitor = TransferMonitor(
+            host_name, interval=telemetry["log_interval_s"], window=telemetry["rate_window_s"]
+        )
+        entry: dict[str, Any] = {"image": None, "error": None}
+        try:
+            image_path = backup_single_host(
+                host_cfg, cfg, backup_root, limiter=limiter, stop_event=stop_event, monitor=monitor
+            )
+            entry["image"] = str(image_path)
+            prune_old_backups(backup_root, host_cfg, cfg)
+            succeeded = True
+        except BackupCancelled:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            entry["error"] = str(exc)
+            log(f"[{host_name}] Error: {exc}")
+            send_pushover_notification(
+                cfg,
+                message=f"Backup failed for {host_name}: {exc}",
+                title="Raspberry Pi Backup Failed",
+            )
+            succeeded = False
+
+        entry = {**monitor.summary(), "ok": succeeded, **entry}
+        with progress_lock:
+            metrics[host_name] = entry
+            finished_hosts.append(host_name)
+            log(f"Progress: {len(finished_hosts)}/{len(enabled_hosts)} host(s) finished.")
+        return succeeded
 
+    executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="backup")
+    futures = {executor.submit(run_host, host_cfg): host_cfg.get("name", "unknown") for host_cfg in enabled_hosts}
     try:
-        for host_cfg in enabled_hosts:
-            host_name = host_cfg.get("name", "unknown")
-            try:
-                backup_single_host(host_cfg, cfg, backup_root)
-                prune_old_backups(backup_root, host_cfg, retention_count)
-                success_count += 1
-            except Exception as exc:  # noqa: BLE001
-                log(f"[{host_name}] Error: {exc}")
-                send_pushover_notification(
-                    cfg,
-                    message=f"Backup failed for {host_name}: {exc}",
-                    title="Raspberry Pi Backup Failed",
-                )
-                failure_count += 1
+        pending = set(futures)
+        while pending:
+            # Short timeout keeps the main thread responsive to Ctrl+C.
+            _, pending = wait(pending, timeout=0.5)
     except KeyboardInterrupt:
         log("Backup run cancelled by user.")
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
         send_pushover_notification(
             cfg,
             message="Backup run cancelled by user.",
             title="Raspberry Pi Backup Cancelled",
         )
         return 130
+    executor.shutdown(wait=True)
+
+    if any(resolve_storage(cfg, host_cfg, backup_root)["backend"] == "chunks" for host_cfg in enabled_hosts):
+        collect_chunk_garbage(cfg, backup_root)
+
+    failed_hosts = [name for future, name in futures.items() if not future.result()]
+    success_count = len(futures) - len(failed_hosts)
+    failure_count = len(failed_hosts)
 
     summary = f"Finished. Successful hosts: {success_count}. Failed hosts: {failure_count}."
+    if failed_hosts:
+        summary += f" ({', '.join(failed_hosts)})"
     log(summary)
 
+    host_lines = [format_host_metrics(metrics[name]) for name in futures.values() if name in metrics]
+    for line in host_lines:
+        log(line)
+    if host_lines:
+        summary += "\n" + "\n".join(host_lines)
+    try:
+        log(f"Metrics written: {write_run_metrics(telemetry['metrics_dir'], run_started, list(metrics.values()))}")
+    except OSError as exc:
+        log(f"Failed to write metrics file: {exc}")
+
     if failure_count == 0:
         send_pushover_notification(
             cfg,
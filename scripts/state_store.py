@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+state_store.py: Small key-value store for the "last seen" state of the monitoring scripts.
+
+Used by ip_changer_notifier.py (last IP), transmission_checker.py (notified torrents)
+and azure_ddns_updater.py (cached record values) instead of one text/JSON file each.
+
+How it works:
+- One SQLite database (WAL mode) holds all scripts' state, one namespace per script
+- Values are stored as JSON; a lookup is one primary-key read, not a scan of a file
+- Every write is its own transaction; update()/swap() read and write under one write lock,
+  so a cron run and a long-running monitor never both act on the same change
+- Entries may have a TTL; expired entries are invisible and are deleted by compact()
+  (run automatically when the store is opened)
+- Safe to share between threads (one connection behind a lock) and between processes
+  (SQLite locking with a busy timeout)
+
+Database location: `state.sqlite3` next to the scripts, or $SCRIPTS_STATE_DB.
+
+Run it directly to inspect the stored state:
+    python3 state_store.py [NAMESPACE] [--compact]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+DEFAULT_PATH = os.environ.get(
+    "SCRIPTS_STATE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state.sqlite3")
+)
+BUSY_TIMEOUT_MS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    expires REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS state_expires ON state (expires) WHERE expires IS NOT NULL;
+"""
+
+
+class StateStore:
+    """Namespaced key-value store backed by SQLite."""
+
+    def __init__(self, path: str = DEFAULT_PATH, compact: bool = True) -> None:
+        self.path = path
+        # Autocommit mode: transactions are opened explicitly (BEGIN IMMEDIATE) where needed.
+        self._conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            # In WAL mode NORMAL only risks the last commits on power loss, never corruption.
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(SCHEMA)
+        if compact:
+            self.compact(checkpoint=False)
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def contains(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM state WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return row is not None
+
+    def items(self, namespace: str) -> dict[str, Any]:
+        """Return every live entry of *namespace* as {key: value}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM state WHERE namespace = ? AND (expires IS NULL OR expires > ?)",
+                (namespace, time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def namespaces(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT namespace FROM state ORDER BY 1")]
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float | None = None) -> None:
+        self.set_many(namespace, {key: value}, ttl)
+
+    def set_many(
+        self, namespace: str, values: dict[str, Any] | Iterable[tuple[str, Any]], ttl: float | None = None
+    ) -> None:
+        """Write several entries in one transaction (all or none)."""
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        pairs = values.items() if isinstance(values, dict) else values
+        rows = [(namespace, key, json.dumps(value), now, expires) for key, value in pairs]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO state (namespace, key, value, updated, expires) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def update(
+        self, namespace: str, key: str, function: Callable[[Any], Any], default: Any = None, ttl: float | None = None
+    ) -> tuple[Any, Any]:
+        """Atomically replace the value with function(old value); return (old, new).
+
+        No other thread or process can write the entry between the read and the write.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+                (namespace, key, now),
+            ).fetchone()
+            old = default if row is None else json.loads(row[0])
+            new = function(old)
+            conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, updated, expires) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(new), now, None if ttl is None else now + ttl),
+            )
+        return old, new
+
+    def swap(self, namespace: str, key: str, value: Any, ttl: float | None = None) -> Any:
+        """Atomically store *value* and return the previous value (None if there was none)."""
+        return self.update(namespace, key, lambda _: value, ttl=ttl)[0]
+
+    def compact(self, checkpoint: bool = True) -> int:
+        """Delete expired entries (and fold the WAL back into the database); return how many were deleted."""
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)
+            ).rowcount
+        if checkpoint:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error), holding the thread lock."""
+        with self._lock:
+            # Take the write lock up front, so a concurrent writer waits here instead of failing at COMMIT.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+
+def open_store(path: str | None = None) -> StateStore:
+    """Open the shared store (*path* overrides the default location)."""
+    return StateStore(os.path.expanduser(path) if path else DEFAULT_PATH)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show the state kept by the monitoring scripts.")
+    parser.add_argument("namespace", nargs="?", help="Only show this namespace.")
+    parser.add_argument("--db", help=f"Database path (default: {DEFAULT_PATH}).")
+    parser.add_argument("--compact", action="store_true", help="Delete expired entries and checkpoint the WAL.")
+    args = parser.parse_args()
+
+    with open_store(args.db) as store:
+        if args.compact:
+            print(f"Deleted {store.compact()} expired entr(y/ies).")
+        for namespace in [args.namespace] if args.namespace else store.namespaces():
+            for key, value in sorted(store.items(namespace).items()):
+                print(f"{namespace}\t{key}\t{json.dumps(value)}")
+
+
+if __name__ == "__main__":
+    main()
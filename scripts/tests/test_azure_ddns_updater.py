@@ -0,0 +1,202 @@
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+CONFIG = """
+subscription_id: subscription
+resource_group: rg-default
+azure_tenant_id: tenant
+azure_client_id: client
+azure_client_secret: secret
+ttl: 300
+records:
+  - {zone: example.com, name: www}
+  - {zone: example.com, name: www, type: AAAA}
+  - {zone: example.org, name: home, resource_group: rg-org, ttl: 60}
+"""
+
+with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as config_file:
+    config_file.write(CONFIG)
+try:
+    with mock.patch.dict(os.environ, {"AZURE_DDNS_CONFIG": config_file.name}):
+        import azure_ddns_updater
+finally:
+    os.unlink(config_file.name)
+
+import public_ip
+import state_store
+
+IPV4, IPV6 = "81.2.69.142", "2001:db8::1"
+
+
+class FakeAzureDns:
+    """zone_records() and update() over in-memory zones: {(resource_group, zone): {(name, type): [ips]}}."""
+
+    def __init__(self, zones, broken_zones=()):
+        self.zones = zones
+        self.broken_zones = set(broken_zones)
+        self.listed = []
+        self.updated = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def zone_records(self, resource_group, zone):
+        with self.lock:
+            self.listed.append((resource_group, zone))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)  # long enough for concurrent listings to overlap
+        with self.lock:
+            self.active -= 1
+        if (resource_group, zone) in self.broken_zones:
+            raise RuntimeError("zone not found")
+        return dict(self.zones.get((resource_group, zone), {}))
+
+    def update(self, record, ip):
+        zone = (record["resource_group"], record["zone"])
+        with self.lock:
+            self.updated.append(zone + (record["name"], record["type"], record["ttl"], ip))
+            self.zones.setdefault(zone, {})[(record["name"], record["type"])] = [ip]
+
+
+class AzureDdnsUpdaterTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = state_store.StateStore(os.path.join(tmp.name, "state.sqlite3"))
+        self.addCleanup(self.store.close)
+        self.ips = {"A": IPV4, "AAAA": IPV6}
+        self.detected = []
+        patcher = mock.patch.object(azure_ddns_updater, "get_public_ip", self.get_public_ip)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.records = azure_ddns_updater.RECORDS
+
+    def get_public_ip(self, session, record_type="A"):
+        self.detected.append(record_type)
+        ip = self.ips[record_type]
+        if ip is None:
+            raise public_ip.IPDetectionError(f"no IPv{azure_ddns_updater.RECORD_FAMILIES[record_type]} source answered")
+        return ip
+
+    def check(self, dns, state=None):
+        if state is None:
+            state = azure_ddns_updater.load_state(self.store, self.records)
+        return azure_ddns_updater.check_and_update(dns, None, self.store, self.records, state, quiet=True)
+
+    def test_records_get_per_record_resource_group_and_ttl_defaults(self):
+        self.assertEqual(
+            [(r["resource_group"], r["zone"], r["name"], r["type"], r["ttl"]) for r in self.records],
+            [
+                ("rg-default", "example.com", "www", "A", 300),
+                ("rg-default", "example.com", "www", "AAAA", 300),
+                ("rg-org", "example.org", "home", "A", 60),
+            ],
+        )
+
+    def test_first_run_reads_zones_concurrently_and_writes_only_differing_records(self):
+        dns = FakeAzureDns({
+            ("rg-default", "example.com"): {("www", "A"): [IPV4], ("www", "AAAA"): ["2001:db8::99"]},
+        })
+        _, results = self.check(dns)
+
+        self.assertEqual(sorted(dns.listed), [("rg-default", "example.com"), ("rg-org", "example.org")])
+        self.assertEqual(dns.max_active, 2)
+        self.assertEqual(self.detected, ["A", "AAAA"])
+        self.assertEqual(
+            sorted(dns.updated),
+            [
+                ("rg-default", "example.com", "www", "AAAA", 300, IPV6),
+                ("rg-org", "example.org", "home", "A", 60, IPV4),
+            ],
+        )
+        self.assertEqual(
+            results,
+            {"A www.example.com": "unchanged", "AAAA www.example.com": "updated", "A home.example.org": "created"},
+        )
+
+    def test_cached_records_skip_azure_until_the_ip_changes(self):
+        dns = FakeAzureDns({})
+        self.check(dns)
+        dns.listed.clear()
+        dns.updated.clear()
+
+        _, results = self.check(dns)
+        self.assertEqual((dns.listed, dns.updated), ([], []))
+        self.assertEqual(set(results.values()), {"unchanged"})
+
+        self.ips["A"] = "81.2.69.160"
+        _, results = self.check(dns)
+        self.assertEqual(dns.listed, [])  # a fresh cache is trusted: write without re-reading the zone
+        self.assertEqual(sorted(update[2:4] + update[5:] for update in dns.updated),
+                         [("home", "A", "81.2.69.160"), ("www", "A", "81.2.69.160")])
+        self.assertEqual(results["AAAA www.example.com"], "unchanged")
+
+    def test_cache_older_than_record_refresh_hours_is_re_read(self):
+        dns = FakeAzureDns({})
+        state, _ = self.check(dns)
+        dns.listed.clear()
+        old = (datetime.now() - timedelta(hours=azure_ddns_updater.RECORD_REFRESH_HOURS + 1)).isoformat()
+        state = {key: {**entry, "verified": old} for key, entry in state.items()}
+
+        _, results = self.check(dns, state)
+        self.assertEqual(len(dns.listed), 2)
+        self.assertEqual(set(results.values()), {"unchanged"})
+
+        # The stored entries expire at the same age, so a new process re-reads the zones too.
+        with mock.patch.object(azure_ddns_updater, "RECORD_REFRESH_HOURS", 0.05 / 3600):
+            azure_ddns_updater.save_state(self.store, state)
+            time.sleep(0.1)
+            self.assertEqual(azure_ddns_updater.load_state(self.store, self.records), {})
+
+    def test_failed_ipv6_detection_only_fails_aaaa_records(self):
+        self.ips["AAAA"] = None
+        dns = FakeAzureDns({})
+        _, results = self.check(dns)
+
+        self.assertEqual(results["AAAA www.example.com"], "failed: no public IPv6 address")
+        self.assertEqual(results["A www.example.com"], "created")
+        self.assertEqual(results["A home.example.org"], "created")
+        self.assertEqual(sorted(update[3] for update in dns.updated), ["A", "A"])
+        self.assertEqual(
+            set(azure_ddns_updater.load_state(self.store, self.records)), {"A www.example.com", "A home.example.org"}
+        )
+
+    def test_unreadable_zone_only_fails_its_own_records(self):
+        dns = FakeAzureDns({}, broken_zones=[("rg-org", "example.org")])
+        _, results = self.check(dns)
+
+        self.assertTrue(results["A home.example.org"].startswith("failed: could not read zone"))
+        self.assertEqual(results["A www.example.com"], "created")
+        self.assertNotIn("A home.example.org", azure_ddns_updater.load_state(self.store, self.records))
+
+    def test_daemon_keeps_running_after_a_failed_check(self):
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+        calls = []
+
+        def check_and_update(dns, session, store, records, state, quiet=False):
+            calls.append(state)
+            if len(calls) == 1:
+                raise RuntimeError("Azure unavailable")
+            os.kill(os.getpid(), signal.SIGTERM)  # handled by the daemon: stop after this check
+            return {"A www.example.com": {"ip": IPV4}}, {}
+
+        with mock.patch.object(azure_ddns_updater, "check_and_update", check_and_update):
+            azure_ddns_updater.run_daemon(FakeAzureDns({}), None, self.store, 0.01)
+        self.assertEqual(calls, [{}, {}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import copy
+import importlib.util
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+LED_MATRIX_DIR = SCRIPT_DIR / "led-matrix"
+if str(LED_MATRIX_DIR) not in sys.path:
+    sys.path.insert(0, str(LED_MATRIX_DIR))
+
+HAVE_DEPENDENCIES = all(importlib.util.find_spec(name) for name in ("PIL", "yaml", "numpy"))
+if HAVE_DEPENDENCIES:
+    import numpy as np
+    from PIL import Image
+
+    import led_matrix_display
+
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "Pillow, PyYAML or NumPy is not installed")
+class TransitionRenderingTests(unittest.TestCase):
+    def images(self, size):
+        old = Image.effect_noise(size, 80).convert("RGB")
+        new = Image.linear_gradient("L").resize(size).convert("RGB")
+        return old, new
+
+    def test_numpy_frames_match_pillow_frames(self):
+        for size in ((64, 64), (128, 64), (7, 5)):
+            old, new = self.images(size)
+            for transition in led_matrix_display.TRANSITIONS + ("unknown",):
+                for n_frames in (2, 12):
+                    with self.subTest(size=size, transition=transition, n_frames=n_frames):
+                        expected = led_matrix_display.render_transition(
+                            old, new, transition, n_frames, use_numpy=False
+                        )
+                        frames = led_matrix_display.render_transition(old, new, transition, n_frames)
+                        self.assertEqual(frames.shape, (n_frames + 1, size[1], size[0], 3))
+                        for want, frame in zip(expected, frames):
+                            np.testing.assert_array_equal(np.asarray(want), frame)
+
+    def test_first_and_last_frames_are_the_two_images(self):
+        old, new = self.images((64, 64))
+        for transition in led_matrix_display.TRANSITIONS:
+            frames = led_matrix_display.render_transition(old, new, transition, 12)
+            np.testing.assert_array_equal(frames[0], np.asarray(old))
+            np.testing.assert_array_equal(frames[-1], np.asarray(new))
+            self.assertEqual(led_matrix_display._array_frame(frames[-1]).tobytes(), new.tobytes())
+
+
+class FakeDisplay:
+    rows = cols = 64
+    running = True
+
+    def __init__(self):
+        self.shown = []
+        self.shown_at = []
+
+    def show(self, img):
+        self.shown.append(img.tobytes())
+        self.shown_at.append(time.monotonic())
+
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "Pillow, PyYAML or NumPy is not installed")
+class TransitionCacheTests(unittest.TestCase):
+    def images(self, count):
+        return [Image.new("RGB", (64, 64), (40 * i, 255 - 40 * i, 0)) for i in range(count)]
+
+    def test_repeated_pairs_replay_cached_frames(self):
+        first, second = self.images(2)
+        cache = led_matrix_display.TransitionCache(1024 * 1024)
+        displays = [FakeDisplay(), FakeDisplay()]
+        with mock.patch.object(
+            led_matrix_display, "render_transition", wraps=led_matrix_display.render_transition
+        ) as render:
+            # The second pass loads the images again: equal content, new objects.
+            for display, new in zip(displays, (second, second.copy())):
+                led_matrix_display.apply_transition(display, first, new, "fade", 0.1, 100, cache=cache)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(displays[0].shown, displays[1].shown)
+        self.assertEqual(len(displays[0].shown), 11)
+
+    def test_least_recently_used_sequences_are_evicted(self):
+        images = self.images(4)
+        sequence_bytes = 3 * 64 * 64 * 3
+        cache = led_matrix_display.TransitionCache(2 * sequence_bytes)
+        keys = [cache.key(images[i], images[i + 1], "fade", 0.1, 20) for i in range(3)]
+        for i in range(2):
+            cache.put(keys[i], led_matrix_display.render_transition(images[i], images[i + 1], "fade", 2))
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[2], led_matrix_display.render_transition(images[2], images[3], "fade", 2))
+
+        self.assertEqual(cache.nbytes, 2 * sequence_bytes)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertNotEqual(keys[0], cache.key(images[0], images[1], "slide_left", 0.1, 20))
+
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "Pillow, PyYAML or NumPy is not installed")
+class SlideshowTests(unittest.TestCase):
+    def test_slow_images_are_prefetched_so_each_is_shown_on_time(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for i in range(4):
+            Image.new("RGB", (32, 32), (60 * i, 0, 0)).save(Path(tmp.name) / f"{i}.png")
+        load = led_matrix_display.load_image_file
+
+        def slow_load(path, target_size=None):
+            time.sleep(0.15)
+            return load(path, target_size)
+
+        cfg = copy.deepcopy(led_matrix_display.DEFAULT_CONFIG)
+        cfg["display"].update(slideshow_interval=0.3, loop=False, transition="none")
+        display = FakeDisplay()
+        with mock.patch.object(led_matrix_display, "load_image_file", slow_load):
+            led_matrix_display.mode_slideshow(display, tmp.name, cfg)
+
+        self.assertEqual(len(display.shown), 4)
+        self.assertEqual(len(set(display.shown)), 4)
+        gaps = [b - a for a, b in zip(display.shown_at, display.shown_at[1:])]
+        for gap in gaps:
+            self.assertAlmostEqual(gap, 0.3, delta=0.05)
+
+
+@unittest.skipUnless(HAVE_DEPENDENCIES, "Pillow, PyYAML or NumPy is not installed")
+class ImageLoadingTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def save(self, name, size, thumbnail_size=None, **options):
+        img = Image.linear_gradient("L").resize(size).convert("RGB")
+        if thumbnail_size:
+            exif = led_matrix_display._exif_with_thumbnail(img.resize(thumbnail_size))
+            options["exif"] = b"Exif\x00\x00" + exif if name.endswith(".jpg") else exif
+        img.save(self.dir / name, **options)
+        return str(self.dir / name)
+
+    def test_jpeg_is_decoded_at_the_smallest_scale_covering_the_target(self):
+        path = self.save("photo.jpg", (1024, 768))
+        self.assertEqual(led_matrix_display.load_image_file(path).size, (1024, 768))
+        self.assertEqual(led_matrix_display.load_image_file(path, (64, 64)).size, (128, 96))
+        self.assertEqual(led_matrix_display.load_image_file(path, (200, 180)).size, (256, 192))
+        self.assertEqual(led_matrix_display.load_image_file(path, (200, 200)).size, (512, 384))
+        self.assertEqual(led_matrix_display.load_image_file(path, (600, 600)).size, (1024, 768))
+
+    def test_matching_exif_thumbnail_replaces_the_full_image(self):
+        # Thumbnails too small for the target fall back to draft decoding (JPEG) or a full decode.
+        fallback_sizes = {"photo.jpg": (400, 300), "photo.webp": (1600, 1200), "photo.png": (1600, 1200)}
+        for name, fallback_size in fallback_sizes.items():
+            with self.subTest(name=name):
+                path = self.save(name, (1600, 1200), thumbnail_size=(160, 120))
+                self.assertEqual(led_matrix_display.load_image_file(path, (64, 64)).size, (160, 120))
+                self.assertEqual(led_matrix_display.load_image_file(path, (200, 200)).size, fallback_size)
+
+    def test_letterboxed_or_small_thumbnails_are_ignored(self):
+        path = self.save("wide.webp", (1500, 1000), thumbnail_size=(160, 120))
+        self.assertEqual(led_matrix_display.load_image_file(path, (64, 64)).size, (1500, 1000))
+        path = self.save("small.webp", (1600, 1200), thumbnail_size=(40, 30))
+        self.assertEqual(led_matrix_display.load_image_file(path, (64, 64)).size, (1600, 1200))
+
+
+if __name__ == "__main__":
+    unittest.main()
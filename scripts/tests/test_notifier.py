@@ -0,0 +1,89 @@
+import http.server
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import notifier
+
+
+class StubPushover(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        server = self.server
+        server.posts.append({key: values[0] for key, values in parse_qs(body).items()})
+        time.sleep(server.delay)
+        status = server.statuses.pop(0) if server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NotifierTests(unittest.TestCase):
+    def start_stub(self, statuses=(), delay=0.0):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubPushover)
+        server.daemon_threads = True
+        server.posts = []
+        server.statuses = list(statuses)
+        server.delay = delay
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_notifier(self, server, **options):
+        messages = []
+        pushover = notifier.PushoverNotifier(
+            "user", "token", api_url=f"http://127.0.0.1:{server.server_address[1]}/", log=messages.append, **options
+        )
+        self.addCleanup(pushover.close, 1)
+        return pushover, messages
+
+    def test_send_returns_immediately_and_bursts_become_one_digest(self):
+        server = self.start_stub(delay=0.5)
+        pushover, _ = self.make_notifier(server, coalesce_s=0.3)
+        started = time.monotonic()
+        for host in ("a", "b", "c"):
+            pushover.send(f"Backup failed for {host}", title="Backup Failed")
+        self.assertLess(time.monotonic() - started, 0.1)
+
+        self.assertTrue(pushover.flush(timeout=5))
+        self.assertEqual(len(server.posts), 1)
+        post = server.posts[0]
+        self.assertEqual((post["token"], post["user"], post["title"]), ("token", "user", "Backup Failed (3)"))
+        self.assertEqual(post["message"].splitlines(), [f"- Backup failed for {h}" for h in ("a", "b", "c")])
+
+    def test_retries_server_errors_but_not_rejected_requests(self):
+        server = self.start_stub(statuses=[503, 429, 200, 400])
+        pushover, messages = self.make_notifier(server, coalesce_s=0, backoff_s=0.01)
+        pushover.send("first")
+        self.assertTrue(pushover.flush(timeout=5))
+        self.assertEqual((len(server.posts), pushover.sent, pushover.failed), (3, 1, 0))
+
+        pushover.send("second")
+        self.assertTrue(pushover.flush(timeout=5))
+        self.assertEqual((len(server.posts), pushover.failed), (4, 1))
+        self.assertIn("HTTP 400", messages[-1])
+
+    def test_digest_truncates_to_pushover_limit(self):
+        payload = notifier.digest([
+            {"message": "x" * 2000, "title": None, "priority": 0},
+            {"message": "y", "title": "Other", "priority": 1},
+        ])
+        self.assertEqual(payload["title"], "2 notifications")
+        self.assertEqual(len(payload["message"]), notifier.PUSHOVER_MESSAGE_LIMIT)
+        self.assertEqual(payload["priority"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,6 +18,32 @@ class PiHoleSyncTests(unittest.TestCase):
         message = pihole_sync.describe_ssh_error("Permission denied (publickey,password)")
         self.assertIn("SSH key", message)
 
+    def test_classify_ssh_error(self):
+        self.assertEqual(
+            pihole_sync.classify_ssh_error("sudo: a password is required"),
+            pihole_sync.SSH_ERROR_SUDO_PASSWORD,
+        )
+        self.assertEqual(
+            pihole_sync.classify_ssh_error("ssh: connect to host pihole port 22: Connection refused"),
+            pihole_sync.SSH_ERROR_CONNECTION,
+        )
+        self.assertEqual(pihole_sync.classify_ssh_error("boom"), pihole_sync.SSH_ERROR_COMMAND)
+
+    def test_batch_ssh_command_disables_tty(self):
+        command = pihole_sync.ssh_command("pihole", "pi", 22, "true", tty=False)
+        self.assertIn("-T", command)
+        self.assertNotIn("-tt", command)
+        self.assertIn("BatchMode=yes", command)
+
+    def test_batch_sudo_prefix_is_non_interactive(self):
+        self.assertEqual(pihole_sync.host_sudo_prefix({}, {"sudo_prefix": "sudo"}, batch=True), "sudo -n")
+        self.assertEqual(pihole_sync.host_sudo_prefix({}, {}, batch=False), "sudo")
+
+    def test_run_batch_ssh_timeout_is_classified(self):
+        with self.assertRaises(pihole_sync.RemoteCommandError) as ctx:
+            pihole_sync.run_batch_ssh("pihole", [sys.executable, "-c", "import time; time.sleep(5)"], timeout=0.2)
+        self.assertEqual(ctx.exception.kind, pihole_sync.SSH_ERROR_TIMEOUT)
+
     def test_parse_toml_records(self):
         sample = '''[dns]
 hosts = [ "192.168.50.2 router", "192.168.50.3 printer homeprinter" ]
@@ -0,0 +1,233 @@
+import http.server
+import socket
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import public_ip
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the routes of the owning server: path -> (delay, content type, body)."""
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.soap_actions.append(self.headers.get("SOAPAction"))
+        self.respond()
+
+    def respond(self):
+        delay, content_type, body = self.server.routes[self.path]
+        time.sleep(delay)
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, routes, family=socket.AF_INET):
+        self.address_family = family
+        super().__init__(("::1" if family == socket.AF_INET6 else "127.0.0.1", 0), StubHandler)
+        self.routes = routes
+        self.soap_actions = []
+
+    def url(self, path):
+        host = "[::1]" if self.address_family == socket.AF_INET6 else "127.0.0.1"
+        return f"http://{host}:{self.server_address[1]}{path}"
+
+
+UPNP_SERVICE = "urn:schemas-upnp-org:service:WANIPConnection:1"
+UPNP_DESCRIPTION = (
+    '<?xml version="1.0"?><root xmlns="urn:schemas-upnp-org:device-1-0"><device><deviceList><device>'
+    f"<serviceList><service><serviceType>{UPNP_SERVICE}</serviceType><controlURL>/ctl/IPConn</controlURL>"
+    "</service></serviceList></device></deviceList></device></root>"
+)
+
+
+def upnp_reply(address):
+    return (
+        '<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+        f'<u:GetExternalIPAddressResponse xmlns:u="{UPNP_SERVICE}">'
+        f"<NewExternalIPAddress>{address}</NewExternalIPAddress>"
+        "</u:GetExternalIPAddressResponse></s:Body></s:Envelope>"
+    )
+
+
+def serve_udp(handler):
+    """Answer one UDP request on a local port with handler(request); return the port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+
+    def run():
+        with sock:
+            data, address = sock.recvfrom(2048)
+            sock.sendto(handler(data), address)
+
+    threading.Thread(target=run, daemon=True).start()
+    return sock.getsockname()[1]
+
+
+class PublicIpTests(unittest.TestCase):
+    def start_http(self, routes, family=socket.AF_INET):
+        server = StubHTTPServer(routes, family)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_returns_once_quorum_agrees_without_waiting_for_slow_source(self):
+        server = self.start_http({
+            "/a": (0, "text/plain", "203.0.113.7\n"),
+            "/b": (0.1, "text/plain", "203.0.113.7"),
+            "/slow": (2.5, "text/plain", "203.0.113.7"),
+            "/wrong": (0, "text/plain", "198.51.100.1"),
+        })
+        sources = [server.url(path) for path in ("/a", "/b", "/slow", "/wrong")]
+        started = time.monotonic()
+        self.assertEqual(public_ip.detect_public_ip(4, sources, quorum=2, timeout=3), "203.0.113.7")
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_disagreement_and_wrong_family_raise(self):
+        server = self.start_http({
+            "/a": (0, "text/plain", "203.0.113.7"),
+            "/b": (0, "text/plain", "198.51.100.1"),
+            "/v6": (0, "text/plain", "2001:db8::1"),
+        })
+        with self.assertRaises(public_ip.IPDetectionError) as caught:
+            public_ip.detect_public_ip(4, [server.url("/a"), server.url("/b"), server.url("/v6")], quorum=2, timeout=2)
+        self.assertIn("expected an IPv4 address", str(caught.exception))
+
+    def test_ipv6_over_http(self):
+        try:
+            server = self.start_http({"/ip": (0, "text/plain", "2001:db8::1")}, socket.AF_INET6)
+        except OSError:
+            self.skipTest("IPv6 loopback not available")
+        self.assertEqual(public_ip.detect_public_ip(6, [server.url("/ip")], quorum=1, timeout=2), "2001:db8::1")
+
+    def test_stun_xor_mapped_address(self):
+        def respond(request):
+            transaction = request[8:20]
+            port = 40000 ^ (public_ip.STUN_MAGIC_COOKIE >> 16)
+            cookie = struct.pack(">I", public_ip.STUN_MAGIC_COOKIE)
+            address = bytes(b ^ m for b, m in zip(bytes([203, 0, 113, 9]), cookie))
+            attribute = struct.pack(">HHBBH", public_ip.STUN_ATTR_XOR_MAPPED_ADDRESS, 8, 0, 1, port) + address
+            header = struct.pack(">HHI", public_ip.STUN_BINDING_SUCCESS, len(attribute), public_ip.STUN_MAGIC_COOKIE)
+            return header + transaction + attribute
+
+        port = serve_udp(respond)
+        self.assertEqual(public_ip.query_stun(f"127.0.0.1:{port}", 4, timeout=2), "203.0.113.9")
+
+    def test_natpmp_external_address(self):
+        port = serve_udp(lambda request: struct.pack(">BBHI", 0, 128, 0, 1234) + bytes([192, 0, 2, 44]))
+        self.assertEqual(
+            public_ip.detect_public_ip(4, [f"natpmp:127.0.0.1:{port}"], quorum=1, timeout=2), "192.0.2.44"
+        )
+
+    def test_upnp_get_external_ip_address(self):
+        server = self.start_http({
+            "/desc.xml": (0, "text/xml", UPNP_DESCRIPTION),
+            "/ctl/IPConn": (0, "text/xml", upnp_reply("198.51.100.23")),
+        })
+        source = f"upnp:{server.url('/desc.xml')}"
+        self.assertEqual(public_ip.detect_public_ip(4, [source], quorum=1, timeout=2), "198.51.100.23")
+        self.assertEqual(server.soap_actions, [f'"{UPNP_SERVICE}#GetExternalIPAddress"'])
+        with self.assertRaises(ValueError):
+            public_ip.detect_public_ip(6, [source], quorum=1)
+
+    def test_parse_netlink_address_events(self):
+        def message(message_type, family, index, attributes, flags=0):
+            body = struct.pack("=BBBBI", family, 24, flags, 0, index)
+            for attr_type, value in attributes:
+                attr = struct.pack("=HH", 4 + len(value), attr_type) + value
+                body += attr + bytes(-len(attr) % 4)
+            return struct.pack("=IHHII", 16 + len(body), message_type, 0, 0, 0) + body
+
+        data = (
+            message(public_ip.RTM_NEWADDR, socket.AF_INET, 3, [
+                (public_ip.IFA_ADDRESS, bytes([10, 0, 0, 1])),
+                (public_ip.IFA_LOCAL, bytes([203, 0, 113, 5])),
+            ])
+            + message(public_ip.RTM_NEWADDR, socket.AF_INET, 2, [(public_ip.IFA_ADDRESS, bytes([192, 168, 1, 9]))])
+            + message(public_ip.RTM_DELADDR, socket.AF_INET6, 3, [
+                (public_ip.IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "2001:db8::7")),
+            ])
+            # An IPv6 privacy address, then the stable address turning deprecated (flag only in IFA_FLAGS).
+            + message(public_ip.RTM_NEWADDR, socket.AF_INET6, 3, [
+                (public_ip.IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "2001:db8::1234")),
+            ], flags=public_ip.IFA_F_TEMPORARY)
+            + message(public_ip.RTM_NEWADDR, socket.AF_INET6, 3, [
+                (public_ip.IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "2001:db8::7")),
+                (public_ip.IFA_FLAGS, struct.pack("=I", public_ip.IFA_F_DEPRECATED)),
+            ])
+        )
+        self.assertEqual(
+            public_ip.parse_netlink_addresses(data, 3),
+            [("new", 4, "203.0.113.5"), ("del", 6, "2001:db8::7")],
+        )
+
+    def run_monitor(self, monitor, until):
+        changes = []
+        stop = threading.Event()
+
+        def on_change(address, previous, how):
+            changes.append((address, previous, how))
+            if len(changes) >= until:
+                stop.set()
+
+        thread = threading.Thread(target=monitor.run, args=(on_change, stop, "81.2.69.142"), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+        stop.set()
+        return changes
+
+    def test_monitor_follows_router_upnp_address(self):
+        routes = {
+            "/desc.xml": (0, "text/xml", UPNP_DESCRIPTION),
+            "/ctl/IPConn": (0, "text/xml", upnp_reply("81.2.69.142")),
+        }
+        server = self.start_http(routes)
+        monitor = public_ip.IPMonitor(upnp_source=f"upnp:{server.url('/desc.xml')}", poll_interval=0.05, timeout=1)
+        # The stored address is still current at first; then the router gets a new one.
+        new_reply = (0, "text/xml", upnp_reply("81.2.69.160"))
+        threading.Timer(0.3, lambda: routes.update({"/ctl/IPConn": new_reply})).start()
+        self.assertEqual(self.run_monitor(monitor, until=1), [("81.2.69.160", "81.2.69.142", "upnp")])
+
+    def test_monitor_falls_back_to_lookup_behind_carrier_grade_nat(self):
+        server = self.start_http({
+            "/desc.xml": (0, "text/xml", UPNP_DESCRIPTION),
+            "/ctl/IPConn": (0, "text/xml", upnp_reply("100.64.12.34")),
+            "/ip": (0, "text/plain", "203.0.113.50"),
+        })
+        messages = []
+        monitor = public_ip.IPMonitor(
+            upnp_source=f"upnp:{server.url('/desc.xml')}",
+            poll_interval=0.05,
+            fallback_interval=60,
+            sources=[server.url("/ip")],
+            quorum=1,
+            timeout=1,
+            log=messages.append,
+        )
+        self.assertEqual(self.run_monitor(monitor, until=1), [("203.0.113.50", "81.2.69.142", "lookup")])
+        self.assertIn("carrier-grade NAT", messages[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,414 @@
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import shlex
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import raspi_sd_backup
+
+
+class RaspiSdBackupTests(unittest.TestCase):
+    def test_stream_command_to_file_copies_stdout(self):
+        outfile = io.BytesIO()
+        result = raspi_sd_backup.stream_command_to_file(
+            [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'x' * 300000); sys.stderr.write('done')"],
+            outfile,
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stderr, "done")
+        self.assertEqual(result.bytes_received, 300000)
+        self.assertEqual(outfile.getvalue(), b"x" * 300000)
+
+    def test_stream_command_to_file_local_filter_compresses(self):
+        outfile = io.BytesIO()
+        result = raspi_sd_backup.stream_command_to_file(
+            [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'y' * 500000)"],
+            outfile,
+            local_filter=[sys.executable, "-c", "import gzip, sys; sys.stdout.buffer.write(gzip.compress(sys.stdin.buffer.read()))"],
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.bytes_received, 500000)
+        self.assertEqual(gzip.decompress(outfile.getvalue()), b"y" * 500000)
+
+    def test_resolve_compression_defaults_to_remote_gzip(self):
+        compression = raspi_sd_backup.resolve_compression({"gzip_level": 12})
+        self.assertEqual(compression, {"codec": "gzip", "level": 9, "threads": 0, "location": "remote"})
+        self.assertEqual(raspi_sd_backup.image_suffix(compression), ".img.gz")
+
+    def test_build_image_pipeline_places_compressor(self):
+        remote = raspi_sd_backup.resolve_compression({"compression": {"codec": "zstd", "threads": 4}})
+        pipeline, local_filter = raspi_sd_backup.build_image_pipeline("/dev/mmcblk0", remote)
+        self.assertEqual(shlex.split(pipeline)[:3], ["bash", "-o", "pipefail"])
+        self.assertTrue(shlex.split(pipeline)[-1].endswith("| zstd -3 -T4 -q -c"))
+        self.assertIsNone(local_filter)
+
+        local = raspi_sd_backup.resolve_compression({"compression": {"codec": "xz", "location": "local"}})
+        pipeline, local_filter = raspi_sd_backup.build_image_pipeline("/dev/mmcblk0", local, count_blocks=8)
+        self.assertNotIn("|", pipeline)
+        self.assertIn("count=8", pipeline)
+        self.assertEqual(local_filter, ["xz", "-1", "-T0", "-c"])
+
+    def test_stream_command_to_file_hashes_inline(self):
+        hashers = raspi_sd_backup.create_hashers(["sha256", "blake2b"])
+        raspi_sd_backup.stream_command_to_file(
+            [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'abc')"],
+            io.BytesIO(),
+            hashers=hashers,
+        )
+        self.assertEqual(sorted(hashers), ["blake2b", "sha256"])
+        self.assertEqual(hashers["sha256"].hexdigest(), hashlib.sha256(b"abc").hexdigest())
+
+    def test_create_hashers_rejects_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            raspi_sd_backup.create_hashers(["not-a-hash"])
+
+    def test_stream_command_to_file_honours_stop_event(self):
+        stop_event = threading.Event()
+        stop_event.set()
+        with self.assertRaises(raspi_sd_backup.BackupCancelled):
+            raspi_sd_backup.stream_command_to_file(
+                [sys.executable, "-c", "import time; time.sleep(5)"],
+                io.BytesIO(),
+                stop_event=stop_event,
+            )
+
+    def test_expand_extent_stream_to_file_and_pipe(self):
+        stream = io.BytesIO(
+            raspi_sd_backup.EXTENT_MAGIC
+            + b"M" + struct.pack(">I", 20) + b'{"device_size": 16} '
+            + b"D" + struct.pack(">QI", 2, 3) + b"abc"
+            + b"D" + struct.pack(">QI", 10, 2) + b"xy"
+            + b"E"
+        )
+        expected = b"\0\0abc\0\0\0\0\0xy\0\0\0\0"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            target = Path(tmp) / "disk.img"
+            with target.open("wb") as out:
+                header = raspi_sd_backup.expand_extent_stream(stream, out)
+            self.assertEqual(header["device_size"], 16)
+            self.assertEqual(target.read_bytes(), expected)
+
+        class Pipe(io.BytesIO):
+            def seekable(self):
+                return False
+
+        stream.seek(0)
+        pipe = Pipe()
+        raspi_sd_backup.expand_extent_stream(stream, pipe)
+        self.assertEqual(pipe.getvalue(), expected)
+
+    def test_expand_extent_stream_zeroes_gaps_on_untruncatable_device(self):
+        stream = io.BytesIO(
+            raspi_sd_backup.EXTENT_MAGIC
+            + b"M" + struct.pack(">I", 20) + b'{"device_size": 16} '
+            + b"D" + struct.pack(">QI", 10, 2) + b"xy"
+            + b"D" + struct.pack(">QI", 2, 3) + b"abc"
+            + b"E"
+        )
+
+        class Device(io.BytesIO):
+            def truncate(self, size=None):
+                raise OSError(22, "Invalid argument")
+
+        device = Device(b"\xff" * 16)  # old card contents
+        raspi_sd_backup.expand_extent_stream(stream, device)
+        self.assertEqual(device.getvalue(), b"\0\0abc\0\0\0\0\0xy\0\0\0\0")
+
+    @unittest.skipUnless(shutil.which("mkfs.ext4"), "mkfs.ext4 not available")
+    def test_extent_agent_streams_only_used_ext4_blocks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            content = tmp_path / "content"
+            content.mkdir()
+            payload = os.urandom(2 * 1024 * 1024)
+            (content / "payload.bin").write_bytes(payload)
+            disk = tmp_path / "disk.img"
+            size = 32 * 1024 * 1024
+            mbr = bytearray(512)
+            mbr[446 + 4] = 0x83
+            struct.pack_into("<II", mbr, 446 + 8, 2048, size // 512 - 2048)
+            mbr[510:512] = b"\x55\xaa"
+            with disk.open("wb") as f:
+                f.truncate(size)
+                f.write(mbr)
+            subprocess.run(
+                ["mkfs.ext4", "-q", "-F", "-E", "offset=1048576", "-d", str(content), str(disk), "31M"],
+                check=True,
+            )
+
+            streamed = subprocess.run(
+                [sys.executable, "-c", raspi_sd_backup.REMOTE_EXTENT_AGENT, "used", str(disk)],
+                check=True,
+                capture_output=True,
+            ).stdout
+            self.assertLess(len(streamed), size // 2)
+
+            restored = tmp_path / "restored.img"
+            with restored.open("wb") as out:
+                header = raspi_sd_backup.expand_extent_stream(io.BytesIO(streamed), out)
+            self.assertEqual(header["partitions"][0]["fstype"], "ext")
+            self.assertEqual(restored.stat().st_size, size)
+            self.assertIn(payload, restored.read_bytes())
+
+    def test_chunk_store_deduplicates_and_collects_garbage(self):
+        data = os.urandom(3 * 1024 * 1024) + bytes(2 * 1024 * 1024) + os.urandom(1024 * 1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = raspi_sd_backup.ChunkStore(Path(tmp) / "chunks")
+
+            first = raspi_sd_backup.ChunkedImageWriter(store, average_size=256 * 1024)
+            first.write(data[:1000000])
+            first.write(data[1000000:])
+            chunks = first.close()
+            self.assertEqual(sum(length for _, length in chunks), len(data))
+
+            second = raspi_sd_backup.ChunkedImageWriter(store, average_size=256 * 1024)
+            second.write(data)
+            self.assertEqual(second.close(), chunks)
+            self.assertEqual(second.new_chunks, 0)
+
+            reader = io.BufferedReader(raspi_sd_backup.ChunkReader(store, chunks))
+            self.assertEqual(reader.read(), data)
+
+            removed, reclaimed = store.collect_garbage({chunks[0][0]})
+            self.assertGreater(removed, 0)
+            self.assertGreater(reclaimed, 0)
+            self.assertEqual([path.name for path in store.iter_objects()], [chunks[0][0]])
+
+    def test_incremental_agent_sends_changed_blocks_and_expands_chain(self):
+        block = 64 * 1024
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            device = tmp_path / "device"
+            original = os.urandom(4 * block) + bytes(2 * block) + os.urandom(block // 2)
+            device.write_bytes(original)
+
+            def run_agent(base_name, previous):
+                args = [sys.executable, "-c", raspi_sd_backup.REMOTE_EXTENT_AGENT, "incremental", str(device), str(block)]
+                if base_name:
+                    args.append(base_name)
+                proc = subprocess.run(args, input=previous, capture_output=True, check=True)
+                report, _ = raspi_sd_backup.split_blockmap_report(proc.stderr.decode())
+                return proc.stdout, report
+
+            full_stream, full_report = run_agent(None, b"")
+            self.assertEqual(full_report["changed"], 5)  # the two zero blocks are skipped
+            full_path = tmp_path / "host_1.rsbd"
+            full_path.write_bytes(full_stream)
+
+            changed = bytearray(original)
+            changed[block + 10:block + 20] = b"x" * 10
+            changed[4 * block:4 * block + 5] = b"y" * 5
+            device.write_bytes(bytes(changed))
+            delta_stream, delta_report = run_agent(full_path.name, bytes.fromhex(full_report["digests"]))
+            self.assertEqual(delta_report["changed"], 2)
+            self.assertLess(len(delta_stream), 3 * block)
+            delta_path = tmp_path / "host_2.rsbd"
+            delta_path.write_bytes(delta_stream)
+            (tmp_path / ("host_2.rsbd" + raspi_sd_backup.BLOCKMAP_SUFFIX)).write_text(
+                '{"base": "host_1.rsbd", "depth": 1}', encoding="utf-8"
+            )
+
+            self.assertEqual(raspi_sd_backup.backup_chain(delta_path), [full_path])
+            restored = tmp_path / "restored.img"
+            raspi_sd_backup.expand_backup(delta_path, restored)
+            self.assertEqual(restored.read_bytes(), bytes(changed))
+
+    def test_prepare_resume_verifies_partial_before_continuing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            host_dir = Path(tmp)
+            segment = gzip.compress(b"a" * 1000)
+            partial = host_dir / "pi_20250101_000000.img.gz.partial"
+            partial.write_bytes(segment + b"torn segment")
+            state_path = host_dir / ("pi_20250101_000000.img.gz.partial" + raspi_sd_backup.RESUME_STATE_SUFFIX)
+            raspi_sd_backup.write_resume_state(state_path, {
+                "source_device": "/dev/mmcblk0",
+                "offset": 4 * 1024 * 1024,
+                "partial_bytes": len(segment),
+                "partial_sha256": hashlib.sha256(segment).hexdigest(),
+            })
+            new_image = host_dir / "pi_20250102_000000.img.gz"
+
+            hashers = raspi_sd_backup.create_hashers(["sha256"])
+            image, state = raspi_sd_backup.prepare_resume(host_dir, new_image, "/dev/mmcblk0", hashers, "pi")
+            self.assertEqual(image, host_dir / "pi_20250101_000000.img.gz")
+            self.assertEqual(state["offset"], 4 * 1024 * 1024)
+            self.assertEqual(partial.read_bytes(), segment)
+
+            partial.write_bytes(b"x" * len(segment))
+            hashers = raspi_sd_backup.create_hashers(["sha256"])
+            image, state = raspi_sd_backup.prepare_resume(host_dir, new_image, "/dev/mmcblk0", hashers, "pi")
+            self.assertEqual(image, new_image)
+            self.assertEqual(state["offset"], 0)
+            self.assertFalse(partial.exists())
+            self.assertEqual(hashers["sha256"].hexdigest(), hashlib.sha256().hexdigest())
+
+    def test_resumable_stream_rejects_segment_ending_before_device_end(self):
+        # Stands in for `ssh host <pipeline>`: dd "reads" 10 bytes and exits 0.
+        fake_ssh = [
+            sys.executable, "-c",
+            "import sys; sys.stdout.write('0123456789'); sys.stderr.write('10 bytes (10 B) copied\\n')",
+        ]
+        compression = raspi_sd_backup.resolve_compression({"compression": {"codec": "gzip"}})
+        resume = {"segment_bytes": 4 * 1024 * 1024, "retries": 0, "retry_delay_s": 0.0}
+        with tempfile.TemporaryDirectory() as tmp:
+            partial = Path(tmp) / "pi_20250101_000000.img.gz.partial"
+            for device_size, returncode, partial_bytes in ((10, 0, 10), (8 * 1024 * 1024, 1, 0)):
+                with self.subTest(device_size=device_size):
+                    partial.unlink(missing_ok=True)
+                    state = {"source_device": "/dev/mmcblk0", "offset": 0, "partial_bytes": 0,
+                             "partial_sha256": hashlib.sha256().hexdigest()}
+                    result = raspi_sd_backup.stream_resumable_image(
+                        fake_ssh, "/dev/mmcblk0", compression, partial, state, resume,
+                        raspi_sd_backup.create_hashers(["sha256"]), device_size=device_size,
+                    )
+                    self.assertEqual(result.returncode, returncode)
+                    self.assertEqual(partial.stat().st_size, partial_bytes)
+            self.assertIn(f"dd read 10 of {8 * 1024 * 1024} bytes", result.stderr)
+
+    def test_stream_command_to_file_feeds_progress_to_monitor(self):
+        script = (
+            "import sys; err = sys.stderr\n"
+            "err.write('\\r4194304 bytes (4.2 MB, 4.0 MiB) copied, 1 s, 4.2 MB/s'); err.flush()\n"
+            "sys.stdout.buffer.write(b'z' * 1000); sys.stdout.flush()\n"
+            "err.write('\\r8388608 bytes (8.4 MB, 8.0 MiB) copied, 2 s, 4.2 MB/s\\n2+0 records in\\n'); err.flush()\n"
+            "err.write('RSB-PROGRESS 9000000 10000000\\nwarning: slow card\\n')\n"
+        )
+        monitor = raspi_sd_backup.TransferMonitor("pi", interval=3600)
+        result = raspi_sd_backup.stream_command_to_file([sys.executable, "-c", script], io.BytesIO(), monitor=monitor)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            result.stderr,
+            "8388608 bytes (8.4 MB, 8.0 MiB) copied, 2 s, 4.2 MB/s\n2+0 records in\nwarning: slow card",
+        )
+        summary = monitor.summary()
+        self.assertEqual(summary["device_bytes"], 9000000)
+        self.assertEqual(summary["device_total"], 10000000)
+        self.assertEqual(summary["wire_bytes"], 1000)
+        self.assertEqual(summary["ratio"], 9000.0)
+        self.assertIn("9/10 MB read", monitor.status_line())
+
+    def test_verify_backup_checks_sidecars_and_detects_corruption(self):
+        image = os.urandom(300000) + bytes(700000)
+        with tempfile.TemporaryDirectory() as tmp:
+            backup = Path(tmp) / "pi_20250101_000000.img.gz"
+            backup.write_bytes(gzip.compress(image))
+            hashers = raspi_sd_backup.create_hashers(["blake2b"])
+            for hasher in hashers.values():
+                hasher.update(backup.read_bytes())
+            raspi_sd_backup.write_checksum_files(backup, hashers)
+
+            result = raspi_sd_backup.verify_backup(backup)
+            self.assertTrue(result["ok"], result)
+            self.assertEqual(result["checks"], {"sha256": True, "blake2b": True})
+            self.assertEqual(result["image_bytes"], len(image))
+
+            data = bytearray(backup.read_bytes())
+            data[len(data) // 2] ^= 0xFF
+            backup.write_bytes(bytes(data))
+            result = raspi_sd_backup.verify_backup(backup)
+            self.assertFalse(result["ok"])
+
+    def test_verify_backup_reports_missing_zstd(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backup = Path(tmp) / "pi_20250101_000000.img.zst"
+            backup.write_bytes(b"\x28\xb5\x2f\xfd" + bytes(100))
+            with mock.patch.object(raspi_sd_backup.shutil, "which", return_value=None):
+                self.assertIsNone(raspi_sd_backup.parallel_decompressor(backup.name))
+                result = raspi_sd_backup.verify_backup(backup)
+        self.assertFalse(result["ok"])
+        self.assertIn("zstd is not installed", result["error"])
+
+    def test_restore_to_file_writes_image_and_checks_digest(self):
+        image = os.urandom(200000) + bytes(100000)
+        with tempfile.TemporaryDirectory() as tmp:
+            backup = Path(tmp) / "pi_20250101_000000.img.xz"
+            backup.write_bytes(lzma.compress(image))
+            hashers = raspi_sd_backup.create_hashers([])
+            hashers["sha256"].update(backup.read_bytes())
+            raspi_sd_backup.write_checksum_files(backup, hashers)
+
+            target = Path(tmp) / "card.img"
+            result = raspi_sd_backup.restore_to_file(backup, target)
+            self.assertTrue(result["ok"], result)
+            self.assertEqual(result["bytes"], len(image))
+            self.assertEqual(target.read_bytes(), image)
+
+    def test_prune_old_backups_applies_tiered_retention(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            host_dir = root / "pi"
+            host_dir.mkdir()
+            names = [
+                "pi_20250301_020000.img.gz",  # newest
+                "pi_20250301_010000.img.gz",  # same day: only "last" keeps it
+                "pi_20250228_020000.img.gz",  # daily
+                "pi_20250215_020000.img.gz",  # weekly + monthly (February)
+                "pi_20250210_020000.img.gz",  # older in an already counted month: pruned
+                "pi_20250115_020000.img.gz",  # monthly (January)
+                "pi_20241215_020000.img.gz",  # beyond 3 months: pruned
+            ]
+            for name in names:
+                (host_dir / name).write_bytes(b"x" * 1000)
+                (host_dir / f"{name}.sha256").write_text("digest\n")
+            cfg = {"retention": {"last": 2, "daily": 2, "weekly": 2, "monthly": 2}}
+            host_cfg = {"name": "pi", "retention": {"monthly": 3}}
+
+            doomed = raspi_sd_backup.prune_old_backups(root, host_cfg, cfg, dry_run=True)
+            self.assertEqual(sorted(p.name for p in doomed), sorted([names[4], names[6]]))
+            self.assertTrue((host_dir / names[4]).exists())
+
+            raspi_sd_backup.prune_old_backups(root, host_cfg, cfg)
+            left = sorted(p.name for p in host_dir.iterdir())
+            self.assertEqual(left, sorted(n + s for n in names[:4] + [names[5]] for s in ("", ".sha256")))
+            self.assertEqual(
+                raspi_sd_backup.resolve_retention({"retention_count": 3}, {"name": "pi"}),
+                {"last": 3, "daily": 0, "weekly": 0, "monthly": 0},
+            )
+
+    def test_run_hooks_stops_pre_hooks_but_runs_every_post_hook(self):
+        hooks = raspi_sd_backup.resolve_hooks(
+            {"pre_backup": ["global"], "post_backup": ["global"]},
+            {"pre_backup": "only-host", "hook_timeout_s": 5},
+        )
+        self.assertEqual(hooks, {"pre_backup": ["only-host"], "post_backup": ["global"], "timeout_s": 5.0})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            marker = Path(tmp) / "ran"
+            commands = [f"echo one >> {marker}", "echo broken >&2; exit 3", f"echo two >> {marker}"]
+            # The hook command is the last argument, as for ssh.
+            shell = ["sh", "-c"]
+            _, errors = raspi_sd_backup.run_hooks(shell, commands, "pre_backup", "pi", timeout=5)
+            self.assertEqual(errors, ["'echo broken >&2; exit 3' exited with 3: broken"])
+            self.assertEqual(marker.read_text(), "one\n")
+
+            _, errors = raspi_sd_backup.run_hooks(shell, commands, "post_backup", "pi", timeout=5, keep_going=True)
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(marker.read_text(), "one\none\ntwo\n")
+
+    def test_bandwidth_limiter_throttles_after_burst(self):
+        limiter = raspi_sd_backup.BandwidthLimiter(4 * 1024 * 1024)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.consume(1024 * 1024)
+        # 4 MB burst allowance, the remaining 2 MB take about half a second.
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import state_store
+
+
+def increment_in_process(path, count):
+    with state_store.StateStore(path) as store:
+        for _ in range(count):
+            store.update("counter", "n", lambda n: n + 1, default=0)
+
+
+class StateStoreTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = str(Path(tmp.name) / "state.sqlite3")
+
+    def open_store(self):
+        store = state_store.StateStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_values_round_trip_per_namespace_and_survive_reopening(self):
+        store = self.open_store()
+        store.set("ip", "ipv4", "81.2.69.142")
+        store.set_many("azure", {"A www.example.com": {"ip": "81.2.69.142", "verified": "2026-10-19T10:00:00"}})
+        self.assertIsNone(store.get("azure", "ipv4"))
+        store.close()
+
+        store = self.open_store()
+        self.assertEqual(store.get("ip", "ipv4"), "81.2.69.142")
+        self.assertTrue(store.contains("azure", "A www.example.com"))
+        self.assertEqual(store.items("azure")["A www.example.com"]["ip"], "81.2.69.142")
+        self.assertEqual(store.namespaces(), ["azure", "ip"])
+        self.assertEqual(store.swap("ip", "ipv4", "81.2.69.160"), "81.2.69.142")
+        self.assertEqual(store.swap("ip", "ipv6", "2001:db8::1"), None)
+
+    def test_expired_entries_are_hidden_and_compacted(self):
+        store = self.open_store()
+        store.set("seen", "old", True, ttl=0.05)
+        store.set("seen", "kept", True)
+        self.assertTrue(store.contains("seen", "old"))
+        time.sleep(0.1)
+        self.assertFalse(store.contains("seen", "old"))
+        self.assertEqual(store.items("seen"), {"kept": True})
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(store.compact(), 0)
+
+    def test_failed_update_leaves_value_unchanged(self):
+        store = self.open_store()
+        store.set("counter", "n", 1)
+
+        def fail(_):
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            store.update("counter", "n", fail)
+        self.assertEqual(store.get("counter", "n"), 1)
+
+    def test_concurrent_updates_from_threads_and_processes_are_not_lost(self):
+        store = self.open_store()
+        threads = [
+            threading.Thread(target=lambda: [store.update("counter", "n", lambda n: n + 1, default=0) for _ in range(50)])
+            for _ in range(4)
+        ]
+        processes = [
+            multiprocessing.get_context("spawn").Process(target=increment_in_process, args=(self.path, 50))
+            for _ in range(2)
+        ]
+        for worker in threads + processes:
+            worker.start()
+        for worker in threads + processes:
+            worker.join(timeout=30)
+        self.assertEqual([process.exitcode for process in processes], [0, 0])
+        self.assertEqual(store.get("counter", "n"), 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
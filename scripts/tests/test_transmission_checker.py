@@ -0,0 +1,287 @@
+import http.server
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import unittest
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+HAVE_TRANSMISSION_RPC = importlib.util.find_spec("transmission_rpc") is not None
+if HAVE_TRANSMISSION_RPC:
+    import transmission_checker
+
+
+def torrent(name, hash_string, progress=100.0, labels=(), download_dir="/downloads"):
+    return SimpleNamespace(
+        id=1, name=name, hash_string=hash_string, progress=progress, labels=list(labels), download_dir=download_dir
+    )
+
+
+class StubTransmission(http.server.BaseHTTPRequestHandler):
+    """Transmission RPC: session-get, and torrent-get answered from the server's queued replies."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.connections.add(self.client_address)
+        if self.headers.get("X-Transmission-Session-Id") != "stub":
+            return self.reply(409, {})
+        arguments = request.get("arguments", {})
+        if request["method"] == "session-get":
+            result = {"version": "4.0.5", "rpc-version": 17, "rpc-version-minimum": 14}
+        else:
+            server.torrent_gets.append((arguments.get("ids"), sorted(arguments["fields"])))
+            torrents = server.replies.pop(0) if server.replies else []
+            if len(server.torrent_gets) >= server.stop_after:
+                server.stop.set()
+            result = {"torrents": torrents, "removed": []}
+        self.reply(200, {"result": "success", "arguments": result})
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("X-Transmission-Session-Id", "stub")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMoveClient:
+    """move_torrent_data() plus get_torrent() reporting each queued downloadDir in turn."""
+
+    def __init__(self, download_dirs):
+        self.download_dirs = list(download_dirs)
+        self.moves = []
+        self.error = ""
+
+    def move_torrent_data(self, ids, location, move=False):
+        self.moves.append((ids, location))
+
+    def get_torrent(self, torrent_id, arguments=None):
+        download_dir = self.download_dirs.pop(0) if len(self.download_dirs) > 1 else self.download_dirs[0]
+        if self.error:
+            download_dir = "/downloads"
+        return SimpleNamespace(download_dir=download_dir, error=3 if self.error else 0, error_string=self.error)
+
+
+@unittest.skipUnless(HAVE_TRANSMISSION_RPC, "transmission-rpc is not installed")
+class TransmissionCheckerTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.path = os.path.join(tmp.name, "state.sqlite3")
+        self.sent = []
+
+    def check(self, torrents):
+        with transmission_checker.open_state(self.path) as store:
+            return transmission_checker.check_torrents(store, torrents, self.completed)
+
+    def completed(self, torrent):
+        self.sent.append(torrent.name)
+
+    def test_notifies_each_finished_torrent_once_by_hash(self):
+        torrents = [
+            torrent("Show.S01E10", "a" * 40),
+            torrent("Show.S01E1", "b" * 40),  # a prefix of the name above
+            torrent("Still.Downloading", "c" * 40, progress=42.0),
+        ]
+        self.assertEqual(self.check(torrents), 2)
+        self.assertEqual(self.check(torrents), 0)
+        self.assertEqual(self.sent, ["Show.S01E10", "Show.S01E1"])
+
+    def test_old_text_history_is_imported_without_renotifying(self):
+        with open(transmission_checker.LEGACY_NOTIFICATION_FILE, "w") as file:
+            file.write("Old.Movie.2024\n")
+        self.assertEqual(self.check([torrent("Old.Movie.2024", "d" * 40), torrent("New.Movie", "e" * 40)]), 1)
+        self.assertEqual(self.sent, ["New.Movie"])
+        self.assertFalse(os.path.exists(transmission_checker.LEGACY_NOTIFICATION_FILE))
+        with transmission_checker.open_state(self.path) as store:
+            self.assertEqual(set(store.items(transmission_checker.STATE_NAMESPACE)), {"d" * 40, "e" * 40})
+
+    def test_removed_torrents_start_to_expire_at_compaction(self):
+        self.check([torrent("Kept", "f" * 40), torrent("Removed", "0" * 40)])
+        with transmission_checker.open_state(self.path) as store:
+            store.delete(transmission_checker.META_NAMESPACE, "compacted")
+            transmission_checker.check_torrents(store, [torrent("Kept", "f" * 40)], self.completed)
+            history = store.items(transmission_checker.STATE_NAMESPACE)
+        self.assertTrue(history["0" * 40]["removed"])
+        self.assertNotIn("removed", history["f" * 40])
+
+    def test_repeated_compactions_in_one_session_keep_the_retention_clock(self):
+        def expires(key):
+            with sqlite3.connect(self.path) as conn:
+                return conn.execute(
+                    "SELECT expires FROM state WHERE namespace = ? AND key = ?",
+                    (transmission_checker.STATE_NAMESPACE, key),
+                ).fetchone()[0]
+
+        kept, removed = torrent("Kept", "f" * 40), torrent("Removed", "0" * 40)
+        with transmission_checker.open_state(self.path) as store, \
+                mock.patch.object(transmission_checker, "COMPACT_INTERVAL", 0):
+            history = transmission_checker.load_history(store)
+            transmission_checker.check_torrents(store, [kept, removed], self.completed, history)
+            transmission_checker.check_torrents(store, [kept], self.completed, history)
+            first = expires("0" * 40)
+            time.sleep(0.05)
+            transmission_checker.check_torrents(store, [kept], self.completed, history)
+            self.assertEqual(expires("0" * 40), first)
+
+            transmission_checker.check_torrents(store, [kept, removed], self.completed, history)
+            self.assertIsNone(expires("0" * 40))
+            self.assertNotIn("removed", store.get(transmission_checker.STATE_NAMESPACE, "0" * 40))
+        self.assertEqual(self.sent, ["Kept", "Removed"])
+
+    def test_watch_polls_only_needed_fields_and_recently_active_torrents(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubTransmission)
+        server.daemon_threads = True
+        server.connections = set()
+        server.torrent_gets = []
+        server.stop = threading.Event()
+        server.stop_after = 3
+        fields = {"id": 1, "hashString": "1" * 40, "name": "Show.S02E01"}
+        server.replies = [[{**fields, "percentDone": 0.5}], [], [{**fields, "percentDone": 1.0}]]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        client = transmission_checker.Client(port=server.server_address[1])
+        with transmission_checker.open_state(self.path) as store:
+            transmission_checker.watch(client, store, self.completed, 0.01, 3600, server.stop)
+
+        requested = sorted(transmission_checker.TORRENT_FIELDS)
+        self.assertEqual(
+            server.torrent_gets, [(None, requested), ("recently-active", requested), ("recently-active", requested)]
+        )
+        self.assertEqual(self.sent, ["Show.S02E01"])
+        self.assertEqual(len(server.connections), 1)
+
+    def test_pipeline_runs_label_hooks_in_order_and_off_the_caller_thread(self):
+        hooks = transmission_checker.load_hooks({
+            "hooks": {
+                "default": ["notify"],
+                "Movies": [
+                    {
+                        "type": "command",
+                        "command": ["sh", "-c", 'sleep 0.3; echo "$TR_TORRENT_HASH $1" > $1.done', "-", "{name}"],
+                    },
+                    {"type": "notify", "message": "Ready: {name}"},
+                ],
+                "broken": [{"type": "command", "command": "false"}, "notify"],
+            }
+        })
+        pipeline = transmission_checker.CompletionPipeline(hooks, self.sent.append, workers=3)
+        started = time.monotonic()
+        futures = [
+            pipeline.submit(torrent("Film", "a" * 40, labels=["movies"])),
+            pipeline.submit(torrent("Other", "b" * 40)),
+            pipeline.submit(torrent("Bad", "c" * 40, labels=["broken"])),
+        ]
+        self.assertLess(time.monotonic() - started, 0.1)
+        pipeline.close()
+
+        self.assertEqual([future.result() for future in futures], [True, True, False])
+        with open("Film.done") as file:
+            self.assertEqual(file.read(), "a" * 40 + " Film\n")
+        # The slow torrent finishes last; the other two did not wait for it.
+        self.assertEqual(
+            sorted(self.sent[:2]), ["Torrent completed: Other", "Torrent hook 'command' failed for Bad: exit code 1"]
+        )
+        self.assertEqual(self.sent[2], "Ready: Film")
+
+    def test_command_arguments_keep_braces_that_are_not_placeholders(self):
+        hooks = transmission_checker.load_hooks({
+            "hooks": {"tv": [{
+                "type": "command",
+                "command": [
+                    "sh", "-c", 'printf "%s\\n" "$@" > args.txt', "-", "{name}", "{labels}", "{print $1}", "{}"
+                ],
+            }]}
+        })
+        pipeline = transmission_checker.CompletionPipeline(hooks, self.sent.append)
+        future = pipeline.submit(torrent("Show", "a" * 40, labels=["tv", "hd"]))
+        pipeline.close()
+
+        self.assertTrue(future.result())
+        with open("args.txt") as file:
+            self.assertEqual(file.read().splitlines(), ["Show", "tv,hd", "{print $1}", "{}"])
+
+    def test_move_to_the_current_directory_is_a_no_op(self):
+        def no_client():
+            raise AssertionError("no RPC call expected")
+
+        hooks = transmission_checker.load_hooks({
+            "hooks": {"tv": [{"type": "move", "destination": "/downloads/"}, {"type": "notify", "message": "{name}"}]}
+        })
+        pipeline = transmission_checker.CompletionPipeline(hooks, self.sent.append, client_factory=no_client)
+        future = pipeline.submit(torrent("Show.S01E01", "a" * 40, labels=["tv"]))
+        pipeline.close()
+        self.assertTrue(future.result())
+        self.assertEqual(self.sent, ["Show.S01E01"])
+
+    def test_move_waits_for_transmission_not_for_local_paths(self):
+        destination = "/not/mounted/here/Movies"
+        client = FakeMoveClient(["/downloads", "/downloads", destination])
+        hooks = transmission_checker.load_hooks({
+            "hooks": {
+                "movies": [
+                    {"type": "move", "destination": destination},
+                    {"type": "notify", "message": "{download_dir}"},
+                ],
+                "broken": [{"type": "move", "destination": destination}],
+            }
+        })
+        pipeline = transmission_checker.CompletionPipeline(hooks, self.sent.append, client_factory=lambda: client)
+        with mock.patch.object(transmission_checker, "MOVE_POLL_INTERVAL", 0.01):
+            moved = pipeline.submit(torrent("Film", "b" * 40, labels=["movies"])).result()
+            client.error = "No space left on device"
+            failed = pipeline.submit(torrent("Other", "c" * 40, labels=["broken"])).result()
+        pipeline.close()
+
+        self.assertEqual((moved, failed), (True, False))
+        self.assertEqual(client.moves, [("b" * 40, destination), ("c" * 40, destination)])
+        self.assertEqual(
+            self.sent, [destination, "Torrent hook 'move' failed for Other: move to " + destination
+                        + " failed: No space left on device"]
+        )
+
+    def test_pushover_is_only_required_by_notify_hooks(self):
+        notify_hooks = transmission_checker.load_hooks({})
+        command_hooks = transmission_checker.load_hooks({"hooks": {"tv": [{"type": "command", "command": "true"}]}})
+        with mock.patch.object(transmission_checker.notifier, "read_pushoverrc", return_value=(None, None)):
+            self.assertIsNone(transmission_checker.completion_notifier(notify_hooks))
+            self.assertIs(transmission_checker.completion_notifier(command_hooks), transmission_checker.log_message)
+
+    def test_invalid_hooks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            transmission_checker.load_hooks({"hooks": {"tv": [{"type": "upload"}]}})
+        with self.assertRaises(ValueError):
+            transmission_checker.load_hooks({"hooks": {"tv": [{"type": "sftp"}]}})
+
+    def test_invalid_config_exits_with_an_error(self):
+        with open("config.yaml", "w") as file:
+            file.write("hooks:\n  tv: [{type: upload}]\n")
+        with mock.patch.object(sys, "argv", ["transmission_checker.py", "--config", "config.yaml"]):
+            self.assertEqual(transmission_checker.main(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,37 +1,449 @@
 #!/usr/bin/python3
 
-"""Check if torrent download has completed"""
+"""Check if torrent download has completed
 
-from transmission_rpc import Client
-import pushover
+Finished torrents go through the completion hooks of their label (see
+transmission_checker_config.yaml.example): notify, command, move, sftp.
+"""
 
+import os
+import re
+import shlex
+import signal
+import threading
+import subprocess
+import time
+import random
+import argparse
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-def read_last_notification():
-    try:
-        with open("last_notification.txt", "r") as file:
-            return file.read().strip()
-    except FileNotFoundError:
-        return None
+import yaml
+from transmission_rpc import Client, TransmissionError
+import notifier
+import state_store
 
-def write_last_notification(notification):
-    with open("last_notification.txt", "a") as file:
-        file.write(notification + "\n")
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transmission_checker_config.yaml")
 
-def main():
-    # Initialize the pushover and transmission-rpc objects
-    notification = pushover.Client()
-    c = Client(username='transmission', password='transmission')
-
-    for t in c.get_torrents():
-        if t.progress == 100.0:
-            print("Finished " + t.name)
-            last_notification = read_last_notification()
-            print(last_notification)
+STATE_NAMESPACE = 'transmission_checker'
+META_NAMESPACE = 'transmission_checker.meta'
+# History file used before the state store (in the working directory); imported once.
+LEGACY_NOTIFICATION_FILE = "last_notification.txt"
+# Notified torrents that are no longer in Transmission are forgotten after this many days.
+HISTORY_RETENTION_DAYS = 90
+# How often the history is compacted (seconds).
+COMPACT_INTERVAL = 24 * 3600
+# The only torrent fields read; asking for these instead of all of them keeps each response small.
+TORRENT_FIELDS = ['id', 'hashString', 'name', 'percentDone', 'labels', 'downloadDir']
+# Transmission reports a torrent as "recently active" for this many seconds after it changed.
+RECENTLY_ACTIVE_WINDOW = 60
+# Completion hooks: what runs for a finished torrent without a configured label.
+HOOK_TYPES = ('notify', 'command', 'move', 'sftp')
+DEFAULT_HOOKS = {'default': [{'type': 'notify'}]}
+DEFAULT_HOOK_WORKERS = 2
+DEFAULT_HOOK_TIMEOUT = 3600
+DEFAULT_MESSAGE = "Torrent completed: {name}"
+# Placeholders filled in hook messages and command arguments; any other braces are left as they are.
+PLACEHOLDER_PATTERN = re.compile(r"\{(id|name|hash|download_dir|labels)\}")
+# Fields polled while a move hook waits for Transmission, and how often (seconds).
+MOVE_FIELDS = ['id', 'hashString', 'downloadDir', 'error', 'errorString']
+MOVE_POLL_INTERVAL = 1
+
+
+def log_message(message):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {message}")
+
+def fill_placeholders(text, job):
+    """Replace the {name}, {hash}, {download_dir}, {labels} and {id} placeholders in *text*."""
+    def value(match):
+        field = job[match.group(1)]
+        return ",".join(field) if match.group(1) == 'labels' else str(field)
+    return PLACEHOLDER_PATTERN.sub(value, str(text))
+
+def load_config(path=CONFIG_PATH):
+    """Return the YAML config, or {} when there is none (notify-only, default Transmission login)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+def load_hooks(config):
+    """Return {label: [hook, ...]} from the `hooks` block (labels lower-case)."""
+    hooks = config.get('hooks') or DEFAULT_HOOKS
+    if not isinstance(hooks, dict):
+        raise ValueError("hooks must map labels to lists of hooks")
+    result = {}
+    for label, steps in hooks.items():
+        steps = [{'type': step} if isinstance(step, str) else step for step in steps or []]
+        for step in steps:
+            if not isinstance(step, dict) or step.get('type') not in HOOK_TYPES:
+                raise ValueError(f"hooks.{label}: each hook needs a type ({', '.join(HOOK_TYPES)}), got {step!r}")
+            if step['type'] in ('command', 'move', 'sftp'):
+                required = 'command' if step['type'] == 'command' else 'destination'
+                if not step.get(required):
+                    raise ValueError(f"hooks.{label}: {step['type']} hook needs '{required}'")
+        result[str(label).lower()] = steps
+    return result
+
+class CompletionPipeline:
+    """Run the completion hooks of finished torrents on a worker pool, off the polling loop.
+
+    The hooks of one torrent run in order (e.g. move, then sftp, then notify); a failing
+    hook stops the rest and sends a failure notification. Different torrents run concurrently.
+    """
+
+    def __init__(self, hooks, notify, workers=DEFAULT_HOOK_WORKERS, sftp=None, client_factory=None):
+        self.hooks = hooks
+        self.notify = notify
+        self.sftp = sftp or {}
+        self.client_factory = client_factory
+        self.executor = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="hook")
+
+    def hooks_for(self, labels):
+        steps = [step for label in labels for step in self.hooks.get(label.lower(), [])]
+        return steps if steps else self.hooks.get('default', [])
+
+    def submit(self, torrent):
+        """Queue the hooks for *torrent*; returns at once."""
+        try:
+            labels = list(torrent.labels or [])
+        except KeyError:
+            labels = []  # Transmission before 3.0 has no labels
+        job = {
+            'id': torrent.id,
+            'name': torrent.name,
+            'hash': torrent.hash_string,
+            'download_dir': torrent.download_dir,
+            'labels': labels,
+        }
+        return self.executor.submit(self.run, job)
+
+    def close(self):
+        """Wait for the queued hooks to finish."""
+        self.executor.shutdown(wait=True)
+
+    def run(self, job):
+        for step in self.hooks_for(job['labels']):
+            try:
+                getattr(self, f"run_{step['type']}")(job, step)
+            except Exception as e:
+                log_message(f"{job['name']}: {step['type']} hook failed: {e}")
+                self.notify(f"Torrent hook '{step['type']}' failed for {job['name']}: {e}")
+                return False
+        return True
+
+    def run_notify(self, job, step):
+        self.notify(fill_placeholders(step.get('message', DEFAULT_MESSAGE), job))
+
+    def run_command(self, job, step):
+        """Run a command with Transmission's script-torrent-done variables in its environment."""
+        command = step['command']
+        if isinstance(command, str):
+            command = shlex.split(command)
+        env = dict(
+            os.environ,
+            TR_TORRENT_ID=str(job['id']),
+            TR_TORRENT_NAME=job['name'],
+            TR_TORRENT_HASH=job['hash'],
+            TR_TORRENT_DIR=job['download_dir'],
+            TR_TORRENT_LABELS=",".join(job['labels']),
+        )
+        result = subprocess.run(
+            [fill_placeholders(arg, job) for arg in command],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=step.get('timeout', DEFAULT_HOOK_TIMEOUT),
+        )
+        if result.returncode != 0:
+            output = (result.stderr or result.stdout).strip()[-500:]
+            raise RuntimeError(f"exit code {result.returncode}" + (f": {output}" if output else ""))
+
+    def run_move(self, job, step):
+        """Let Transmission move the data (it keeps seeding from there) and wait until it is done.
+
+        Progress is read over RPC, so this also works when Transmission sees other paths
+        than this host (another machine, a container with different mounts).
+        """
+        destination = step['destination']
+        if os.path.normpath(destination) == os.path.normpath(job['download_dir']):
+            log_message(f"{job['name']}: already in {destination}, nothing to move")
+            return
+        client = self.client_factory()
+        client.move_torrent_data(job['hash'], destination, move=True)
+        deadline = time.monotonic() + step.get('timeout', DEFAULT_HOOK_TIMEOUT)
+        # Transmission moves in the background and switches downloadDir once the data is there.
+        while True:
+            torrent = client.get_torrent(job['hash'], arguments=MOVE_FIELDS)
+            if torrent.error:
+                raise RuntimeError(f"move to {destination} failed: {torrent.error_string}")
+            if os.path.normpath(torrent.download_dir) == os.path.normpath(destination):
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"move to {destination} did not finish in time")
+            time.sleep(MOVE_POLL_INTERVAL)
+        job['download_dir'] = destination
+
+    def run_sftp(self, job, step):
+        """Upload the torrent's file or folder with the SFTP engine of the NZBGet script."""
+        import SFTPTransfer  # paramiko is only needed when an sftp hook runs
+
+        server = {**self.sftp, **(step.get('server') or {})}
+        transfer = SFTPTransfer.NZBGetSFTPTransfer(
+            host=server.get('host'),
+            port=server.get('port', 22),
+            username=server.get('username'),
+            password=server.get('password', ''),
+        )
+        if not transfer.connect_sftp():
+            raise RuntimeError(f"could not connect to {transfer.host}")
+        try:
+            destination = SFTPTransfer.normalize_windows_path(step['destination'])
+            if not transfer.transfer_path(os.path.join(job['download_dir'], job['name']), destination):
+                raise RuntimeError(f"transfer to {destination} failed (see {SFTPTransfer.LOG_FILE})")
+        finally:
+            transfer.close_connection()
+
+
+def open_state(path=None):
+    store = state_store.open_store(path)
+    if os.path.exists(LEGACY_NOTIFICATION_FILE):
+        with open(LEGACY_NOTIFICATION_FILE, "r") as file:
+            names = [line.strip() for line in file if line.strip()]
+        # The old file only has names; they are matched to torrents in load_history().
+        store.set_many(STATE_NAMESPACE, {name: {'notified': None} for name in names})
+        os.replace(LEGACY_NOTIFICATION_FILE, LEGACY_NOTIFICATION_FILE + ".imported")
+    return store
+
+def load_history(store):
+    """Read the notification history once: ({hashString: entry}, {legacy name-keyed entries})."""
+    seen, legacy_names = {}, set()
+    for key, entry in store.items(STATE_NAMESPACE).items():
+        if 'name' in entry:
+            seen[key] = entry
+        else:
+            legacy_names.add(key)
+    return seen, legacy_names
+
+def history_entry(name):
+    return {'name': name, 'notified': datetime.now().isoformat(timespec='seconds')}
+
+def check_torrents(store, torrents, on_complete, history=None, complete=True):
+    """Call on_complete(torrent) for every finished torrent not seen before; return how many.
+
+    The history is keyed by hashString (unique, unlike names) and loaded in one query,
+    so each torrent costs one set lookup. A long-running caller passes the same *history*
+    (from load_history) every time; it is kept up to date here. *complete* is False when
+    *torrents* is only the recently active ones (no compaction then).
+    """
+    seen, legacy_names = history if history is not None else load_history(store)
+    new_entries = {}
+    present = set()
+    for t in torrents:
+        present.add(t.hash_string)
+        if t.progress == 100.0 and t.hash_string not in seen:
+            if t.name not in legacy_names:
+                log_message("Finished " + t.name)
+                on_complete(t)
+            new_entries[t.hash_string] = history_entry(t.name)
+    if not new_entries:
+        if complete:
+            compact_history(store, seen, present)
+        return 0
+    store.set_many(STATE_NAMESPACE, new_entries)
+    seen.update(new_entries)
+    adopted = legacy_names & {entry['name'] for entry in new_entries.values()}
+    for name in adopted:
+        store.delete(STATE_NAMESPACE, name)
+    legacy_names -= adopted
+    if complete:
+        compact_history(store, seen, present)
+    return len(new_entries) - len(adopted)
+
+def compact_history(store, seen, present):
+    """Once a day: start the retention clock for torrents removed from Transmission (stop it if they came back)."""
+    if time.time() - store.get(META_NAMESPACE, 'compacted', 0) < COMPACT_INTERVAL:
+        return
+    removed = {key: {**entry, 'removed': True} for key, entry in seen.items()
+               if key not in present and not entry.get('removed')}
+    if removed:
+        store.set_many(STATE_NAMESPACE, removed, ttl=HISTORY_RETENTION_DAYS * 86400)
+    returned = {key: {k: v for k, v in entry.items() if k != 'removed'} for key, entry in seen.items()
+                if key in present and entry.get('removed')}
+    if returned:
+        store.set_many(STATE_NAMESPACE, returned)
+    # Keep a long-lived history (--watch) in step, so the TTL is not restarted at every compaction.
+    seen.update(removed)
+    seen.update(returned)
+    store.compact()
+    store.set(META_NAMESPACE, 'compacted', time.time())
+
+def watch(client, store, on_complete, interval, full_sync_interval, stop):
+    """Poll one RPC session until *stop* is set.
+
+    A full listing (only TORRENT_FIELDS) is fetched at start and every *full_sync_interval*
+    seconds; in between only torrents that changed recently are requested. After a failed
+    poll, or when *interval* is too long for the recently-active window, the next poll is full.
+    """
+    history = load_history(store)
+    last_full = None
+    while True:
+        now = time.monotonic()
+        full = (last_full is None or now - last_full >= full_sync_interval
+                or interval >= RECENTLY_ACTIVE_WINDOW)
+        try:
+            if full:
+                torrents = client.get_torrents(arguments=TORRENT_FIELDS)
+                last_full = now
+            else:
+                torrents, _ = client.get_recently_active_torrents(arguments=TORRENT_FIELDS)
+            check_torrents(store, torrents, on_complete, history, complete=full)
+        except TransmissionError as e:
+            log_message(f"Transmission poll failed: {e}")
+            last_full = None
+        if stop.wait(interval):
+            break
+
+def run_benchmark(history_size, torrent_count):
+    """Time one check of *torrent_count* finished torrents against a *history_size* history, old vs new."""
+
+    class FakeTorrent:
+        def __init__(self, name, hash_string):
+            self.name = name
+            self.hash_string = hash_string
+            self.progress = 100.0
+
+    rng = random.Random(1)
+    names = [f"Some.Show.S{i // 100:02d}E{i % 100:02d}.1080p.WEB.h264-GROUP{rng.randrange(1000)}"
+             for i in range(history_size)]
+    torrents = [FakeTorrent(name, f"{rng.getrandbits(160):040x}") for name in names]
+    checked = torrents[-torrent_count:]
+    # A new torrent whose name is a prefix of a notified one: the old substring check misses it.
+    checked.append(FakeTorrent(names[-1][:-1], f"{rng.getrandbits(160):040x}"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history_file = os.path.join(tmp, "last_notification.txt")
+        with open(history_file, "w") as file:
+            file.write("\n".join(names) + "\n")
+
+        # The previous implementation: re-read the whole file for every finished torrent, substring check.
+        started = time.perf_counter()
+        old_new = 0
+        for t in checked:
+            with open(history_file, "r") as file:
+                last_notification = file.read().strip()
             if t.name not in last_notification:
-                notification.send_message("Torrent completed: " + t.name)
-                write_last_notification(t.name)
-        # else:
-        #     print("Not finished " + t.name)
+                old_new += 1
+        old_seconds = time.perf_counter() - started
+
+        with state_store.StateStore(os.path.join(tmp, "state.sqlite3")) as store:
+            store.set_many(STATE_NAMESPACE, {t.hash_string: history_entry(t.name) for t in torrents})
+            store.set(META_NAMESPACE, 'compacted', time.time())
+            started = time.perf_counter()
+            new_new = check_torrents(store, checked, lambda torrent: None)
+            new_seconds = time.perf_counter() - started
+
+    print(f"History: {history_size} torrents, check of {len(checked)} finished torrents")
+    print(f"  text file + substring: {old_seconds * 1000:9.1f} ms, {old_new} new")
+    print(f"  hashString seen-set:   {new_seconds * 1000:9.1f} ms, {new_new} new")
+    print(f"  speed-up: {old_seconds / new_seconds:.0f}x")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run completion hooks (e.g. Pushover) for finished torrents.")
+    parser.add_argument(
+        "--config",
+        default=CONFIG_PATH,
+        help=f"Path to the YAML config with Transmission login and hooks (default: {CONFIG_PATH}).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and poll Transmission every --interval seconds over one RPC session.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=30,
+        help=f"Seconds between polls in --watch mode (default: 30; below {RECENTLY_ACTIVE_WINDOW} "
+             "only changed torrents are fetched).",
+    )
+    parser.add_argument(
+        "--full-sync-interval",
+        type=float,
+        default=3600,
+        help="Seconds between full torrent listings in --watch mode (default: 3600).",
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="HISTORY",
+        help="Compare the old text-file history with the seen-set on a synthetic history of this many torrents.",
+    )
+    parser.add_argument(
+        "--benchmark-torrents",
+        type=int,
+        default=2000,
+        help="Finished torrents checked per run in --benchmark (default: 2000).",
+    )
+    return parser.parse_args()
+
+def completion_notifier(hooks):
+    """Return the function hooks notify through, or None if Pushover is needed but not set up.
+
+    Credentials come from ~/.pushoverrc. They are only required when a notify hook is
+    configured (the default); without them hook failures are only logged.
+    """
+    user_key, api_token = notifier.read_pushoverrc()
+    if user_key and api_token:
+        return notifier.pushover(user_key, api_token).send
+    if any(step['type'] == 'notify' for steps in hooks.values() for step in steps):
+        return None
+    return log_message
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        run_benchmark(args.benchmark, min(args.benchmark_torrents, args.benchmark))
+        return
+
+    try:
+        config = load_config(args.config)
+        hooks = load_hooks(config)
+    except (OSError, yaml.YAMLError, ValueError) as e:
+        print(f"Error: invalid config {args.config}: {e}")
+        return 1
+    notify = completion_notifier(hooks)
+    if notify is None:
+        print("Pushover credentials missing: add api_token and user_key to ~/.pushoverrc (used by notify hooks)")
+        return 1
+    transmission = {'username': 'transmission', 'password': 'transmission', **(config.get('transmission') or {})}
+    c = Client(**transmission)
+    pipeline = CompletionPipeline(
+        hooks,
+        notify,
+        workers=config.get('hook_workers', DEFAULT_HOOK_WORKERS),
+        sftp=config.get('sftp'),
+        client_factory=lambda: Client(**transmission),
+    )
+
+    with open_state() as store:
+        try:
+            if not args.watch:
+                check_torrents(store, c.get_torrents(arguments=TORRENT_FIELDS), pipeline.submit)
+                return
+
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                watch(c, store, pipeline.submit, max(args.interval, 1), args.full_sync_interval, stop)
+            except KeyboardInterrupt:
+                pass
+        finally:
+            # Hooks already started (uploads, commands) are finished before exiting.
+            pipeline.close()
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())